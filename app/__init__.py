@@ -58,6 +58,14 @@ def create_app(config_class=Config):
     app.jinja_env.filters['format_currency'] = format_currency
     app.jinja_env.filters['chunk'] = chunk_list
 
+    # ─── Fragment Cache ───────────────────────────────────────────────────────
+    from app.products.cache import cached_product_card, card_fragments
+    card_fragments.configure(
+        app.config.get('FRAGMENT_CACHE_MAX_ENTRIES'),
+        app.config.get('FRAGMENT_CACHE_MAX_BYTES')
+    )
+    app.jinja_env.globals['cached_product_card'] = cached_product_card
+
     # ─── Register Context Processor ───────────────────────────────────────────
     app.context_processor(inject_cart_item_count)
 
@@ -40,17 +40,22 @@ def clear_balance(order_id):
     if not current_user.is_customer() or order.customer.user_id != current_user.id:
         abort(403)
 
-    # Mark as fully paid
+    if order.balance_due <= 0:
+        flash("This order has no outstanding balance.", "toast-info")
+        return redirect(url_for('orders.view_order', order_id=order.id))
+
+    # Pay the outstanding balance
     payment = Payment(
         order_id=order.id,
-        amount=order.total_amount,
+        customer_id=order.customer_id,
+        amount=order.balance_due,
         payment_date=datetime.utcnow(),
         method="MANUAL",
         transaction_id=f"MANUAL-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
     )
     db.session.add(payment)
 
-    order.payment_status = 'PAID'
+    # payment_status follows from the recorded payment (app/orders/balances.py)
     order.status = 'PROCESSING'  # Or SHIPPED/DELIVERED based on your flow
     db.session.commit()
 
@@ -78,6 +83,7 @@ def make_payment(order_id):
     # Simulate payment
     payment = Payment(
         order_id=order.id,
+        customer_id=order.customer_id,
         amount=order.total_amount,
         payment_date=datetime.utcnow(),
         method=payment_method,
@@ -85,8 +91,7 @@ def make_payment(order_id):
     )
     db.session.add(payment)
 
-    # Update order
-    order.payment_status = 'PAID'
+    # Update order; payment_status follows from the recorded payment
     order.status = 'PROCESSING'
     order.payment_method = payment_method
     order.transaction_id = payment.transaction_id
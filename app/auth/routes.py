@@ -2,9 +2,13 @@ from flask import render_template, redirect, url_for, flash, request, session
 from flask_login import login_user, logout_user, current_user, login_required
 from werkzeug.security import check_password_hash
 from app.auth.forms import LoginForm, UserForm
-from app.models import User, CartItem
+from app.models import User
 from app.auth import bp
 from app import db
+from app.cart.service import (
+    invalidate_cart_count, merge_guest_cart, guest_cart_items, clear_guest_cart
+)
+from app.products.reservations import transfer_reservations, user_owner
 
 # ─── USER LOGIN ───────────────────────────────────────────────────────────────
 @bp.route('/login', methods=['GET', 'POST'])
@@ -26,20 +30,18 @@ def login():
         login_user(user, remember=form.remember_me.data)
 
         # ─── MERGE GUEST CART TO DB ───────────────────────────────────────────
-        guest_cart = session.get('cart', [])
+        guest_cart = guest_cart_items()
         if guest_cart and user.is_customer():
-            for item in guest_cart:
-                product_id = item.get('product_id')
-                quantity = max(1, item.get('quantity', 1))
-
-                existing = CartItem.query.filter_by(user_id=user.id, product_id=product_id).first()
-                if existing:
-                    existing.quantity += quantity
-                else:
-                    db.session.add(CartItem(user_id=user.id, product_id=product_id, quantity=quantity))
+            merge_guest_cart(user.id, [
+                {'product_id': product_id, 'quantity': quantity}
+                for product_id, quantity in guest_cart.items()
+            ])
+            transfer_reservations(f"guest:{session['cart_token']}", user_owner(user.id))
 
             db.session.commit()
-            session.pop('cart', None)
+            invalidate_cart_count(user.id)
+            clear_guest_cart()
+            session.pop('cart_token', None)
 
         return redirect(request.args.get('next') or url_for('main.index'))
 
@@ -2,6 +2,6 @@ from flask import Blueprint
 
 bp = Blueprint('cart', __name__, url_prefix='/view_cart')
 
-from app.cart import routes
+from app.cart import routes, commands
 
 from .routes import bp
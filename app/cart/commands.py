@@ -0,0 +1,12 @@
+import click
+from app.cart import bp
+from app.cart.store import purge_guest_carts
+
+
+@bp.cli.command('purge-guest-carts')
+@click.option('--batch-size', type=int, default=None,
+              help='Carts deleted per transaction (default: CART_STORE_GC_BATCH).')
+def purge_guest_carts_command(batch_size):
+    """Delete expired guest carts from the server-side cart store."""
+    removed = purge_guest_carts(batch_size)
+    click.echo(f"Removed {removed} expired guest carts.")
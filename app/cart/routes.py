@@ -1,6 +1,7 @@
 from datetime import datetime
-from flask import Blueprint, render_template, redirect, url_for, request, flash, session, abort
+from flask import Blueprint, render_template, redirect, url_for, request, flash, abort
 from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload
 from app import db
 from app.models import (
     Order,
@@ -23,6 +24,16 @@ class CheckoutForm(FlaskForm):
     billing_address = TextAreaField('Billing Address')
 
 from app.extensions import csrf
+from app.products.inventory import allocate_stock, InsufficientStock
+from app.products.loader import load_products
+from app.products.reservations import (
+    reserve_stock, release_reservations, extend_reservations, sweeper
+)
+from app.cart.service import (
+    invalidate_cart_count, invalidate_guest_cart_count, reservation_owner,
+    guest_cart_token, guest_cart_items, clear_guest_cart
+)
+from app.cart.store import get_cart_store
 
 bp = Blueprint('cart', __name__)
 
@@ -37,7 +48,11 @@ def view_cart():
     total = 0.0
 
     if current_user.is_authenticated:
-        db_cart = CartItem.query.filter_by(user_id=current_user.id).all()
+        db_cart = (
+            CartItem.query.filter_by(user_id=current_user.id)
+            .options(joinedload(CartItem.product))
+            .all()
+        )
         for item in db_cart:
             subtotal = item.product.price * item.quantity
             total += subtotal
@@ -47,11 +62,11 @@ def view_cart():
                 'subtotal': subtotal
             })
     else:
-        cart_data = session.get('cart', [])
-        for item in cart_data:
-            product = Product.query.get(item['product_id'])
+        guest_cart = guest_cart_items()
+        products = load_products(guest_cart)
+        for product_id, qty in guest_cart.items():
+            product = products.get(product_id)
             if product:
-                qty = item.get('quantity', 1)
                 subtotal = product.price * qty
                 total += subtotal
                 cart_items.append({
@@ -78,23 +93,35 @@ def add_to_cart(product_id):
         return redirect(url_for('products.view_product', product_id=product_id))
 
     product = Product.query.get_or_404(product_id)
+    owner = reservation_owner(current_user)
+    sweeper.ensure_started()
 
     if current_user.is_authenticated:
         existing = CartItem.query.filter_by(user_id=current_user.id, product_id=product_id).first()
+        in_cart = existing.quantity if existing else 0
+    else:
+        token = guest_cart_token(create=True)
+        in_cart = get_cart_store().quantity(token, product_id)
+
+    # Hold the cart's new total so other shoppers cannot take it meanwhile
+    try:
+        reserve_stock(owner, product_id, in_cart + quantity)
+    except InsufficientStock:
+        db.session.rollback()
+        flash(f"Sorry, not enough {product.name} in stock for that quantity.", "danger")
+        return redirect(url_for('products.view_product', product_id=product_id))
+
+    if current_user.is_authenticated:
         if existing:
             existing.quantity += quantity
         else:
             db.session.add(CartItem(user_id=current_user.id, product_id=product_id, quantity=quantity))
         db.session.commit()
+        invalidate_cart_count(current_user.id)
     else:
-        cart_data = session.get('cart', [])
-        for entry in cart_data:
-            if entry['product_id'] == product_id:
-                entry['quantity'] += quantity
-                break
-        else:
-            cart_data.append({'product_id': product_id, 'quantity': quantity})
-        session['cart'] = cart_data
+        db.session.commit()
+        get_cart_store().add(token, product_id, quantity)
+        invalidate_guest_cart_count()
 
     flash("Product added to cart.", "success")
     return redirect(url_for('products.view_product', product_id=product_id))
@@ -107,13 +134,17 @@ def remove_from_cart(product_id):
         flash("Only customers can modify the cart.", "danger")
         return redirect(url_for('main.dashboard'))
 
+    release_reservations(reservation_owner(current_user), [product_id])
     if current_user.is_authenticated:
         CartItem.query.filter_by(user_id=current_user.id, product_id=product_id).delete()
         db.session.commit()
+        invalidate_cart_count(current_user.id)
     else:
-        cart_data = session.get('cart', [])
-        cart_data = [entry for entry in cart_data if entry['product_id'] != product_id]
-        session['cart'] = cart_data
+        db.session.commit()
+        token = guest_cart_token()
+        if token:
+            get_cart_store().remove(token, product_id)
+            invalidate_guest_cart_count()
 
     flash("Item removed from cart.", "info")
     return redirect(url_for('cart.view_cart'))
@@ -126,11 +157,14 @@ def clear_cart():
         flash("Only customers can clear the cart.", "danger")
         return redirect(url_for('main.dashboard'))
 
+    release_reservations(reservation_owner(current_user))
     if current_user.is_authenticated:
         CartItem.query.filter_by(user_id=current_user.id).delete()
         db.session.commit()
+        invalidate_cart_count(current_user.id)
     else:
-        session['cart'] = []
+        db.session.commit()
+        clear_guest_cart()
 
     flash("Cart cleared.", "info")
     return redirect(url_for('cart.view_cart'))
@@ -198,10 +232,6 @@ def checkout():
 
     # If the form is submitted and valid, process the checkout
     if form.validate_on_submit():
-        print("Shipping address selected ID:", form.shipping_address.data)
-        print("Billing address selected ID:", form.billing_address.data)
-        print("Payment method selected ID:", form.payment_method.data)
-
         # Retrieve the selected shipping address, billing address, and payment method
         shipping_address = ShippingAddress.query.get(form.shipping_address.data)
         billing_address = ShippingAddress.query.get(form.billing_address.data)
@@ -218,14 +248,16 @@ def checkout():
 
         # Create the order
         order = Order(
-            customer_id=current_user.id,
+            customer_id=current_user.customer.id,
             shipping_address_id=shipping_address.id,
-            billing_address=billing_address_data,
-            payment_method_id=payment_method.id,
+            billing_address_id=billing_address.id,
+            payment_method=payment_method.card_type,
+            subtotal=total,
             total_amount=total,
             status=OrderStatus.PENDING
         )
         db.session.add(order)
+        db.session.flush()
 
         # Add the order items (cart items) to the order
         for item in cart_items:
@@ -238,16 +270,31 @@ def checkout():
             )
             db.session.add(order_item)
 
-        # Commit the transaction
-        db.session.commit()
+        # Take the stock, then empty the cart, all in the order's transaction
+        try:
+            allocate_stock(
+                [(item.product_id, item.quantity) for item in cart_items],
+                order.id, user_id=current_user.id, owner=reservation_owner(current_user)
+            )
+        except InsufficientStock as e:
+            db.session.rollback()
+            short = ', '.join(
+                item.product.name for item in cart_items if item.product_id in e.product_ids
+            )
+            flash(f"Sorry, there is not enough stock for: {short}. Please update your cart.", "danger")
+            return redirect(url_for('cart.view_cart'))
 
-        # Clear the cart items after the order is placed
         CartItem.query.filter_by(user_id=current_user.id).delete()
         db.session.commit()
+        invalidate_cart_count(current_user.id)
 
         flash("Order placed successfully!", "success")
         return redirect(url_for('cart.order_confirmation', order_id=order.id))
 
+    # Keep the cart's stock held while the customer fills in the form
+    if extend_reservations(reservation_owner(current_user)):
+        db.session.commit()
+
     # Recalculate the total in case the form is not submitted yet
     total = float(calculate_cart_total(cart_items)) if cart_items else 0.0
 
@@ -0,0 +1,207 @@
+import threading
+import time
+import uuid
+from datetime import datetime
+from flask import current_app, g, session
+from sqlalchemy import bindparam, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from app.extensions import db
+from app.models import CartItem, Product
+from app.products.reservations import user_owner
+from app.cart.store import get_cart_store
+
+# ─── Per-user cart count cache ───────────────────────────────────────────────
+# user_id -> (count, expires_at). Entries are dropped by the cart mutation
+# routes via invalidate_cart_count(), but only in the worker that handled
+# the change; other workers keep their entry until it expires, so the TTL
+# is kept to a few seconds. It only absorbs bursts of page loads.
+_cart_counts = {}
+_lock = threading.Lock()
+
+
+def _ttl():
+    return current_app.config.get('CART_COUNT_CACHE_TTL', 5)
+
+
+def _count_from_db(user_id):
+    return db.session.query(
+        func.coalesce(func.sum(CartItem.quantity), 0)
+    ).filter(CartItem.user_id == user_id).scalar()
+
+
+def get_cart_count(user_id):
+    """
+    Return the total quantity in a user's cart.
+
+    Memoized on `g` for the current request and kept for a few seconds
+    (CART_COUNT_CACHE_TTL) in a per-process cache, so bursts of page loads
+    do not each query the cart table.
+    """
+    memo = g.setdefault('_cart_counts', {})
+    if user_id in memo:
+        return memo[user_id]
+
+    now = time.monotonic()
+    with _lock:
+        cached = _cart_counts.get(user_id)
+    if cached and cached[1] > now:
+        count = cached[0]
+    else:
+        count = int(_count_from_db(user_id))
+        with _lock:
+            _cart_counts[user_id] = (count, now + _ttl())
+            if len(_cart_counts) > 10000:
+                # Drop expired entries so short TTLs don't accumulate users
+                for key in [k for k, (_, exp) in _cart_counts.items() if exp <= now]:
+                    del _cart_counts[key]
+
+    memo[user_id] = count
+    return count
+
+
+def invalidate_cart_count(user_id):
+    """Forget the cached count after the user's cart has changed."""
+    with _lock:
+        _cart_counts.pop(user_id, None)
+    if '_cart_counts' in g:
+        g._cart_counts.pop(user_id, None)
+
+
+def get_guest_cart_count():
+    """
+    Total quantity of the guest cart: one read of the cart store per
+    request, memoized on `g` like get_cart_count().
+    """
+    if '_guest_cart_count' not in g:
+        g._guest_cart_count = sum(guest_cart_items().values())
+    return g._guest_cart_count
+
+
+def invalidate_guest_cart_count():
+    """Forget the memoized guest count after the guest's cart has changed."""
+    g.pop('_guest_cart_count', None)
+
+
+# ─── Guest cart ──────────────────────────────────────────────────────────────
+def guest_cart_token(create=False):
+    """
+    The guest's cart token from the session, created when `create` is set.
+    Carts left in the cookie by older versions are moved to the store.
+    """
+    token = session.get('cart_token')
+    if not token and (create or session.get('cart')):
+        token = session['cart_token'] = uuid.uuid4().hex
+    legacy = session.pop('cart', None) if 'cart' in session else None
+    if legacy and token:
+        store = get_cart_store()
+        for entry in legacy:
+            store.add(token, entry['product_id'], max(1, entry.get('quantity', 1)))
+        invalidate_guest_cart_count()
+    return token
+
+
+def guest_cart_items():
+    """{product_id: quantity} for the current guest's cart."""
+    token = guest_cart_token()
+    return get_cart_store().items(token) if token else {}
+
+
+def clear_guest_cart():
+    token = guest_cart_token()
+    if token:
+        get_cart_store().clear(token)
+        invalidate_guest_cart_count()
+
+
+# ─── Reservation owner ───────────────────────────────────────────────────────
+def reservation_owner(user=None):
+    """
+    Owner key for stock reservations: the signed-in user, or a random
+    token kept in the guest's session (created on first use).
+    """
+    if user is not None and user.is_authenticated:
+        return user_owner(user.id)
+    return f"guest:{guest_cart_token(create=True)}"
+
+
+# ─── Guest cart merge ────────────────────────────────────────────────────────
+def _insert_cart_rows():
+    table = CartItem.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect not in ('sqlite', 'postgresql'):
+        return table.insert()
+
+    insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+    stmt = insert(table)
+    # uq_cart_item_user_product_variant: a row added since we read the
+    # cart (e.g. from another tab) is incremented rather than duplicated.
+    # variant is '' for plain products; NULLs would never conflict
+    return stmt.on_conflict_do_update(
+        index_elements=['user_id', 'product_id', 'variant'],
+        set_={
+            'quantity': table.c.quantity + stmt.excluded.quantity,
+            'updated_at': stmt.excluded.updated_at,
+        }
+    )
+
+
+def merge_guest_cart(user_id, entries):
+    """
+    Add the session cart `entries` ({'product_id', 'quantity'[, 'variant']})
+    to the user's saved cart. Not committed.
+
+    The user's existing rows are read with one query and the new
+    quantities computed in memory; existing rows are then written with a
+    single executemany UPDATE and new ones with one multi-row
+    INSERT ... ON CONFLICT DO UPDATE. The cost is a fixed number of
+    statements whatever the cart size. Unknown products are dropped.
+    Returns the number of cart lines written.
+    """
+    increments = {}
+    for entry in entries:
+        try:
+            key = (int(entry['product_id']), entry.get('variant') or '')
+            quantity = max(1, int(entry.get('quantity', 1)))
+        except (KeyError, TypeError, ValueError):
+            continue
+        increments[key] = increments.get(key, 0) + quantity
+    if not increments:
+        return 0
+
+    known = set(db.session.scalars(
+        select(Product.id).where(Product.id.in_({pid for pid, _ in increments}))
+    ))
+    existing = {
+        (product_id, variant): (row_id, quantity)
+        for row_id, product_id, variant, quantity in db.session.execute(
+            select(CartItem.id, CartItem.product_id, CartItem.variant, CartItem.quantity)
+            .where(CartItem.user_id == user_id)
+        )
+    }
+
+    now = datetime.utcnow()
+    updates, inserts = [], []
+    for (product_id, variant), quantity in increments.items():
+        if product_id not in known:
+            continue
+        if (product_id, variant) in existing:
+            row_id, current = existing[(product_id, variant)]
+            updates.append({'row_id': row_id, 'new_quantity': (current or 0) + quantity})
+        else:
+            inserts.append({
+                'user_id': user_id, 'product_id': product_id, 'variant': variant,
+                'quantity': quantity, 'added_at': now, 'updated_at': now,
+            })
+
+    table = CartItem.__table__
+    if updates:
+        db.session.execute(
+            table.update()
+            .where(table.c.id == bindparam('row_id'))
+            .values(quantity=bindparam('new_quantity'), updated_at=now),
+            updates
+        )
+    if inserts:
+        # Sent as multi-row VALUES batches (insertmanyvalues)
+        db.session.execute(_insert_cart_rows(), inserts)
+    return len(updates) + len(inserts)
@@ -0,0 +1,259 @@
+# app/cart/store.py
+"""
+Server-side storage for guest carts.
+
+The cookie session only carries a random cart token (session['cart_token']);
+the cart itself lives in a CartStore keyed by that token, one entry per
+product, so adding or removing an item writes just that entry instead of
+re-signing the whole cart into the cookie.
+
+Backends are picked from CART_STORE_URL:
+
+    (unset)            SQLite file instance/guest_carts.db
+    sqlite:///<path>   SQLite file at <path>
+    redis://...        Redis (or any Redis-protocol server); needs the
+                       `redis` package, else the SQLite store is used
+
+Guest carts expire CART_SESSION_TTL seconds after their last change.
+Redis expires keys itself; the SQLite store is cleaned by purge_expired(),
+which deletes expired carts in batches.
+"""
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from flask import current_app
+from app.products.reservations import sweeper
+
+
+class CartStore(ABC):
+    """Interface shared by the guest cart backends."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+
+    @abstractmethod
+    def items(self, token):
+        """{product_id: quantity} for the cart."""
+
+    @abstractmethod
+    def quantity(self, token, product_id):
+        """Quantity of one product in the cart (0 if absent)."""
+
+    @abstractmethod
+    def add(self, token, product_id, quantity):
+        """Increment one entry and return its new quantity."""
+
+    @abstractmethod
+    def remove(self, token, product_id):
+        """Drop one entry."""
+
+    @abstractmethod
+    def clear(self, token):
+        """Drop the whole cart."""
+
+    def purge_expired(self, batch_size=500):
+        """Delete expired carts; returns how many were removed."""
+        return 0
+
+
+# ─── SQLite ──────────────────────────────────────────────────────────────────
+class SQLiteCartStore(CartStore):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS guest_carts (
+            token TEXT PRIMARY KEY,
+            expires_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ix_guest_carts_expires_at ON guest_carts (expires_at);
+        CREATE TABLE IF NOT EXISTS guest_cart_entries (
+            token TEXT NOT NULL,
+            product_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            PRIMARY KEY (token, product_id)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path, ttl):
+        super().__init__(ttl)
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _connect(self):
+        # One connection per thread; sqlite3 connections are not shareable
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _touch(self, conn, token):
+        # A cart that expired but was not purged yet starts over empty
+        # rather than reviving its stale entries
+        now = time.time()
+        conn.execute(
+            "DELETE FROM guest_cart_entries WHERE token = ? AND EXISTS ("
+            "SELECT 1 FROM guest_carts WHERE token = ? AND expires_at <= ?)",
+            (token, token, now)
+        )
+        conn.execute(
+            "INSERT INTO guest_carts (token, expires_at) VALUES (?, ?) "
+            "ON CONFLICT (token) DO UPDATE SET expires_at = excluded.expires_at",
+            (token, now + self.ttl)
+        )
+
+    def items(self, token):
+        rows = self._connect().execute(
+            "SELECT e.product_id, e.quantity FROM guest_cart_entries e "
+            "JOIN guest_carts c ON c.token = e.token "
+            "WHERE e.token = ? AND c.expires_at > ?",
+            (token, time.time())
+        )
+        return dict(rows.fetchall())
+
+    def quantity(self, token, product_id):
+        row = self._connect().execute(
+            "SELECT e.quantity FROM guest_cart_entries e "
+            "JOIN guest_carts c ON c.token = e.token "
+            "WHERE e.token = ? AND e.product_id = ? AND c.expires_at > ?",
+            (token, product_id, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def add(self, token, product_id, quantity):
+        with self._connect() as conn:
+            self._touch(conn, token)
+            conn.execute(
+                "INSERT INTO guest_cart_entries (token, product_id, quantity) VALUES (?, ?, ?) "
+                "ON CONFLICT (token, product_id) DO UPDATE "
+                "SET quantity = quantity + excluded.quantity",
+                (token, product_id, quantity)
+            )
+            return conn.execute(
+                "SELECT quantity FROM guest_cart_entries WHERE token = ? AND product_id = ?",
+                (token, product_id)
+            ).fetchone()[0]
+
+    def remove(self, token, product_id):
+        with self._connect() as conn:
+            self._touch(conn, token)
+            conn.execute(
+                "DELETE FROM guest_cart_entries WHERE token = ? AND product_id = ?",
+                (token, product_id)
+            )
+
+    def clear(self, token):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM guest_cart_entries WHERE token = ?", (token,))
+            conn.execute("DELETE FROM guest_carts WHERE token = ?", (token,))
+
+    def purge_expired(self, batch_size=500):
+        conn = self._connect()
+        removed = 0
+        while True:
+            with conn:
+                tokens = [row[0] for row in conn.execute(
+                    "SELECT token FROM guest_carts WHERE expires_at <= ? "
+                    "ORDER BY expires_at LIMIT ?",
+                    (time.time(), batch_size)
+                )]
+                if not tokens:
+                    break
+                marks = ','.join('?' * len(tokens))
+                conn.execute(f"DELETE FROM guest_cart_entries WHERE token IN ({marks})", tokens)
+                conn.execute(f"DELETE FROM guest_carts WHERE token IN ({marks})", tokens)
+            removed += len(tokens)
+            if len(tokens) < batch_size:
+                break
+        return removed
+
+
+# ─── Redis ───────────────────────────────────────────────────────────────────
+class RedisCartStore(CartStore):
+    """One hash per cart (product_id -> quantity) with a key TTL."""
+
+    def __init__(self, client, ttl, prefix='cart:'):
+        super().__init__(ttl)
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, token):
+        return f"{self.prefix}{token}"
+
+    def items(self, token):
+        return {
+            int(product_id): int(quantity)
+            for product_id, quantity in self.client.hgetall(self._key(token)).items()
+        }
+
+    def quantity(self, token, product_id):
+        value = self.client.hget(self._key(token), product_id)
+        return int(value) if value else 0
+
+    def add(self, token, product_id, quantity):
+        key = self._key(token)
+        pipe = self.client.pipeline()
+        pipe.hincrby(key, product_id, quantity)
+        pipe.expire(key, self.ttl)
+        return int(pipe.execute()[0])
+
+    def remove(self, token, product_id):
+        key = self._key(token)
+        pipe = self.client.pipeline()
+        pipe.hdel(key, product_id)
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def clear(self, token):
+        self.client.delete(self._key(token))
+
+
+# ─── Backend selection ───────────────────────────────────────────────────────
+def _create_store(app):
+    url = app.config.get('CART_STORE_URL') or ''
+    ttl = app.config.get('CART_SESSION_TTL', 7 * 24 * 3600)
+
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        try:
+            import redis
+        except ImportError:
+            app.logger.warning("CART_STORE_URL is a Redis URL but `redis` is not installed; "
+                               "using the SQLite cart store")
+        else:
+            return RedisCartStore(redis.Redis.from_url(url), ttl)
+
+    if url.startswith('sqlite:///'):
+        path = url[len('sqlite:///'):]
+    else:
+        path = os.path.join(app.instance_path, 'guest_carts.db')
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return SQLiteCartStore(path, ttl)
+
+
+_stores_lock = threading.Lock()
+
+
+def get_cart_store():
+    """The current app's guest cart store, created on first use."""
+    app = current_app._get_current_object()
+    store = app.extensions.get('cart_store')
+    if store is None:
+        with _stores_lock:
+            store = app.extensions.get('cart_store')
+            if store is None:
+                store = app.extensions['cart_store'] = _create_store(app)
+    return store
+
+
+def purge_guest_carts(batch_size=None):
+    """Garbage-collect expired guest carts from the configured store."""
+    batch_size = batch_size or current_app.config.get('CART_STORE_GC_BATCH', 500)
+    return get_cart_store().purge_expired(batch_size)
+
+
+# Expired carts are collected by the background sweeper alongside stock holds
+sweeper.add_task(purge_guest_carts)
@@ -710,7 +710,7 @@ def create_cart_items(customers, products):
         
         for product in selected_products:
             # Remove variant selection since we don't have variants in Product model
-            variant = None
+            variant = ''
             
             # Create a unique key for this combination
             combination_key = (customer.user_id, product.id, variant)
@@ -727,7 +727,7 @@ def create_cart_items(customers, products):
                 quantity=random.randint(1, 3),
                 added_at=now,
                 updated_at=now,
-                variant=variant  # Set to None
+                variant=variant  # No variant
             )
             cart_items.append(cart_item)
     
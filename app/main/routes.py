@@ -1,18 +1,90 @@
-from flask import render_template, request, jsonify, url_for, session
+from flask import render_template, request, jsonify, url_for, session, current_app
 from flask_login import login_required, current_user
 from datetime import datetime
 from sqlalchemy import or_, cast, String
 
 from app.main import bp
 from app.models import Order, Product, Customer
+from app.search.index import search_products
+from app.products.cache import catalog_cache
+from app.utils.pagination import keyset_page, encode_cursor, decode_cursor
+from app.search.suggestions import suggest_products, suggest_orders
 
 # ─────────────────────────────────────────────────────────────────────────────
 # 🏠 HOME ROUTE: Public landing page (no login required)
 # ─────────────────────────────────────────────────────────────────────────────
+def _storefront_page(cursor, per_page):
+    """One newest-first page of the storefront, cached per cursor."""
+    rows = catalog_cache.products(
+        f'home:page:{per_page}:{cursor or ""}',
+        # One extra row tells whether another page follows
+        lambda: keyset_page(
+            Product.query, Product.created_at, Product.id,
+            cursor=cursor, per_page=per_page + 1
+        )[0]
+    )
+    products = rows[:per_page]
+    next_cursor = None
+    if len(rows) > per_page:
+        next_cursor = encode_cursor(products[-1].created_at, products[-1].id)
+    return products, next_cursor
+
+
+def _storefront_strips():
+    """Featured and newest products (top N each), cached with the catalog."""
+    limit = current_app.config.get('HOME_FEATURED_COUNT', 12)
+    featured = catalog_cache.products(
+        f'home:featured:{limit}',
+        lambda: Product.query.filter(Product.is_featured.is_(True))
+        .order_by(Product.created_at.desc()).limit(limit).all()
+    )
+    new_arrivals = catalog_cache.products(
+        f'home:new:{limit}',
+        lambda: Product.query.order_by(Product.created_at.desc(), Product.id.desc())
+        .limit(limit).all()
+    )
+    return featured, new_arrivals
+
+
 @bp.route('/')
 def home():
-    products = Product.query.all()
-    return render_template('home.html', products=products)
+    per_page = current_app.config.get('HOME_PAGE_SIZE', 24)
+    products, next_cursor = _storefront_page(None, per_page)
+    featured, new_arrivals = _storefront_strips()
+    return render_template(
+        'home.html',
+        products=products,
+        next_cursor=next_cursor,
+        featured=featured,
+        new_arrivals=new_arrivals
+    )
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 📜 STOREFRONT PAGES: JSON for infinite scroll on the home page
+# ─────────────────────────────────────────────────────────────────────────────
+@bp.route('/storefront/products')
+def storefront_products():
+    per_page = current_app.config.get('HOME_PAGE_SIZE', 24)
+    cursor = request.args.get('cursor')
+    if cursor and decode_cursor(cursor) is None:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    products, next_cursor = _storefront_page(cursor, per_page)
+    return jsonify({
+        'html': render_template('components/_product_grid_items.html', products=products),
+        'products': [
+            {
+                'id': p.id,
+                'name': p.name,
+                'price': p.price,
+                'image_url': p.image_url,
+                'in_stock': (p.stock_quantity or 0) > 0,
+                'url': url_for('products.view_product', product_id=p.id),
+            }
+            for p in products
+        ],
+        'next_cursor': next_cursor
+    })
 
 # ─────────────────────────────────────────────────────────────────────────────
 # 🧭 INDEX / DASHBOARD ROUTE: Requires login; shows stats
@@ -80,17 +152,15 @@ def dashboard():
 @bp.route('/search')
 def search():
     query = request.args.get('q', '').strip()
+    page = request.args.get('page', 1, type=int)
+    per_page = 20
     products = []
+    product_total = 0
     orders = []
 
     if query:
-        # Product matches (available to all)
-        products = Product.query.filter(
-            or_(
-                Product.name.ilike(f'%{query}%'),
-                Product.description.ilike(f'%{query}%')
-            )
-        ).all()
+        # Product matches (available to all), ranked by the full-text index
+        products, product_total = search_products(query, page=page, per_page=per_page)
 
         # Order matches (depends on user role)
         if current_user.is_authenticated:
@@ -111,6 +181,9 @@ def search():
         'search_results.html',
         query=query,
         products=products,
+        product_total=product_total,
+        page=page,
+        has_next=page * per_page < product_total,
         orders=orders
     )
 
@@ -123,43 +196,29 @@ def search_suggestions():
     suggestions = []
 
     if query:
-        # Product matches (always public)
-        product_matches = Product.query.filter(
-            Product.name.ilike(f"%{query}%")
-        ).limit(5).all()
-
-        for product in product_matches:
+        # Product matches (always public), served from the in-memory prefix index
+        for product in suggest_products(query, limit=5):
             suggestions.append({
                 'type': 'Product',
-                'name': product.name,
-                'url': url_for('products.view_product', product_id=product.id)
+                'name': product['name'],
+                'url': url_for('products.view_product', product_id=product['id'])
             })
 
         # Order matches (only if user is authenticated)
+        order_matches = []
         if current_user.is_authenticated:
             if current_user.is_admin() or current_user.is_staff():
-                order_matches = Order.query.join(Customer).filter(
-                    or_(
-                        cast(Order.id, String).ilike(f"%{query}%"),
-                        Customer.name.ilike(f"%{query}%")
-                    )
-                ).limit(5).all()
-            elif current_user.is_customer():
-                order_matches = Order.query.filter(
-                    Order.customer_id == current_user.id,
-                    cast(Order.id, String).ilike(f"%{query}%")
-                ).limit(5).all()
-            else:
-                order_matches = []
-        else:
-            order_matches = []  # Not logged in: no order suggestions
+                order_matches = suggest_orders(query, limit=5)
+            elif current_user.is_customer() and current_user.customer:
+                order_matches = suggest_orders(
+                    query, limit=5, customer_id=current_user.customer.id
+                )
 
         for order in order_matches:
             suggestions.append({
                 'type': 'Order',
-                'name': f"Order #{order.id} - {order.customer.name}",
-                'url': url_for('orders.view_order', order_id=order.id)
+                'name': f"Order #{order['id']} - {order['customer_name']}",
+                'url': url_for('orders.view_order', order_id=order['id'])
             })
 
     return jsonify(suggestions)
-
@@ -314,32 +314,55 @@ class ProductCategory(db.Model):
     
     @property
     def all_children(self):
-        """Get all descendants in a flat list"""
-        children = []
-        for child in self.children:
-            children.append(child)
-            children.extend(child.all_children)
-        return children
+        """Get all descendants in a flat list (one query via the closure table)"""
+        return (
+            ProductCategory.query
+            .join(ProductCategoryClosure, ProductCategoryClosure.descendant_id == ProductCategory.id)
+            .filter(ProductCategoryClosure.ancestor_id == self.id, ProductCategoryClosure.depth > 0)
+            .order_by(ProductCategoryClosure.depth, ProductCategory.name)
+            .all()
+        )
     
     @property
     def path(self):
-        """Get full category path (breadcrumbs)"""
-        path = []
-        current = self
-        while current:
-            path.append(current)
-            current = current.parent
-        return path[::-1]  # Return from root to current
+        """Get full category path (breadcrumbs), root first, in one query"""
+        return (
+            ProductCategory.query
+            .join(ProductCategoryClosure, ProductCategoryClosure.ancestor_id == ProductCategory.id)
+            .filter(ProductCategoryClosure.descendant_id == self.id)
+            .order_by(ProductCategoryClosure.depth.desc())
+            .all()
+        )
     
     def __repr__(self):
         return f'<Category {self.name} (ID: {self.id})>'
 
+
+class ProductCategoryClosure(db.Model):
+    """
+    One row per (ancestor, descendant) pair of categories, including each
+    category with itself at depth 0. Maintained by app/products/categories.py.
+    """
+    __tablename__ = 'product_category_closure'
+    __table_args__ = (
+        Index('ix_category_closure_descendant', 'descendant_id', 'depth'),
+    )
+
+    ancestor_id = db.Column(db.Integer, db.ForeignKey('product_categories.id'), primary_key=True)
+    descendant_id = db.Column(db.Integer, db.ForeignKey('product_categories.id'), primary_key=True)
+    depth = db.Column(db.Integer, nullable=False)
+
 class Product(db.Model):
     __tablename__ = 'products'
     __table_args__ = (
         Index('ix_products_name', 'name'),
         Index('ix_products_sku', 'sku'),
         Index('ix_products_category', 'category_id'),
+        # Keyset pages of a category listing, newest first
+        Index('ix_products_category_created', 'category_id', 'created_at', 'id'),
+        # Storefront: newest-first keyset pages and the featured strip
+        Index('ix_products_created', 'created_at', 'id'),
+        Index('ix_products_featured_created', 'is_featured', 'created_at'),
         Index('ix_products_vendor', 'vendor_id'),
         CheckConstraint('price >= 0', name='check_price_positive'),
         CheckConstraint('sale_price >= 0 OR sale_price IS NULL', name='check_sale_price_positive'),
@@ -368,9 +391,19 @@ class Product(db.Model):
     download_url = db.Column(db.String(255))
     image_url = db.Column(db.String(255))
     category_id = db.Column(db.Integer, db.ForeignKey('product_categories.id'))
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Keyset pages sort on (created_at, id); a NULL would break the cursor
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Approved-review aggregates, maintained by app/products/ratings.py
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    rating_1 = db.Column(db.Integer, nullable=False, default=0)
+    rating_2 = db.Column(db.Integer, nullable=False, default=0)
+    rating_3 = db.Column(db.Integer, nullable=False, default=0)
+    rating_4 = db.Column(db.Integer, nullable=False, default=0)
+    rating_5 = db.Column(db.Integer, nullable=False, default=0)
+
     # Relationships
     vendor = db.relationship('Vendor', back_populates='products')
     category = db.relationship('ProductCategory', back_populates='products')
@@ -392,10 +425,14 @@ class Product(db.Model):
 
     @property
     def average_rating(self):
-        if not self.reviews:
+        if not self.rating_count:
             return 0
-        total = sum(review.rating for review in self.reviews)
-        return round(total / len(self.reviews), 1)
+        return round(self.rating_sum / self.rating_count, 1)
+
+    @property
+    def rating_histogram(self):
+        """{stars: approved review count} for 5 down to 1 stars."""
+        return {stars: getattr(self, f'rating_{stars}') or 0 for stars in range(5, 0, -1)}
 
     @property
     def current_price(self):
@@ -462,12 +499,15 @@ class Order(db.Model):
         Index('ix_orders_customer', 'customer_id'),
         Index('ix_orders_status', 'status'),
         Index('ix_orders_payment_status', 'payment_status'),
+        Index('ix_orders_order_date_id', 'order_date', 'id'),
         UniqueConstraint('order_number', name='uq_order_order_number'),
         CheckConstraint('subtotal >= 0', name='check_subtotal_positive'),
         CheckConstraint('shipping_cost >= 0', name='check_shipping_cost_positive'),
         CheckConstraint('tax_amount >= 0', name='check_tax_amount_positive'),
         CheckConstraint('discount_amount >= 0', name='check_discount_amount_positive'),
         CheckConstraint('total_amount >= 0', name='check_total_amount_positive'),
+        CheckConstraint('amount_paid >= 0', name='check_amount_paid_positive'),
+        CheckConstraint('amount_refunded >= 0', name='check_amount_refunded_positive'),
     )
 
     id = db.Column(db.Integer, primary_key=True)
@@ -482,6 +522,9 @@ class Order(db.Model):
     tax_amount = db.Column(db.Float, default=0.0, nullable=False)
     discount_amount = db.Column(db.Float, default=0.0)
     total_amount = db.Column(db.Float, default=0.0, nullable=False)
+    # Ledger totals, maintained from Payment/Refund flushes (app/orders/balances.py)
+    amount_paid = db.Column(db.Float, default=0.0, nullable=False)
+    amount_refunded = db.Column(db.Float, default=0.0, nullable=False)
     payment_method = db.Column(db.String(100))
     transaction_id = db.Column(db.String(120))
     estimated_delivery = db.Column(db.DateTime)
@@ -509,8 +552,26 @@ class Order(db.Model):
 
     @property
     def balance_due(self):
-        total_paid = sum(payment.amount for payment in self.payments)
-        return max(self.total_amount - total_paid, 0)
+        return max(self.total_amount - (self.amount_paid or 0), 0)
+
+    def derive_payment_status(self):
+        """payment_status implied by amount_paid / amount_refunded."""
+        paid = self.amount_paid or 0
+        refunded = self.amount_refunded or 0
+        net = paid - refunded
+        if refunded > 0 and net < 0.01:
+            return PaymentStatus.REFUNDED
+        if paid > 0 and net >= (self.total_amount or 0) - 0.005:
+            return PaymentStatus.PAID
+        if net > 0:
+            return PaymentStatus.PARTIALLY_PAID
+        # No money held: keep gateway-driven states (M-PESA push pending/failed)
+        current = self.payment_status
+        if isinstance(current, str):
+            current = PaymentStatus[current.upper()]
+        if current in (PaymentStatus.PENDING, PaymentStatus.FAILED):
+            return current
+        return PaymentStatus.UNPAID
 
     def calculate_totals(self):
         self.subtotal = sum(item.total_price for item in self.items)
@@ -562,6 +623,29 @@ def calculate_total_price(mapper, connection, target):
 
        
 
+class DailySalesRollup(db.Model):
+    """Per-day order totals, maintained from Order/OrderItem/Payment flushes (app/reports/rollup.py)."""
+    __tablename__ = 'daily_sales_rollup'
+    __table_args__ = (
+        UniqueConstraint('date', 'status', 'payment_status', name='uq_daily_sales_rollup_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.Date, nullable=False)
+    status = db.Column(CaseInsensitiveEnum(OrderStatus), nullable=False)
+    payment_status = db.Column(CaseInsensitiveEnum(PaymentStatus), nullable=False)
+    order_count = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(db.Float, default=0.0, nullable=False)
+    tax_amount = db.Column(db.Float, default=0.0, nullable=False)
+    shipping_cost = db.Column(db.Float, default=0.0, nullable=False)
+    discount_amount = db.Column(db.Float, default=0.0, nullable=False)
+    item_count = db.Column(db.Integer, default=0, nullable=False)
+    amount_paid = db.Column(db.Float, default=0.0, nullable=False)
+
+    def __repr__(self):
+        return f"<DailySalesRollup {self.date} {self.status} {self.payment_status}>"
+
+
 class OrderStatusHistory(db.Model):
     __tablename__ = 'order_status_history'
     __table_args__ = (
@@ -778,7 +862,9 @@ class CartItem(db.Model):
     quantity = db.Column(db.Integer, default=1)
     added_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    variant = db.Column(db.String(100))  # For product variants
+    # For product variants; '' (not NULL) when there is none, so the unique
+    # constraint below also covers plain products
+    variant = db.Column(db.String(100), nullable=False, default='', server_default='')
 
     # Relationships
     user = db.relationship('User', back_populates='cart_items')
@@ -819,6 +905,29 @@ class InventoryLog(db.Model):
     product = db.relationship('Product', back_populates='inventory_logs')
     user = db.relationship('User', back_populates='inventory_actions')
 
+class StockReservation(db.Model):
+    """Temporary hold on stock for a cart (app/products/reservations.py)."""
+    __tablename__ = 'stock_reservations'
+    __table_args__ = (
+        UniqueConstraint('owner', 'product_id', name='uq_stock_reservation_owner_product'),
+        # Covers SUM(quantity) of active reservations per product
+        Index('ix_stock_reservations_product_expiry', 'product_id', 'expires_at', 'quantity'),
+        Index('ix_stock_reservations_expiry', 'expires_at'),
+        CheckConstraint('quantity > 0', name='check_reservation_quantity_positive'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    owner = db.Column(db.String(100), nullable=False)  # 'user:<id>' or 'guest:<token>'
+    expires_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    product = db.relationship('Product')
+
+    def __repr__(self):
+        return f"<StockReservation {self.owner} product={self.product_id} qty={self.quantity}>"
+
 class PurchaseOrder(db.Model):
     __tablename__ = 'purchase_orders'
     __table_args__ = (
@@ -1101,10 +1210,20 @@ class AuditLog(db.Model):
 
 class MpesaTransaction(db.Model):
     __tablename__ = "mpesa_transactions"
+    __table_args__ = (
+        Index('ix_mpesa_transactions_reference', 'reference', unique=True),
+        Index('ix_mpesa_transactions_checkout', 'checkout_request_id', unique=True),
+        Index('ix_mpesa_transactions_order', 'order_id'),
+        Index('ix_mpesa_transactions_status_created', 'status', 'created_at'),
+    )
 
     # Primary key
     id = db.Column(db.Integer, primary_key=True)
 
+    # Public handle returned to clients polling an asynchronous STK push
+    reference = db.Column(db.String(64))
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'))
+
     # Customer info
     phone_number = db.Column(db.String(100), nullable=False)
     amount = db.Column(db.Float, nullable=False)
@@ -1146,6 +1265,27 @@ class MpesaTransaction(db.Model):
         if result_desc:
             self.result_desc = result_desc
 
+class MpesaCallback(db.Model):
+    """
+    Raw STK callback payloads; one row per CheckoutRequestID (dedupe store).
+    processed_at stays NULL until the callback has been applied.
+    """
+    __tablename__ = "mpesa_callbacks"
+    __table_args__ = (
+        Index('ix_mpesa_callbacks_checkout', 'checkout_request_id', unique=True),
+        Index('ix_mpesa_callbacks_pending', 'processed_at', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    checkout_request_id = db.Column(db.String(100), nullable=False)
+    result_code = db.Column(db.String(100))
+    payload = db.Column(db.JSON, nullable=False)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    processed_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f"<MpesaCallback {self.checkout_request_id} {self.result_code}>"
+
 # ==========================
 # Login Manager Hook
 # ==========================
@@ -0,0 +1,315 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from app.extensions import db
+from app.models import (
+    MpesaTransaction, MpesaCallback, Order, Payment, PaymentStatus
+)
+
+
+# ─── Parsing & applying ──────────────────────────────────────────────────────
+def parse_callback(data):
+    """
+    Extract the fields we need from a Daraja stkCallback body.
+
+    Returns a dict, or None if the payload is not a valid callback.
+    """
+    try:
+        stk = data["Body"]["stkCallback"]
+        result = {
+            "checkout_request_id": stk["CheckoutRequestID"],
+            "result_code": str(stk["ResultCode"]),
+            "result_desc": stk["ResultDesc"],
+            "receipt": None,
+            "transaction_date": None,
+            "payload": data,
+        }
+    except (KeyError, TypeError):
+        return None
+
+    for item in stk.get("CallbackMetadata", {}).get("Item", []):
+        if item.get("Name") == "MpesaReceiptNumber":
+            result["receipt"] = item.get("Value")
+        elif item.get("Name") == "TransactionDate":
+            result["transaction_date"] = _parse_mpesa_date(item.get("Value"))
+    return result
+
+
+def _parse_mpesa_date(value):
+    # Daraja sends e.g. 20191219102115 (YYYYMMDDHHMMSS, as a number)
+    try:
+        return datetime.strptime(str(value), "%Y%m%d%H%M%S")
+    except (TypeError, ValueError):
+        return None
+
+
+def apply_results(results):
+    """
+    Apply parsed callback results to their transactions.
+
+    Transactions are loaded with one IN query on the indexed
+    checkout_request_id. Applying the same result twice is a no-op.
+    Returns the number of transactions changed. The caller commits.
+    """
+    return _apply(results)[0]
+
+
+def _apply(results):
+    # (transactions changed, CheckoutRequestIDs that matched a transaction)
+    by_checkout = {r["checkout_request_id"]: r for r in results}
+    if not by_checkout:
+        return 0, set()
+
+    txns = MpesaTransaction.query.filter(
+        MpesaTransaction.checkout_request_id.in_(list(by_checkout))
+    ).all()
+
+    settled = []
+    for txn in txns:
+        result = by_checkout[txn.checkout_request_id]
+        if txn.status != "PENDING" and txn.result_code == result["result_code"]:
+            if not (result["receipt"] and not txn.mpesa_receipt_number):
+                continue  # already applied
+            # Settled from a receipt-less STK Query; this callback has the receipt
+        txn.result_code = result["result_code"]
+        txn.result_desc = result["result_desc"]
+        if result["result_code"] == "0":
+            txn.mark_successful(
+                result["receipt"] or txn.mpesa_receipt_number,
+                result["transaction_date"] or txn.transaction_date
+            )
+        else:
+            txn.mark_unsuccessful(result["result_desc"])
+        settled.append(txn)
+
+    found = {t.checkout_request_id for t in txns}
+    for checkout_id in set(by_checkout) - found:
+        current_app.logger.warning(f"Transaction not found: {checkout_id}")
+
+    _settle_orders(settled)
+    return len(settled), found
+
+
+def _settle_orders(txns):
+    """
+    Record Payment rows for successful order transactions (which updates
+    the orders' amount_paid and payment_status on flush) and mark orders
+    still awaiting an STK push as FAILED when it did not go through.
+
+    A payment is keyed by the M-PESA receipt, or by the CheckoutRequestID
+    while the receipt is unknown (a transaction settled by an STK Query);
+    a later callback carrying the receipt re-keys that payment instead of
+    recording a second one. Orders and existing payments are loaded with
+    one query each.
+    """
+    txns = [t for t in txns if t.order_id]
+    if not txns:
+        return
+
+    order_ids = {t.order_id for t in txns}
+    orders = {o.id: o for o in Order.query.filter(Order.id.in_(order_ids))}
+    keys = {
+        key for t in txns
+        for key in (t.mpesa_receipt_number, t.checkout_request_id) if key
+    }
+    recorded = {
+        p.transaction_id: p
+        for p in Payment.query.filter(Payment.transaction_id.in_(keys))
+    } if keys else {}
+
+    for txn in txns:
+        order = orders.get(txn.order_id)
+        if order is None:
+            continue
+        if txn.status == "SUCCESSFUL":
+            receipt = txn.mpesa_receipt_number
+            payment = recorded.get(receipt) or recorded.get(txn.checkout_request_id)
+            if payment is not None:
+                if receipt and payment.transaction_id != receipt:
+                    payment.transaction_id = receipt
+                    payment.payment_date = txn.transaction_date or payment.payment_date
+                    recorded[receipt] = payment
+                continue
+            key = receipt or txn.checkout_request_id
+            payment = recorded[key] = Payment(
+                order_id=order.id,
+                customer_id=order.customer_id,
+                amount=txn.amount,
+                method="M-PESA",
+                transaction_id=key,
+                status=PaymentStatus.PAID,
+                payment_gateway="MPESA",
+                payment_date=txn.transaction_date or datetime.utcnow()
+            )
+            db.session.add(payment)
+        elif order.payment_status == PaymentStatus.PENDING:
+            order.payment_status = PaymentStatus.FAILED
+
+
+# ─── Stored callbacks ────────────────────────────────────────────────────────
+def store_callback(result):
+    """
+    Persist a parsed callback as an unprocessed MpesaCallback row and
+    commit. Called before Safaricom is acknowledged, so an acknowledged
+    callback survives a restart. The mpesa_callbacks table is the dedupe
+    store: returns None when this CheckoutRequestID is already stored (a
+    gateway retry), else the new row.
+    """
+    row = MpesaCallback(
+        checkout_request_id=result["checkout_request_id"],
+        result_code=result["result_code"],
+        payload=result["payload"],
+        received_at=datetime.utcnow()
+    )
+    db.session.add(row)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return None
+    return row
+
+
+def apply_callbacks(rows):
+    """
+    Apply stored MpesaCallback rows and stamp processed_at on those whose
+    transaction was found. A callback for an unknown CheckoutRequestID
+    stays unprocessed, so it is applied once the transaction exists (e.g.
+    the push job had not saved the id yet) instead of being swallowed as a
+    duplicate. Returns the number of transactions changed; the caller
+    commits.
+    """
+    parsed = {}
+    for row in rows:
+        result = parse_callback(row.payload)
+        if result:
+            parsed[row.checkout_request_id] = result
+    changed, found = _apply(list(parsed.values()))
+
+    now = datetime.utcnow()
+    for row in rows:
+        if row.checkout_request_id in found or row.checkout_request_id not in parsed:
+            row.processed_at = now
+    return changed
+
+
+def process_pending_callbacks(batch_size=100, since=None):
+    """
+    Apply unprocessed stored callbacks in id order, one commit per batch.
+    Rows are locked with SKIP LOCKED where supported, so several workers
+    can drain the table at once. `since` limits the scan to callbacks
+    received after it. Returns (processed, still_pending).
+    """
+    query = MpesaCallback.query.filter(MpesaCallback.processed_at.is_(None))
+    if since:
+        query = query.filter(MpesaCallback.received_at >= since)
+
+    processed = pending = 0
+    last_id = 0
+    while True:
+        rows = (
+            query.filter(MpesaCallback.id > last_id)
+            .order_by(MpesaCallback.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        if not rows:
+            break
+        last_id = rows[-1].id
+        apply_callbacks(rows)
+        done = sum(1 for row in rows if row.processed_at is not None)
+        db.session.commit()
+        processed += done
+        pending += len(rows) - done
+        if len(rows) < batch_size:
+            break
+    return processed, pending
+
+
+def replay_callbacks(checkout_ids=None, since=None, batch_size=500):
+    """
+    Re-apply stored raw payloads (e.g. after fixing a bug in apply logic).
+
+    Returns (replayed, changed).
+    """
+    query = MpesaCallback.query.order_by(MpesaCallback.id)
+    if checkout_ids:
+        query = query.filter(MpesaCallback.checkout_request_id.in_(checkout_ids))
+    if since:
+        query = query.filter(MpesaCallback.received_at >= since)
+
+    replayed = changed = 0
+    last_id = 0
+    while True:
+        rows = query.filter(MpesaCallback.id > last_id).limit(batch_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        changed += apply_callbacks(rows)
+        db.session.commit()
+        replayed += len(rows)
+    return replayed, changed
+
+
+# ─── Background ingestion ────────────────────────────────────────────────────
+class CallbackIngestor:
+    """
+    Applies stored callbacks in batches from a daemon thread, so the HTTP
+    handler only has to insert the raw row before acknowledging Safaricom.
+    The handler calls wake() after storing; the thread waits flush_interval
+    for more callbacks to arrive, then drains every unprocessed row. It
+    also wakes every poll_interval seconds, which retries callbacks whose
+    transaction was not found yet (for up to retry_window seconds) and
+    picks up rows stored just before a restart.
+    """
+
+    def __init__(self, batch_size=100, flush_interval=0.5, poll_interval=30,
+                 retry_window=3600):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.poll_interval = poll_interval
+        self.retry_window = retry_window
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._app = None
+
+    def wake(self):
+        """Ask the thread to apply stored callbacks soon."""
+        self._ensure_started()
+        self._wake.set()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._app = current_app._get_current_object()
+                cfg = self._app.config
+                self.batch_size = cfg.get("MPESA_CALLBACK_BATCH_SIZE", self.batch_size)
+                self.flush_interval = cfg.get("MPESA_CALLBACK_FLUSH_INTERVAL", self.flush_interval)
+                self.poll_interval = cfg.get("MPESA_CALLBACK_POLL_INTERVAL", self.poll_interval)
+                self.retry_window = cfg.get("MPESA_CALLBACK_RETRY_WINDOW", self.retry_window)
+                self._thread = threading.Thread(
+                    target=self._run, name="mpesa-callbacks", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            if self._wake.wait(self.poll_interval):
+                time.sleep(self.flush_interval)  # let a burst share one batch
+            self._wake.clear()
+            since = datetime.utcnow() - timedelta(seconds=self.retry_window)
+            with self._app.app_context():
+                try:
+                    process_pending_callbacks(self.batch_size, since)
+                except Exception:
+                    db.session.rollback()
+                    self._app.logger.exception("Failed to apply stored M-PESA callbacks")
+                finally:
+                    db.session.remove()
+
+
+ingestor = CallbackIngestor()
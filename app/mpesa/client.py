@@ -0,0 +1,121 @@
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from flask import current_app
+
+BASE_URLS = {
+    "sandbox": "https://sandbox.safaricom.co.ke",
+    "production": "https://api.safaricom.co.ke",
+}
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class GatewayClient:
+    """
+    Shared HTTP client for Safaricom Daraja calls.
+
+    Keeps one `requests.Session` with a keep-alive connection pool, so
+    consecutive payments reuse TCP+TLS connections instead of opening a new
+    one per call. Retries are bounded and use exponential backoff with full
+    jitter. Non-idempotent requests (STK push) are only retried when the
+    connection could not be established, so a request that may have reached
+    Safaricom is never sent twice.
+    """
+
+    def __init__(self, base_url, pool_size=10, connect_timeout=3.05,
+                 read_timeout=15, max_retries=2, backoff=0.25):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            pool_block=True,
+            max_retries=0,
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def url(self, path):
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def _sleep_before_retry(self, attempt):
+        # Full jitter: uniform in [0, backoff * 2^attempt]
+        time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    def request(self, method, path, idempotent=None, retry_statuses=RETRYABLE_STATUS,
+                **kwargs):
+        if idempotent is None:
+            idempotent = method.upper() in ("GET", "HEAD", "OPTIONS")
+        kwargs.setdefault("timeout", self.timeout)
+
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, self.url(path), **kwargs)
+            except requests.exceptions.ConnectionError as exc:
+                # ConnectTimeout is a ConnectionError; ReadTimeout is not
+                retryable = idempotent or isinstance(
+                    exc, requests.exceptions.ConnectTimeout
+                ) or _never_sent(exc)
+                if not retryable or attempt >= self.max_retries:
+                    raise
+            except requests.exceptions.Timeout:
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+            else:
+                if not (idempotent and response.status_code in retry_statuses
+                        and attempt < self.max_retries):
+                    return response
+                response.close()
+
+            self._sleep_before_retry(attempt)
+            attempt += 1
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def _never_sent(exc):
+    """True when the connection failed before any bytes were written."""
+    cause = exc.args[0] if exc.args else None
+    reason = getattr(cause, "reason", None)
+    name = type(reason).__name__ if reason is not None else ""
+    return name in ("NewConnectionError", "NameResolutionError")
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_gateway_client():
+    """Return the process-wide gateway client for the current app config."""
+    cfg = current_app.config
+    base_url = cfg.get("MPESA_BASE_URL") or BASE_URLS.get(
+        cfg.get("MPESA_ENV", "sandbox"), BASE_URLS["sandbox"]
+    )
+    with _clients_lock:
+        client = _clients.get(base_url)
+        if client is None:
+            client = GatewayClient(
+                base_url,
+                pool_size=cfg.get("MPESA_HTTP_POOL_SIZE", 10),
+                connect_timeout=cfg.get("MPESA_CONNECT_TIMEOUT", 3.05),
+                read_timeout=cfg.get("MPESA_READ_TIMEOUT", 15),
+                max_retries=cfg.get("MPESA_MAX_RETRIES", 2),
+                backoff=cfg.get("MPESA_RETRY_BACKOFF", 0.25),
+            )
+            _clients[base_url] = client
+        return client
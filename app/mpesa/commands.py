@@ -0,0 +1,38 @@
+import time
+import click
+from datetime import datetime
+from app.mpesa.routes import bp
+from app.mpesa.callbacks import replay_callbacks
+from app.mpesa.reconcile import reconcile_pending
+
+
+@bp.cli.command('replay-callbacks')
+@click.option('--checkout-id', 'checkout_ids', multiple=True,
+              help='Only replay this CheckoutRequestID (repeatable).')
+@click.option('--since', help='Only replay callbacks received on/after this ISO date.')
+def replay_callbacks_command(checkout_ids, since):
+    """Re-apply stored raw STK callback payloads to their transactions."""
+    since_dt = datetime.fromisoformat(since) if since else None
+    replayed, changed = replay_callbacks(list(checkout_ids) or None, since_dt)
+    click.echo(f"Replayed {replayed} callbacks; {changed} transactions updated.")
+
+
+@bp.cli.command('reconcile')
+@click.option('--stale-after', type=int, help='Seconds a PENDING transaction must age first.')
+@click.option('--batch-size', type=int, help='Transactions applied per commit.')
+@click.option('--concurrency', type=int, help='Parallel STK Query requests.')
+@click.option('--loop', 'interval', type=int, default=0,
+              help='Keep running, reconciling every N seconds.')
+def reconcile_command(stale_after, batch_size, concurrency, interval):
+    """Query Daraja for stale PENDING transactions and apply the outcomes."""
+    while True:
+        summary = reconcile_pending(stale_after, batch_size, concurrency)
+        click.echo(
+            f"Applied {summary['callbacks']} stored callbacks. "
+            f"Checked {summary['checked']}, updated {summary['updated']}, "
+            f"still pending {summary['still_pending']}, "
+            f"abandoned {summary['abandoned']}."
+        )
+        if not interval:
+            break
+        time.sleep(interval)
@@ -0,0 +1,107 @@
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from app.extensions import db
+from app.models import MpesaTransaction, Order
+from app.mpesa.service import stk_push
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Process-local pool that performs STK pushes off the request thread.
+
+    Created lazily so each forked gunicorn worker gets its own threads.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=current_app.config.get("MPESA_PUSH_WORKERS", 4),
+                thread_name_prefix="stk-push"
+            )
+        return _executor
+
+
+class InvalidOrder(ValueError):
+    """A client-supplied order_id that the user may not pay for."""
+
+
+def payable_order_id(order_id, user):
+    """
+    Coerce a client-supplied order id to int and check that the order
+    exists and that `user` may pay for it: its own customer, or staff and
+    admins. Returns the id; raises InvalidOrder otherwise (the same message
+    for missing and foreign orders).
+    """
+    try:
+        order_id = int(order_id)
+    except (TypeError, ValueError):
+        raise InvalidOrder("order_id must be an integer")
+
+    order = db.session.get(Order, order_id)
+    if order is None or user is None or not user.is_authenticated:
+        raise InvalidOrder("Order not found")
+    if not (user.is_admin() or user.is_staff()):
+        if not order.customer or order.customer.user_id != user.id:
+            raise InvalidOrder("Order not found")
+    return order_id
+
+
+def queue_stk_push(phone, amount, order_id=None):
+    """
+    Persist a PENDING transaction and hand the STK push to the background
+    executor. Returns the transaction immediately; clients follow it through
+    its `reference`. `order_id` must already be validated (payable_order_id).
+    """
+    txn = MpesaTransaction(
+        reference=uuid.uuid4().hex,
+        order_id=order_id,
+        phone_number=phone,
+        amount=amount,
+        status="PENDING"
+    )
+    db.session.add(txn)
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    get_executor().submit(_run_stk_push, app, txn.id)
+    return txn
+
+
+def _run_stk_push(app, txn_id):
+    with app.app_context():
+        try:
+            txn = db.session.get(MpesaTransaction, txn_id)
+            if txn is None:
+                return
+            try:
+                response = stk_push(txn.amount, txn.phone_number)
+            except Exception as e:
+                app.logger.error(f"STK Push failed for {txn.reference}: {e}")
+                txn.mark_unsuccessful("Failed to initiate STK push")
+            else:
+                txn.merchant_request_id = response.get("MerchantRequestID")
+                txn.checkout_request_id = response.get("CheckoutRequestID")
+                txn.result_code = str(response.get("ResponseCode", ""))
+                txn.result_desc = response.get("ResponseDescription")
+            db.session.commit()
+        finally:
+            db.session.remove()
+
+
+def transaction_status(txn):
+    """Serializable view of a transaction for the status endpoint."""
+    return {
+        "reference": txn.reference,
+        "status": txn.status,
+        "order_id": txn.order_id,
+        "amount": txn.amount,
+        "checkout_request_id": txn.checkout_request_id,
+        "result_code": txn.result_code,
+        "result_desc": txn.result_desc,
+        "receipt": txn.mpesa_receipt_number,
+    }
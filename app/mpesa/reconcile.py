@@ -0,0 +1,137 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, or_
+from app.extensions import db
+from app.models import MpesaTransaction
+from app.mpesa.callbacks import apply_results, process_pending_callbacks
+from app.mpesa.service import stk_query
+
+def find_stale_pending(older_than, limit, after=None):
+    """
+    PENDING transactions created before `older_than`, oldest first, as
+    (id, checkout_request_id, created_at) rows. `after` is the
+    (created_at, id) of the last row already seen. Served by the
+    (status, created_at) index.
+    """
+    query = (
+        db.session.query(
+            MpesaTransaction.id,
+            MpesaTransaction.checkout_request_id,
+            MpesaTransaction.created_at
+        )
+        .filter(
+            MpesaTransaction.status == "PENDING",
+            MpesaTransaction.created_at < older_than
+        )
+    )
+    if after:
+        created_at, txn_id = after
+        query = query.filter(or_(
+            MpesaTransaction.created_at > created_at,
+            and_(MpesaTransaction.created_at == created_at, MpesaTransaction.id > txn_id)
+        ))
+    return (
+        query
+        .order_by(MpesaTransaction.created_at, MpesaTransaction.id)
+        .limit(limit)
+        .all()
+    )
+
+
+def _query_one(app, checkout_request_id):
+    with app.app_context():
+        try:
+            return checkout_request_id, stk_query(checkout_request_id)
+        except Exception as e:
+            app.logger.warning(f"STK query failed for {checkout_request_id}: {e}")
+            return checkout_request_id, None
+
+
+def _to_result(checkout_request_id, body):
+    """Map an STK Query answer to the shape apply_results() expects."""
+    if not body or "ResultCode" not in body:
+        return None  # still processing, or the query itself failed
+    return {
+        "checkout_request_id": checkout_request_id,
+        "result_code": str(body["ResultCode"]),
+        "result_desc": body.get("ResultDesc"),
+        "receipt": None,
+        "transaction_date": None,
+        "payload": body,
+    }
+
+
+def reconcile_pending(stale_after=None, batch_size=None, concurrency=None):
+    """
+    Resolve PENDING transactions whose callback never arrived. Stored but
+    unapplied callbacks are applied first.
+
+    Stale rows are processed in batches: their statuses are queried from
+    Daraja with bounded concurrency, then all answers for the batch are
+    applied (transactions, payments, order payment status) in one commit.
+    Returns a summary dict.
+    """
+    cfg = current_app.config
+    stale_after = stale_after or cfg.get("MPESA_RECONCILE_AFTER", 120)
+    batch_size = batch_size or cfg.get("MPESA_RECONCILE_BATCH_SIZE", 200)
+    concurrency = concurrency or cfg.get("MPESA_RECONCILE_CONCURRENCY", 8)
+
+    # Stored callbacks not applied yet (e.g. the worker restarted) settle
+    # their transactions without a Daraja query
+    window = cfg.get("MPESA_CALLBACK_RETRY_WINDOW", 3600)
+    applied, _ = process_pending_callbacks(
+        batch_size, since=datetime.utcnow() - timedelta(seconds=window)
+    )
+
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=stale_after)
+    abandon_cutoff = now - timedelta(seconds=max(
+        stale_after, cfg.get("MPESA_PUSH_ABANDON_AFTER", 1800)
+    ))
+    app = current_app._get_current_object()
+    summary = {"callbacks": applied, "checked": 0, "updated": 0,
+               "still_pending": 0, "abandoned": 0}
+    after = None
+
+    with ThreadPoolExecutor(max_workers=concurrency,
+                            thread_name_prefix="stk-reconcile") as pool:
+        while True:
+            rows = find_stale_pending(cutoff, batch_size, after)
+            if not rows:
+                break
+            after = (rows[-1].created_at, rows[-1].id)
+
+            # Pushes that never got a CheckoutRequestID cannot be queried.
+            # Until MPESA_PUSH_ABANDON_AFTER they may still be waiting in a
+            # worker's push queue (app/mpesa/jobs.py), so leave those alone.
+            orphans = [
+                r.id for r in rows
+                if not r.checkout_request_id and r.created_at < abandon_cutoff
+            ]
+            summary["still_pending"] += sum(
+                1 for r in rows
+                if not r.checkout_request_id and r.created_at >= abandon_cutoff
+            )
+            if orphans:
+                (MpesaTransaction.query
+                 .filter(MpesaTransaction.id.in_(orphans))
+                 .update({
+                     "status": "UNSUCCESSFUL",
+                     "result_desc": "STK push was never initiated"
+                 }, synchronize_session=False))
+                summary["abandoned"] += len(orphans)
+
+            queried = [r for r in rows if r.checkout_request_id]
+            answers = pool.map(
+                lambda r: _query_one(app, r.checkout_request_id), queried
+            )
+            results = [res for res in (_to_result(cid, body) for cid, body in answers) if res]
+
+            summary["checked"] += len(queried)
+            summary["updated"] += apply_results(results)
+            # Rows Daraja still reports as processing stay PENDING for the next run
+            summary["still_pending"] += len(queried) - len(results)
+            db.session.commit()
+
+    return summary
@@ -1,7 +1,13 @@
-from flask import Blueprint, request, jsonify, current_app
-from app.extensions import db
+from flask import Blueprint, request, jsonify, current_app, url_for
+from flask_login import current_user
+from app.extensions import db, csrf
+from app.models import MpesaTransaction
 
 from app.mpesa.service import stk_push
+from app.mpesa.jobs import (
+    InvalidOrder, payable_order_id, queue_stk_push, transaction_status
+)
+from app.mpesa.callbacks import parse_callback, store_callback, apply_callbacks, ingestor
 
 bp = Blueprint("mpesa", __name__, url_prefix="/mpesa")
 
@@ -30,6 +36,22 @@ def initiate_stk_push():
     if not phone or not amount:
         return jsonify({"error": "phone and amount are required"}), 400
 
+    order_id = data.get("order_id")
+    if order_id is not None:
+        try:
+            order_id = payable_order_id(order_id, current_user)
+        except InvalidOrder as e:
+            return jsonify({"error": str(e)}), 400
+
+    if current_app.config.get("MPESA_ASYNC_PUSH", True):
+        txn = queue_stk_push(phone, amount, order_id=order_id)
+        status_url = url_for("mpesa.stk_status", reference=txn.reference)
+        return jsonify({
+            "status": "PENDING",
+            "reference": txn.reference,
+            "status_url": status_url
+        }), 202, {"Location": status_url, "Retry-After": "3"}
+
     try:
         response = stk_push(amount, phone)
     except Exception as e:
@@ -50,51 +72,54 @@ def initiate_stk_push():
     return jsonify(response), 200
 
 
+@bp.route("/status/<reference>", methods=["GET"])
+def stk_status(reference):
+    """
+    Poll the outcome of an STK push started in asynchronous mode
+    """
+    txn = MpesaTransaction.query.filter_by(reference=reference).first()
+    if not txn:
+        return jsonify({"error": "Unknown reference"}), 404
+
+    body = transaction_status(txn)
+    if txn.status == "PENDING":
+        return jsonify(body), 200, {"Retry-After": "3"}
+    return jsonify(body), 200
+
+
 @bp.route("/callback", methods=["POST"])
+@csrf.exempt
 def mpesa_callback():
     """
     Safaricom STK callback handler
+
+    The raw callback is committed to mpesa_callbacks before Safaricom is
+    acknowledged; it is then applied in batches by the callback ingestor
+    (app/mpesa/callbacks.py). Retries of a stored callback are ignored.
     """
     data = request.get_json(silent=True) or {}
 
-    try:
-        stk = data["Body"]["stkCallback"]
-        checkout_id = stk["CheckoutRequestID"]
-        result_code = stk["ResultCode"]
-        result_desc = stk["ResultDesc"]
-    except KeyError:
+    result = parse_callback(data)
+    if result is None:
         current_app.logger.error("Invalid callback payload")
         return jsonify({"ResultCode": 0, "ResultDesc": "Invalid payload"})
 
-    txn = MpesaTransaction.query.filter_by(
-        checkout_request_id=checkout_id
-    ).first()
-
-    if not txn:
-        current_app.logger.warning(f"Transaction not found: {checkout_id}")
-        return jsonify({"ResultCode": 0, "ResultDesc": "Transaction not found"})
-
-    txn.result_code = str(result_code)
-    txn.result_desc = result_desc
-
-    if result_code == 0:
-        items = stk.get("CallbackMetadata", {}).get("Item", [])
-
-        receipt = None
-        trx_date = None
-
-        for item in items:
-            if item["Name"] == "MpesaReceiptNumber":
-                receipt = item.get("Value")
-            elif item["Name"] == "TransactionDate":
-                trx_date = item.get("Value")
+    try:
+        row = store_callback(result)
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception("Failed to store M-PESA callback")
+        # Not acknowledged, so Safaricom retries it
+        return jsonify({"ResultCode": 1, "ResultDesc": "Temporary failure"}), 500
+
+    if row is not None:
+        if current_app.config.get("MPESA_CALLBACK_QUEUE", True):
+            ingestor.wake()
+        else:
+            apply_callbacks([row])
+            db.session.commit()
 
-        txn.mpesa_receipt_number = receipt
-        txn.transaction_date = str(trx_date)
-        txn.status = "SUCCESS"
-    else:
-        txn.status = "FAILED"
+    return jsonify({"ResultCode": 0, "ResultDesc": "OK"})
 
-    db.session.commit()
 
-    return jsonify({"ResultCode": 0, "ResultDesc": "OK"})
+from app.mpesa import commands  # noqa: E402  (registers bp.cli commands)
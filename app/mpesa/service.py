@@ -1,35 +1,59 @@
 import base64
-import requests
 from datetime import datetime
 from requests.auth import HTTPBasicAuth
 from flask import current_app
+from app.mpesa.client import get_gateway_client
+from app.mpesa.token_cache import token_cache
 
+OAUTH_PATH = "/oauth/v1/generate?grant_type=client_credentials"
+STK_PUSH_PATH = "/mpesa/stkpush/v1/processrequest"
+STK_QUERY_PATH = "/mpesa/stkpushquery/v1/query"
 
-def get_access_token():
-    cfg = current_app.config
-    url = "https://sandbox.safaricom.co.ke/oauth/v1/generate?grant_type=client_credentials"
 
-    response = requests.get(
-        url,
+def _token_key(cfg, client):
+    return client.url(OAUTH_PATH), cfg["MPESA_CONSUMER_KEY"]
+
+
+def _fetch_access_token(cfg, client):
+    response = client.get(
+        OAUTH_PATH,
         auth=HTTPBasicAuth(
             cfg["MPESA_CONSUMER_KEY"],
             cfg["MPESA_CONSUMER_SECRET"]
-        ),
-        timeout=10
+        )
     )
 
     response.raise_for_status()
-    return response.json().get("access_token")
+    data = response.json()
+    # Daraja returns expires_in as a string, e.g. "3599"
+    return data.get("access_token"), int(data.get("expires_in", 3599))
 
 
-def stk_push(amount, phone):
+def get_access_token(force_refresh=False):
+    """
+    Return a valid OAuth access token, fetching a new one only when the
+    cached token is missing or about to expire.
+    """
     cfg = current_app.config
-    access_token = get_access_token()
+    client = get_gateway_client()
+    key = _token_key(cfg, client)
+    if force_refresh:
+        token_cache.invalidate(key)
+    return token_cache.get(key, lambda: _fetch_access_token(cfg, client))
+
 
+def _password(cfg):
     timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
     password = base64.b64encode(
         f"{cfg['MPESA_SHORTCODE']}{cfg['MPESA_PASSKEY']}{timestamp}".encode()
     ).decode()
+    return password, timestamp
+
+
+def stk_push(amount, phone):
+    cfg = current_app.config
+    access_token = get_access_token()
+    password, timestamp = _password(cfg)
 
     payload = {
         "BusinessShortCode": cfg["MPESA_SHORTCODE"],
@@ -45,17 +69,66 @@ def stk_push(amount, phone):
         "TransactionDesc": "Order Payment"
     }
 
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
+    client = get_gateway_client()
 
-    response = requests.post(
-        "https://sandbox.safaricom.co.ke/mpesa/stkpush/v1/processrequest",
-        json=payload,
-        headers=headers,
-        timeout=15
-    )
+    def _post(token):
+        return client.post(
+            STK_PUSH_PATH,
+            json=payload,
+            headers={
+                "Authorization": f"Bearer {token}",
+                "Content-Type": "application/json"
+            }
+        )
+
+    response = _post(access_token)
+    if response.status_code == 401:
+        # Token revoked or expired early: refresh once and retry
+        response = _post(get_access_token(force_refresh=True))
 
     response.raise_for_status()
     return response.json()
+
+
+def stk_query(checkout_request_id):
+    """
+    Ask Daraja for the outcome of an STK push (STK Query).
+
+    Returns the JSON body. While the customer has not responded yet,
+    Daraja answers with an errorCode instead of a ResultCode.
+    """
+    cfg = current_app.config
+    password, timestamp = _password(cfg)
+    payload = {
+        "BusinessShortCode": cfg["MPESA_SHORTCODE"],
+        "Password": password,
+        "Timestamp": timestamp,
+        "CheckoutRequestID": checkout_request_id
+    }
+    client = get_gateway_client()
+
+    def _post(token):
+        # A status query has no side effects, so it may be retried; plain
+        # 500s are excluded because Daraja uses them for "still processing"
+        return client.post(
+            STK_QUERY_PATH,
+            json=payload,
+            headers={"Authorization": f"Bearer {token}"},
+            idempotent=True,
+            retry_statuses={429, 502, 503, 504}
+        )
+
+    response = _post(get_access_token())
+    if response.status_code == 401:
+        response = _post(get_access_token(force_refresh=True))
+    # Daraja reports "still processing" as HTTP 500 with an errorCode body
+    if response.status_code >= 400 and "errorCode" not in _json_or_empty(response):
+        response.raise_for_status()
+    return _json_or_empty(response)
+
+
+def _json_or_empty(response):
+    try:
+        return response.json()
+    except ValueError:
+        return {}
@@ -0,0 +1,60 @@
+import threading
+import time
+
+
+class AccessTokenCache:
+    """
+    Process-wide cache for Daraja OAuth access tokens.
+
+    Tokens are cached per (oauth_url, consumer_key) and reused until
+    `refresh_margin` seconds before their `expires_in` runs out. When a
+    refresh is needed, one caller performs it while concurrent callers for
+    the same credentials wait on the same lock and reuse its result, so an
+    expiry never causes a stampede against the OAuth endpoint.
+    """
+
+    def __init__(self, refresh_margin=60, clock=time.monotonic):
+        self.refresh_margin = refresh_margin
+        self._clock = clock
+        self._tokens = {}       # key -> (token, expires_at)
+        self._locks = {}        # key -> refresh lock
+        self._guard = threading.Lock()
+
+    def _refresh_lock(self, key):
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _valid(self, key):
+        entry = self._tokens.get(key)
+        if entry and self._clock() < entry[1] - self.refresh_margin:
+            return entry[0]
+        return None
+
+    def get(self, key, fetch):
+        """
+        Return a cached token for `key`, calling `fetch()` to refresh it.
+
+        `fetch` must return (access_token, expires_in_seconds).
+        """
+        token = self._valid(key)
+        if token:
+            return token
+
+        with self._refresh_lock(key):
+            # Another thread may have refreshed while we waited
+            token = self._valid(key)
+            if token:
+                return token
+            token, expires_in = fetch()
+            self._tokens[key] = (token, self._clock() + float(expires_in))
+            return token
+
+    def invalidate(self, key=None):
+        """Drop one cached token (e.g. after a 401), or all of them."""
+        if key is None:
+            self._tokens.clear()
+        else:
+            self._tokens.pop(key, None)
+
+
+token_cache = AccessTokenCache()
@@ -2,4 +2,4 @@ from flask import Blueprint
 
 bp = Blueprint('orders', __name__)
 
-from app.orders import routes
\ No newline at end of file
+from app.orders import routes, balances, commands
\ No newline at end of file
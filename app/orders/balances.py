@@ -0,0 +1,174 @@
+# app/orders/balances.py
+"""
+Order.amount_paid / Order.amount_refunded maintenance.
+
+Before each flush, new, changed and deleted Payment and Refund rows are
+turned into deltas on their orders' ledger columns, and each affected
+order's payment_status is re-derived. The order updates are part of the
+same flush, so they commit or roll back together with the ledger rows.
+Failed payments and refunds that are not yet processed do not count.
+
+verify_balances() recomputes the columns from the ledger tables in bulk
+and repairs any drift (e.g. rows written with set-based statements).
+"""
+from collections import defaultdict
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session
+from app.extensions import db
+from app.models import Order, Payment, Refund, PaymentStatus, RefundStatus
+
+
+def _as_enum(enum_class, value):
+    if isinstance(value, str):
+        return enum_class[value.upper()]
+    return value
+
+
+def _payment_value(amount, status):
+    if _as_enum(PaymentStatus, status) == PaymentStatus.FAILED:
+        return 0.0
+    return amount or 0.0
+
+
+def _refund_value(amount, status):
+    if _as_enum(RefundStatus, status) == RefundStatus.PROCESSED:
+        return amount or 0.0
+    return 0.0
+
+
+# (ledger model, Order column, counted amount)
+LEDGERS = (
+    (Payment, 'amount_paid', _payment_value),
+    (Refund, 'amount_refunded', _refund_value),
+)
+TRACKED = ('amount', 'status', 'order_id', 'order')
+
+
+def _changed(obj):
+    state = inspect(obj)
+    return any(state.attrs[f].history.has_changes() for f in TRACKED)
+
+
+def _order_of(session, obj):
+    order = inspect(obj).dict.get('order')
+    if order is None and obj.order_id is not None:
+        order = session.get(Order, obj.order_id)
+    return order
+
+
+def refresh_payment_status(order):
+    status = order.derive_payment_status()
+    if _as_enum(PaymentStatus, order.payment_status) != status:
+        order.payment_status = status
+
+
+@event.listens_for(Session, 'before_flush')
+def _apply_ledger_changes(session, flush_context, instances):
+    deltas = defaultdict(lambda: defaultdict(float))
+
+    for model, column, value in LEDGERS:
+        new = [o for o in session.new if isinstance(o, model)]
+        changed = [o for o in session.dirty if isinstance(o, model) and _changed(o)]
+        deleted = [o for o in session.deleted if isinstance(o, model)]
+        if not (new or changed or deleted):
+            continue
+
+        # Take old values from the database: in-memory history is empty
+        # for attributes that were expired before being changed
+        old_ids = [o.id for o in changed + deleted]
+        if old_ids:
+            rows = session.execute(
+                select(model.order_id, model.amount, model.status)
+                .where(model.id.in_(old_ids))
+            )
+            for order_id, amount, status in rows:
+                order = session.get(Order, order_id)
+                if order is not None:
+                    deltas[order][column] -= value(amount, status)
+
+        for obj in new + changed:
+            order = _order_of(session, obj)
+            if order is not None:
+                deltas[order][column] += value(obj.amount, obj.status)
+
+    for order, columns in deltas.items():
+        if order in session.deleted:
+            continue
+        for column, delta in columns.items():
+            if delta:
+                setattr(order, column, round((getattr(order, column) or 0) + delta, 2))
+        refresh_payment_status(order)
+
+    # Paid orders whose total changed may now be only partially paid
+    for order in session.dirty:
+        if (isinstance(order, Order) and order not in deltas
+                and inspect(order).attrs.total_amount.history.has_changes()):
+            refresh_payment_status(order)
+
+
+# ─── Verification ────────────────────────────────────────────────────────────
+def _ledger_totals(model, value_column, counted):
+    return (
+        select(model.order_id, func.sum(value_column).label('total'))
+        .where(counted)
+        .group_by(model.order_id)
+        .subquery()
+    )
+
+
+def verify_balances(fix=False, chunk_size=1000, progress=None):
+    """
+    Compare every order's amount_paid / amount_refunded with the sums of
+    its payments and refunds, walking orders by id in chunks with one
+    aggregate query per chunk.
+
+    With `fix`, mismatched orders are corrected (and their payment_status
+    re-derived) through the ORM, committing per chunk. Returns
+    (checked, mismatched order ids).
+    """
+    paid = _ledger_totals(
+        Payment, Payment.amount,
+        (Payment.status.is_(None)) | (Payment.status != PaymentStatus.FAILED)
+    )
+    refunded = _ledger_totals(Refund, Refund.amount, Refund.status == RefundStatus.PROCESSED)
+
+    checked = 0
+    mismatched = []
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(
+                Order.id,
+                Order.amount_paid,
+                Order.amount_refunded,
+                func.coalesce(paid.c.total, 0),
+                func.coalesce(refunded.c.total, 0)
+            )
+            .outerjoin(paid, paid.c.order_id == Order.id)
+            .outerjoin(refunded, refunded.c.order_id == Order.id)
+            .where(Order.id > last_id)
+            .order_by(Order.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        checked += len(rows)
+
+        wrong = {
+            order_id: (round(ledger_paid, 2), round(ledger_refunded, 2))
+            for order_id, amount_paid, amount_refunded, ledger_paid, ledger_refunded in rows
+            if abs((amount_paid or 0) - ledger_paid) >= 0.005
+            or abs((amount_refunded or 0) - ledger_refunded) >= 0.005
+        }
+        mismatched.extend(wrong)
+
+        if fix and wrong:
+            for order in Order.query.filter(Order.id.in_(list(wrong))):
+                order.amount_paid, order.amount_refunded = wrong[order.id]
+                refresh_payment_status(order)
+            db.session.commit()
+        if progress:
+            progress(checked, len(mismatched))
+
+    return checked, mismatched
@@ -0,0 +1,129 @@
+# app/orders/bulk.py
+"""
+Set-based bulk deletion of orders.
+
+Orders are processed in chunks of `chunk_size` ids. For each chunk every
+dependent table is cleared with one DELETE ... WHERE ... IN (...) statement
+(children before parents) and the chunk is committed on its own, so locks
+are held only briefly and a failure leaves earlier chunks deleted and the
+current one untouched. M-PESA transactions are kept for audit and only
+detached from the order.
+"""
+from flask import current_app
+from sqlalchemy import delete, func, or_, select, update
+from app.extensions import db
+from app.models import (
+    Order, OrderItem, OrderNote, OrderStatusHistory, Payment, Refund,
+    RefundItem, Invoice, Shipment, TrackingEvent, SupportTicket,
+    SupportMessage, MpesaTransaction
+)
+from app.reports.rollup import remove_orders
+from app.search.suggestions import forget_orders
+
+
+def _plan(ids):
+    """(label, model, where clause) for every row to delete, in delete order."""
+    items = select(OrderItem.id).where(OrderItem.order_id.in_(ids))
+    payments = select(Payment.id).where(Payment.order_id.in_(ids))
+    refund_clause = or_(Refund.order_id.in_(ids), Refund.payment_id.in_(payments))
+    refunds = select(Refund.id).where(refund_clause)
+    shipments = select(Shipment.id).where(Shipment.order_id.in_(ids))
+    tickets = select(SupportTicket.id).where(SupportTicket.order_id.in_(ids))
+
+    return [
+        ('refund_items', RefundItem, or_(
+            RefundItem.refund_id.in_(refunds), RefundItem.order_item_id.in_(items)
+        )),
+        ('refunds', Refund, refund_clause),
+        ('tracking_events', TrackingEvent, TrackingEvent.shipment_id.in_(shipments)),
+        ('shipments', Shipment, Shipment.order_id.in_(ids)),
+        ('support_messages', SupportMessage, SupportMessage.ticket_id.in_(tickets)),
+        ('support_tickets', SupportTicket, SupportTicket.order_id.in_(ids)),
+        ('invoices', Invoice, Invoice.order_id.in_(ids)),
+        ('order_notes', OrderNote, OrderNote.order_id.in_(ids)),
+        ('order_status_history', OrderStatusHistory, OrderStatusHistory.order_id.in_(ids)),
+        ('payments', Payment, Payment.order_id.in_(ids)),
+        ('order_items', OrderItem, OrderItem.order_id.in_(ids)),
+        ('orders', Order, Order.id.in_(ids)),
+    ]
+
+
+def _id_chunks(order_ids=None, filters=None, chunk_size=500):
+    """
+    Yield lists of order ids: slices of `order_ids` if given, otherwise
+    pages of the orders matching `filters`, walked by id.
+    """
+    if order_ids is not None:
+        ids = sorted({int(i) for i in order_ids})
+        for i in range(0, len(ids), chunk_size):
+            yield ids[i:i + chunk_size]
+        return
+
+    last_id = 0
+    while True:
+        ids = db.session.scalars(
+            select(Order.id)
+            .where(Order.id > last_id, *(filters or ()))
+            .order_by(Order.id)
+            .limit(chunk_size)
+        ).all()
+        if not ids:
+            return
+        last_id = ids[-1]
+        yield ids
+
+
+def _log_progress(done, counts):
+    current_app.logger.info(f"Bulk delete: {done} orders processed ({counts})")
+
+
+def bulk_delete_orders(order_ids=None, filters=None, chunk_size=None,
+                       dry_run=False, progress=_log_progress):
+    """
+    Delete the given orders (or every order matching `filters`) and all
+    their dependent rows.
+
+    With `dry_run`, nothing is deleted and the same chunks are counted
+    instead. `progress(done, counts)` is called after every chunk. Returns
+    a dict of rows deleted (or that would be deleted) per table.
+    """
+    chunk_size = chunk_size or current_app.config.get('BULK_DELETE_CHUNK_SIZE', 500)
+    counts = {label: 0 for label, _, _ in _plan([])}
+    counts['mpesa_transactions_detached'] = 0
+    done = 0
+
+    for ids in _id_chunks(order_ids, filters, chunk_size):
+        plan = _plan(ids)
+        detach = MpesaTransaction.order_id.in_(ids)
+        try:
+            if dry_run:
+                for label, model, where in plan:
+                    counts[label] += db.session.scalar(
+                        select(func.count()).select_from(model).where(where)
+                    )
+                counts['mpesa_transactions_detached'] += db.session.scalar(
+                    select(func.count()).select_from(MpesaTransaction).where(detach)
+                )
+                db.session.rollback()
+            else:
+                remove_orders(ids)
+                counts['mpesa_transactions_detached'] += db.session.execute(
+                    update(MpesaTransaction).where(detach).values(order_id=None)
+                    .execution_options(synchronize_session=False)
+                ).rowcount
+                for label, model, where in plan:
+                    counts[label] += db.session.execute(
+                        delete(model).where(where)
+                        .execution_options(synchronize_session=False)
+                    ).rowcount
+                forget_orders(db.session, ids)
+                db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        done += len(ids)
+        if progress:
+            progress(done, counts)
+
+    return counts
@@ -0,0 +1,60 @@
+import click
+from datetime import datetime
+from app.orders import bp
+from app.orders.bulk import bulk_delete_orders
+from app.orders.balances import verify_balances
+from app.models import Order, OrderStatus
+
+
+@bp.cli.command('bulk-delete')
+@click.option('--id', 'ids', multiple=True, type=int, help='Order id to delete (repeatable).')
+@click.option('--status', help='Delete orders in this status.')
+@click.option('--before', help='Delete orders placed before this ISO date.')
+@click.option('--chunk-size', type=int, help='Orders deleted per transaction.')
+@click.option('--dry-run', is_flag=True, help='Only count what would be deleted.')
+@click.option('--yes', is_flag=True, help='Do not ask for confirmation.')
+def bulk_delete_command(ids, status, before, chunk_size, dry_run, yes):
+    """Delete orders and all their dependent rows in chunks."""
+    filters = []
+    if status:
+        try:
+            filters.append(Order.status == OrderStatus[status.upper()])
+        except KeyError:
+            raise click.BadParameter(f"Unknown status {status}", param_hint='--status')
+    if before:
+        filters.append(Order.order_date < datetime.fromisoformat(before))
+    if not ids and not filters:
+        raise click.UsageError("Give --id, --status or --before to select orders.")
+    if ids and filters:
+        raise click.UsageError("--id cannot be combined with --status/--before.")
+    if not dry_run and not yes:
+        click.confirm("Permanently delete the selected orders?", abort=True)
+
+    def progress(done, counts):
+        click.echo(f"  {done} orders processed, {counts['orders']} "
+                   f"{'would be ' if dry_run else ''}deleted")
+
+    counts = bulk_delete_orders(
+        order_ids=list(ids) or None, filters=filters,
+        chunk_size=chunk_size, dry_run=dry_run, progress=progress
+    )
+    verb = "Would delete" if dry_run else "Deleted"
+    for table, count in counts.items():
+        if count:
+            click.echo(f"{verb} {count} {table}")
+
+
+@bp.cli.command('verify-balances')
+@click.option('--fix', is_flag=True, help='Correct mismatched orders.')
+@click.option('--chunk-size', type=int, default=1000, show_default=True,
+              help='Orders checked per query.')
+def verify_balances_command(fix, chunk_size):
+    """Recompute Order.amount_paid / amount_refunded from payments and refunds."""
+    checked, mismatched = verify_balances(fix=fix, chunk_size=chunk_size)
+    if not mismatched:
+        click.echo(f"Checked {checked} orders; all balances match.")
+        return
+    preview = ', '.join(str(i) for i in mismatched[:20])
+    more = f" (+{len(mismatched) - 20} more)" if len(mismatched) > 20 else ""
+    action = "fixed" if fix else "mismatched"
+    click.echo(f"Checked {checked} orders; {len(mismatched)} {action}: {preview}{more}")
@@ -0,0 +1,86 @@
+# app/orders/export.py
+"""
+Streaming CSV export of orders.
+
+Rows are selected as plain tuples (only the exported columns, no ORM
+objects) and fetched in batches of EXPORT_BATCH_SIZE with yield_per, which
+uses a server-side cursor where the driver supports one. CSV text is
+yielded in chunks as it is produced, so memory use stays flat however many
+orders match.
+"""
+import csv
+from io import StringIO
+from flask import current_app
+from app.extensions import db
+from app.models import Order, Customer
+
+# (CSV header, column, formatter)
+_money = lambda value: f"{value or 0:.2f}"
+_enum = lambda value: value.value if value else ''
+_date = lambda value: value.strftime('%Y-%m-%d') if value else ''
+
+CUSTOMER_COLUMNS = (
+    ('Order #', Order.order_number, None),
+    ('Date', Order.order_date, _date),
+    ('Status', Order.status, _enum),
+    ('Total', Order.total_amount, _money),
+    ('Payment', Order.payment_status, _enum),
+)
+
+ADMIN_COLUMNS = (
+    ('Order #', Order.order_number, None),
+    ('Date', Order.order_date, _date),
+    ('Customer', Customer.name, None),
+    ('Email', Customer.email, None),
+    ('Status', Order.status, _enum),
+    ('Payment', Order.payment_status, _enum),
+    ('Subtotal', Order.subtotal, _money),
+    ('Tax', Order.tax_amount, _money),
+    ('Shipping', Order.shipping_cost, _money),
+    ('Discount', Order.discount_amount, _money),
+    ('Total', Order.total_amount, _money),
+)
+
+
+def export_statement(columns, filters):
+    """SELECT of just `columns` for orders matching `filters`, newest first."""
+    stmt = db.select(*(column for _, column, _ in columns)).select_from(Order)
+    if any(column.class_ is Customer for _, column, _ in columns):
+        stmt = stmt.outerjoin(Customer, Order.customer_id == Customer.id)
+    return stmt.where(*filters).order_by(Order.order_date.desc(), Order.id.desc())
+
+
+def stream_csv(columns, filters, batch_size=None):
+    """
+    Generator of CSV text chunks for the orders matching `filters`.
+
+    Must run inside the request (wrap with stream_with_context) so the
+    session stays open while the response is being sent.
+    """
+    batch_size = batch_size or current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+    formatters = [fmt for _, _, fmt in columns]
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return chunk
+
+    writer.writerow([header for header, _, _ in columns])
+    yield flush()
+
+    result = db.session.execute(
+        export_statement(columns, filters).execution_options(yield_per=batch_size)
+    )
+    try:
+        for partition in result.partitions():
+            for row in partition:
+                writer.writerow([
+                    fmt(value) if fmt else value
+                    for fmt, value in zip(formatters, row)
+                ])
+            yield flush()
+    finally:
+        result.close()
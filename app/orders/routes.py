@@ -1,18 +1,25 @@
 from flask import (
     render_template, request, redirect, url_for,
-    flash, abort, jsonify, Response
+    flash, abort, jsonify, Response, stream_with_context
 )
 from flask_login import login_required, current_user
 from app import db
 from app.orders import bp
 from app.models import (
-    Order, OrderItem, Product, Customer,
+    Order, OrderItem, Customer, CartItem,
     Payment, OrderNote, OrderStatus, PaymentStatus
 )
 from app.orders.forms import OrderForm
-import csv
-from io import StringIO
-from datetime import datetime
+from app.orders.bulk import bulk_delete_orders
+from app.products.inventory import allocate_stock, InsufficientStock
+from app.products.loader import load_products
+from app.products.reservations import reserve_stock
+from app.cart.service import invalidate_cart_count, reservation_owner
+from app.orders.export import stream_csv, CUSTOMER_COLUMNS, ADMIN_COLUMNS
+from app.utils.pagination import keyset_page
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from datetime import datetime, timedelta
 
 # ───────────────────────────────────────────────
 # Admin: List Orders (with optional filtering)
@@ -24,24 +31,49 @@ def list_orders():
         abort(403)
 
     status = request.args.get('status')
-    orders_query = Order.query
+    payment_status = request.args.get('payment_status')
+    cursor = request.args.get('cursor')
+    per_page = min(max(request.args.get('per_page', 25, type=int), 1), 100)
 
+    filters = []
     if status:
         try:
-            status_enum = OrderStatus[status.upper()]
-            orders_query = orders_query.filter_by(status=status_enum)
+            filters.append(Order.status == OrderStatus[status.upper()])
         except KeyError:
             flash("Invalid status filter.", "toast-warning")
-
-    orders = orders_query.order_by(Order.order_date.desc()).all()
-    total_revenue = sum(o.total_amount for o in orders)
-    order_count = len(orders)
+            status = None
+    if payment_status:
+        try:
+            filters.append(Order.payment_status == PaymentStatus[payment_status.upper()])
+        except KeyError:
+            flash("Invalid payment status filter.", "toast-warning")
+            payment_status = None
+
+    # KPIs over the whole filtered set, computed in one aggregate query
+    total_revenue, order_count = (
+        db.session.query(
+            func.coalesce(func.sum(Order.total_amount), 0.0),
+            func.count(Order.id)
+        )
+        .filter(*filters)
+        .one()
+    )
     avg_order_value = total_revenue / order_count if order_count else 0
 
+    orders, next_cursor = keyset_page(
+        Order.query.options(joinedload(Order.customer)).filter(*filters),
+        Order.order_date, Order.id,
+        cursor=cursor, per_page=per_page
+    )
+
     return render_template(
         'orders/list.html',
         orders=orders,
         status_filter=status,
+        payment_filter=payment_status,
+        next_cursor=next_cursor,
+        is_first_page=not cursor,
+        per_page=per_page,
         total_revenue=total_revenue,
         order_statuses=[s.name for s in OrderStatus],
         payment_statuses=[s.name for s in PaymentStatus],
@@ -59,15 +91,19 @@ def bulk_delete():
     if not current_user.is_admin():
         abort(403)
     data = request.get_json() or {}
-    ids = data.get('ids', [])
-    deleted = 0
-    for oid in ids:
-        o = Order.query.get(oid)
-        if o:
-            db.session.delete(o)
-            deleted += 1
-    db.session.commit()
-    return jsonify({"message": f"{deleted} orders deleted."}), 200
+    try:
+        ids = [int(i) for i in data.get('ids', [])]
+    except (TypeError, ValueError):
+        return jsonify({"error": "ids must be a list of order ids."}), 400
+    dry_run = bool(data.get('dry_run'))
+
+    counts = bulk_delete_orders(order_ids=ids, dry_run=dry_run)
+    if dry_run:
+        return jsonify({
+            "message": f"{counts['orders']} orders would be deleted.",
+            "counts": counts
+        }), 200
+    return jsonify({"message": f"{counts['orders']} orders deleted.", "counts": counts}), 200
 
 
 # ───────────────────────────────────────────────
@@ -102,51 +138,73 @@ def my_orders():
 
 
 # ───────────────────────────────────────────────
-# Export Orders as CSV (Customer)
+# Export Orders as CSV (Customer / Admin)
 # ───────────────────────────────────────────────
-@bp.route('/my-orders/export', endpoint='export_csv')
-@login_required
-def export_csv():
-    if not current_user.is_customer():
-        abort(403)
-    cust = current_user.customer
-
+def _export_filters():
+    """status / payment_status / start_date / end_date querystring filters."""
+    filters = []
     status = request.args.get('status', type=str)
+    payment_status = request.args.get('payment_status', type=str)
     start_date = request.args.get('start_date', type=str)
     end_date = request.args.get('end_date', type=str)
 
-    query = Order.query.filter_by(customer_id=cust.id)
     if status:
         try:
-            query = query.filter(Order.status == OrderStatus[status.upper()])
+            filters.append(Order.status == OrderStatus[status.upper()])
         except KeyError:
             flash("Invalid status for export.", "toast-warning")
-    if start_date:
-        query = query.filter(Order.order_date >= start_date)
-    if end_date:
-        query = query.filter(Order.order_date <= end_date)
-
-    orders = query.order_by(Order.order_date.desc()).all()
+    if payment_status:
+        try:
+            filters.append(Order.payment_status == PaymentStatus[payment_status.upper()])
+        except KeyError:
+            flash("Invalid payment status for export.", "toast-warning")
+    try:
+        if start_date:
+            filters.append(Order.order_date >= datetime.fromisoformat(start_date))
+        if end_date:
+            end = datetime.fromisoformat(end_date)
+            if len(end_date) <= 10:
+                end += timedelta(days=1)  # whole end day
+                filters.append(Order.order_date < end)
+            else:
+                filters.append(Order.order_date <= end)
+    except ValueError:
+        flash("Invalid date for export.", "toast-warning")
+    return filters
 
-    si = StringIO()
-    cw = csv.writer(si)
-    cw.writerow(['Order #', 'Date', 'Status', 'Total', 'Payment'])
-    for o in orders:
-        cw.writerow([
-            o.order_number,
-            o.order_date.strftime('%Y-%m-%d'),
-            o.status.value,
-            f"{o.total_amount:.2f}",
-            o.payment_status.value if getattr(o, 'payment_status', None) else ''
-        ])
 
+def _csv_response(columns, filters, filename):
     return Response(
-        si.getvalue(),
+        stream_with_context(stream_csv(columns, filters)),
         mimetype='text/csv',
-        headers={"Content-Disposition": "attachment;filename=my_orders.csv"}
+        headers={
+            "Content-Disposition": f"attachment;filename={filename}",
+            "X-Accel-Buffering": "no"
+        }
     )
 
 
+@bp.route('/my-orders/export', endpoint='export_csv')
+@login_required
+def export_csv():
+    if not current_user.is_customer():
+        abort(403)
+    cust = current_user.customer
+
+    filters = [Order.customer_id == cust.id] + _export_filters()
+    return _csv_response(CUSTOMER_COLUMNS, filters, 'my_orders.csv')
+
+
+@bp.route('/export', endpoint='export_all_csv')
+@login_required
+def export_all_csv():
+    if not (current_user.is_admin() or current_user.is_staff()):
+        abort(403)
+
+    filename = f"orders_{datetime.utcnow():%Y%m%d_%H%M%S}.csv"
+    return _csv_response(ADMIN_COLUMNS, _export_filters(), filename)
+
+
 # ───────────────────────────────────────────────
 # View Order Details (Admin/Customer)
 # ───────────────────────────────────────────────
@@ -158,10 +216,7 @@ def view_order(order_id):
         if not o.customer or o.customer.user_id != current_user.id:
             abort(403)
 
-    total_paid = sum(p.amount for p in o.payments)
-    balance_due = o.total_amount - total_paid
-
-    return render_template('orders/view.html', order=o, total_paid=total_paid, balance_due=balance_due)
+    return render_template('orders/view.html', order=o, total_paid=o.amount_paid, balance_due=o.balance_due)
 
 
 # ───────────────────────────────────────────────
@@ -235,13 +290,13 @@ def add_payment(order_id):
         flash("Invalid amount.", "toast-danger")
         return redirect(url_for('orders.view_order', order_id=order_id))
 
-    balance = o.total_amount - sum(p.amount for p in o.payments)
+    balance = o.balance_due
     if amt <= 0:
         flash("Amount must be positive.", "toast-warning")
     elif amt > balance:
         flash(f"Payment exceeds balance (Ksh {balance:.2f}).", "toast-danger")
     else:
-        db.session.add(Payment(order_id=o.id, amount=amt))
+        db.session.add(Payment(order_id=o.id, customer_id=o.customer_id, amount=amt, method="MANUAL"))
         db.session.commit()
         flash(f"Payment of Ksh {amt:.2f} recorded.", "toast-success")
 
@@ -312,15 +367,26 @@ def add_order():
         db.session.add(o)
         db.session.flush()
         total = 0
+        lines = []
+        names = {}
+        products = load_products(item.product_id.data for item in form.items)
         for item in form.items:
-            prod = Product.query.get(item.product_id.data)
+            prod = products.get(item.product_id.data)
             if prod:
                 qty = item.quantity.data
                 oi = OrderItem(order_id=o.id, product_id=prod.id, quantity=qty, unit_price=prod.price)
                 db.session.add(oi)
                 total += prod.price * qty
-                prod.stock_quantity -= qty
+                lines.append((prod.id, qty))
+                names[prod.id] = prod.name
         o.total_amount = total
+        try:
+            allocate_stock(lines, o.id, user_id=current_user.id)
+        except InsufficientStock as e:
+            db.session.rollback()
+            short = ', '.join(names.get(pid, str(pid)) for pid in e.product_ids)
+            flash(f"Not enough stock for: {short}.", 'toast-danger')
+            return render_template('orders/add.html', form=form)
         db.session.commit()
         flash('Order created successfully!', 'toast-success')
         return redirect(url_for('orders.view_order', order_id=o.id))
@@ -362,8 +428,7 @@ def update_order_status(order_id):
         return redirect(url_for('orders.view_order', order_id=o.id))
 
     if status_enum == OrderStatus.DELIVERED:
-        total_paid = sum(p.amount for p in o.payments)
-        if total_paid < o.total_amount:
+        if o.balance_due > 0:
             flash("Cannot mark as delivered until fully paid.", "toast-warning")
             return redirect(url_for('orders.view_order', order_id=o.id))
 
@@ -391,10 +456,45 @@ def reorder(order_id):
     order = Order.query.get_or_404(order_id)
     if order.customer.user_id != current_user.id:
         abort(403)
+
+    products = load_products(item.product_id for item in order.items)
+    cart = {
+        c.product_id: c for c in CartItem.query.filter(
+            CartItem.user_id == current_user.id,
+            CartItem.product_id.in_(list(products))
+        )
+    }
+    owner = reservation_owner(current_user)
+    unavailable = []
+    added = 0
     for item in order.items:
-        from app.cart import add_to_cart
-        add_to_cart(item.product_id, item.quantity)
-    flash('Items from this order were added to your cart.', 'toast-success')
+        product = products.get(item.product_id)
+        if product is None:
+            continue
+        cart_item = cart.get(product.id)
+        try:
+            reserve_stock(owner, product.id, (cart_item.quantity if cart_item else 0) + item.quantity)
+        except InsufficientStock:
+            unavailable.append(product.name)
+            continue
+        if cart_item:
+            cart_item.quantity += item.quantity
+        else:
+            cart[product.id] = CartItem(user_id=current_user.id, product_id=product.id, quantity=item.quantity)
+            db.session.add(cart[product.id])
+        added += 1
+    db.session.commit()
+
+    if not added:
+        flash('None of the items from this order are available any more.', 'toast-warning')
+        return redirect(url_for('orders.view_order', order_id=order.id))
+
+    invalidate_cart_count(current_user.id)
+    if unavailable:
+        flash(f"Not enough stock to re-add: {', '.join(unavailable)}.", 'toast-warning')
+        flash('The other items from this order were added to your cart.', 'toast-success')
+    else:
+        flash('Items from this order were added to your cart.', 'toast-success')
     return redirect(url_for('cart.view_cart'))
 
 
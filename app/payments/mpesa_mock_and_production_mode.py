@@ -1,6 +1,6 @@
 import random
 from datetime import datetime
-from flask import current_app
+from flask import current_app, url_for
 from app import db
 from app.models import MpesaTransaction
 
@@ -11,7 +11,7 @@ def initiate_mpesa_payment(phone, amount, order_id, pin=None):
     Args:
         phone (str): Customer phone number (e.g., 2547XXXXXXXX)
         amount (float): Payment amount in KES
-        order_id (str): Order identifier
+        order_id (int): Order id, already checked with payable_order_id()
         pin (str, optional): Customer M-Pesa PIN for mock simulation
     """
     mode = current_app.config.get("MPESA_MODE", "mock_live")
@@ -19,10 +19,8 @@ def initiate_mpesa_payment(phone, amount, order_id, pin=None):
     if mode == "mock_live":
         return _mock_stk_push(phone, amount, order_id, pin)
 
-    # ================= PRODUCTION MODE (COMMENTED) =================
-    # elif mode == "production":
-    #     return _production_stk_push(phone, amount, order_id)
-    # ===============================================================
+    if mode == "production":
+        return _queue_production_stk_push(phone, amount, order_id)
 
     return {"status": "FAILED", "message": "Invalid payment mode"}
 
@@ -73,75 +71,21 @@ def _mock_stk_push(phone, amount, order_id, pin=None):
                     "Payment successful", receipt)
 
 
-# ---------------- PRODUCTION MODE (COMMENTED) ----------------
-"""
-import base64
-import requests
-from datetime import datetime
-
-def _production_stk_push(phone, amount, order_id):
-    # 1️⃣ Get access token
-    consumer_key = current_app.config.get("MPESA_CONSUMER_KEY")
-    consumer_secret = current_app.config.get("MPESA_CONSUMER_SECRET")
-
-    auth = base64.b64encode(f"{consumer_key}:{consumer_secret}".encode()).decode()
-
-    token_response = requests.get(
-        "https://api.safaricom.co.ke/oauth/v1/generate?grant_type=client_credentials",
-        headers={"Authorization": f"Basic {auth}"}
-    )
-
-    access_token = token_response.json().get("access_token")
-
-    # 2️⃣ Prepare STK payload
-    shortcode = current_app.config.get("MPESA_SHORTCODE")
-    passkey = current_app.config.get("MPESA_PASSKEY")
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-
-    password = base64.b64encode(f"{shortcode}{passkey}{timestamp}".encode()).decode()
-
-    payload = {
-        "BusinessShortCode": shortcode,
-        "Password": password,
-        "Timestamp": timestamp,
-        "TransactionType": "CustomerPayBillOnline",
-        "Amount": int(amount),
-        "PartyA": phone,
-        "PartyB": shortcode,
-        "PhoneNumber": phone,
-        "CallBackURL": current_app.config.get("MPESA_CALLBACK_URL"),
-        "AccountReference": f"ORDER-{order_id}",
-        "TransactionDesc": "OMS Payment"
-    }
-
-    # 3️⃣ Call Safaricom STK endpoint
-    stk_response = requests.post(
-        "https://api.safaricom.co.ke/mpesa/stkpush/v1/processrequest",
-        json=payload,
-        headers={"Authorization": f"Bearer {access_token}"}
-    )
-
-    response_data = stk_response.json()
-
-    # 4️⃣ Save response
-    tx = MpesaTransaction(
-        order_id=order_id,
-        phone_number=phone,
-        amount=amount,
-        status="PENDING",
-        checkout_request_id=response_data.get("CheckoutRequestID")
-    )
-
-    db.session.add(tx)
-    db.session.commit()
+# ---------------- PRODUCTION MODE (ASYNC) ----------------
+def _queue_production_stk_push(phone, amount, order_id):
+    """
+    Non-blocking production push: the transaction is stored as PENDING and
+    the Safaricom call runs on the background executor (app/mpesa/jobs.py).
+    """
+    from app.mpesa.jobs import queue_stk_push
 
+    tx = queue_stk_push(phone, amount, order_id=order_id)
     return {
         "status": "PENDING",
         "message": "STK Push sent. Please complete payment on your phone.",
-        "reference": response_data.get("CheckoutRequestID")
+        "reference": tx.reference,
+        "status_url": url_for("mpesa.stk_status", reference=tx.reference)
     }
-"""
-# -------------------------------------------------------------
 
 
 # ---------------- TRANSACTION SAVE ----------------
@@ -1,5 +1,7 @@
 from flask import Blueprint, render_template, request, jsonify, current_app
+from flask_login import current_user
 from app.payments.mpesa_mock_and_production_mode import initiate_mpesa_payment
+from app.mpesa.jobs import InvalidOrder, payable_order_id
 import logging
 
 payments_bp = Blueprint("payments", __name__, url_prefix="/payments")
@@ -42,6 +44,13 @@ def pay_mpesa():
                     "message": "Amount must be a valid positive number."
                 }), 400
 
+            # The id is stored on the transaction (an Integer FK) and the
+            # payment is credited to that order, so it must be the user's
+            try:
+                order_id = payable_order_id(order_id, current_user)
+            except InvalidOrder as e:
+                return jsonify({"status": "FAILED", "message": str(e)}), 400
+
             # Optional: Validate PIN in mock mode
             if current_app.config.get("MPESA_MODE", "mock_live") == "mock_live":
                 if not pin or len(pin) != 4 or not pin.isdigit():
@@ -66,7 +75,8 @@ def pay_mpesa():
                     "message": "Payment request failed. Please try again."
                 }), 500
 
-            return jsonify(result), 200
+            # Asynchronous pushes are accepted, not completed
+            return jsonify(result), 202 if result.get("status_url") else 200
 
         except Exception as e:
             # ---------------- ERROR HANDLING ----------------
@@ -2,4 +2,4 @@ from flask import Blueprint
 
 bp = Blueprint('products', __name__)
 
-from app.products import routes
\ No newline at end of file
+from app.products import routes, ratings, categories, commands
\ No newline at end of file
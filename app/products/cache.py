@@ -0,0 +1,303 @@
+# app/products/cache.py
+"""
+Read-through cache for catalog reads.
+
+Products are cached by id ("product:<version>:<id>") and product lists by
+a caller-chosen signature ("list:<version>:<signature>"). Every key
+embeds the current catalog version, so invalidation is a version bump:
+old entries are never read again and age out of the LRU.
+
+The version is bumped after a commit that inserted, updated or deleted a
+Product, ProductCategory or ProductDiscount through the ORM. Code that
+changes products with set-based statements (rating counters) calls
+mark_catalog_changed() so its commit bumps it too. Any other set-based
+edit is only bounded by CATALOG_CACHE_TTL.
+
+Stock levels change on every checkout, so they are kept out of it: a
+cache hit re-reads stock_quantity for the products it returns (one query
+by primary key), and product cards are keyed on whether the product is in
+stock. Stock allocation therefore never invalidates the cache.
+
+Backends, from CATALOG_CACHE_URL:
+
+    (unset)      in-process LRU of CATALOG_CACHE_SIZE entries (per worker)
+    redis://...  shared Redis cache; needs the `redis` package
+
+The in-process LRU is meant for a single worker process. Its version
+counter lives in that process, so a change committed in one gunicorn
+worker only bumps that worker's version; the others keep serving their
+entries for up to CATALOG_CACHE_TTL. Deployments running several workers
+should set CATALOG_CACHE_URL, where the version is one shared Redis key.
+
+Cached objects are detached copies. Readers get them merged into the
+current session with load=False, which attaches them without a query, so
+lazy relationships (category, images...) still work.
+
+Rendered product cards are cached separately, in card_fragments.
+"""
+import pickle
+import threading
+import time
+from collections import Counter, OrderedDict
+from flask import current_app, g, get_template_attribute
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.orm.attributes import set_committed_value
+from app.extensions import db
+from app.models import Product, ProductCategory, ProductDiscount
+from app.utils.fragment_cache import FragmentCache
+
+MISSING = object()
+
+
+# ─── Backends ────────────────────────────────────────────────────────────────
+class LRUBackend:
+    """
+    Thread-safe in-process LRU with per-entry expiry. The version is local
+    to this process (see the module docstring for multi-worker setups).
+    """
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._version = 1
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            value, expires_at = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def version(self):
+        return self._version
+
+    def bump(self):
+        with self._lock:
+            self._version += 1
+            return self._version
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Shared cache: pickled values with Redis TTLs and an INCR version key."""
+
+    def __init__(self, client, prefix='catalog:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return MISSING if raw is None else pickle.loads(raw)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=int(ttl))
+
+    def version(self):
+        return int(self.client.get(self.prefix + 'version') or 1)
+
+    def bump(self):
+        return self.client.incr(self.prefix + 'version')
+
+    def __len__(self):
+        return 0  # not tracked; the keyspace is shared
+
+
+def _create_backend(app):
+    url = app.config.get('CATALOG_CACHE_URL') or ''
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        try:
+            import redis
+        except ImportError:
+            app.logger.warning("CATALOG_CACHE_URL is a Redis URL but `redis` is not installed; "
+                               "using the in-process catalog cache")
+        else:
+            return RedisBackend(redis.Redis.from_url(url))
+    return LRUBackend(app.config.get('CATALOG_CACHE_SIZE', 1000))
+
+
+# ─── Cache ───────────────────────────────────────────────────────────────────
+def _detached_copy(value):
+    # A pickle round-trip yields detached instances with their loaded state,
+    # independent of the session (and thread) that loaded them
+    return pickle.loads(pickle.dumps(value))
+
+
+def _attach(value):
+    if isinstance(value, list):
+        return [db.session.merge(obj, load=False) for obj in value]
+    return db.session.merge(value, load=False)
+
+
+def _with_live_stock(value):
+    # Cached copies carry the stock level from when they were cached
+    products = value if isinstance(value, list) else [value]
+    if not products:
+        return value
+    stock = dict(db.session.execute(
+        select(Product.id, Product.stock_quantity)
+        .where(Product.id.in_([p.id for p in products]))
+    ).all())
+    for product in products:
+        if product.id in stock:
+            set_committed_value(product, 'stock_quantity', stock[product.id])
+    return value
+
+
+class CatalogCache:
+
+    def __init__(self):
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        app = current_app._get_current_object()
+        backend = app.extensions.get('catalog_cache')
+        if backend is None:
+            with self._lock:
+                backend = app.extensions.get('catalog_cache')
+                if backend is None:
+                    backend = app.extensions['catalog_cache'] = _create_backend(app)
+        return backend
+
+    def _count(self, kind, outcome):
+        with self._lock:
+            self.stats[f'{kind}_{outcome}'] += 1
+            self.stats[outcome] += 1
+
+    def _read_through(self, kind, key, loader):
+        backend = self.backend
+        key = f"{kind}:{backend.version()}:{key}"
+        value = backend.get(key)
+        if value is not MISSING:
+            self._count(kind, 'hits')
+            return _with_live_stock(_attach(value)) if value is not None else None
+
+        self._count(kind, 'misses')
+        value = loader()
+        ttl = current_app.config.get('CATALOG_CACHE_TTL', 300)
+        backend.set(key, _detached_copy(value) if value is not None else None, ttl)
+        return value
+
+    def product(self, product_id):
+        """The Product with this id (or None), cached by id."""
+        return self._read_through(
+            'product', int(product_id), lambda: db.session.get(Product, product_id)
+        )
+
+    def products(self, signature, loader):
+        """
+        A list of products cached under `signature`, which must identify
+        the query completely (filters, ordering, page). `loader()` runs
+        on a miss and must return a list of Product objects.
+        """
+        return self._read_through('list', signature, lambda: list(loader()))
+
+    def invalidate(self):
+        """Start a new catalog version; every existing entry becomes unreachable."""
+        return self.backend.bump()
+
+    def report(self):
+        """Hit/miss counters, hit rate, size and version for monitoring."""
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats.get('hits', 0) + stats.get('misses', 0)
+        backend = self.backend
+        return {
+            **stats,
+            'hit_rate': round(stats.get('hits', 0) / lookups, 4) if lookups else 0.0,
+            'entries': len(backend),
+            'version': backend.version(),
+            'backend': type(backend).__name__,
+        }
+
+
+catalog_cache = CatalogCache()
+
+
+# ─── Product card fragments ──────────────────────────────────────────────────
+card_fragments = FragmentCache()
+
+
+def _viewer_role(user):
+    # The card only varies by these roles (action buttons)
+    if user is None or not user.is_authenticated:
+        return 'anonymous'
+    if user.is_admin() or user.is_staff():
+        return 'staff'
+    return 'customer'
+
+
+def _catalog_version():
+    # Read once per request; a shared backend would otherwise be asked per card
+    if '_catalog_version' not in g:
+        g._catalog_version = catalog_cache.backend.version()
+    return g._catalog_version
+
+
+def cached_product_card(product, compact=False, user=None):
+    """
+    The product_card macro's HTML, rendered once per product version,
+    catalog version, stock state, layout and viewer role. Registered as a
+    Jinja global.
+    """
+    key = (
+        product.id,
+        product.updated_at.isoformat() if product.updated_at else '',
+        _catalog_version(),
+        (product.stock_quantity or 0) > 0,
+        _viewer_role(user),
+        bool(compact),
+    )
+    return card_fragments.get_or_render(key, lambda: get_template_attribute(
+        'components/_product_card.html', 'product_card'
+    )(product, compact=compact, user=user))
+
+
+# ─── Invalidation ────────────────────────────────────────────────────────────
+def mark_catalog_changed(session):
+    """Bump the catalog version once `session` commits (no-op on rollback)."""
+    session.info['_catalog_changed'] = True
+
+
+def _mark_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        mark_catalog_changed(session)
+
+
+for _model in (Product, ProductCategory, ProductDiscount):
+    for _event in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event, _mark_changed)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_catalog_version(session):
+    # Bumped after the commit so no reader can re-cache pre-commit rows
+    if session.info.pop('_catalog_changed', False):
+        try:
+            catalog_cache.invalidate()
+        except RuntimeError:
+            pass  # committed outside an app context: no cache to invalidate
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_catalog_changes(session, previous_transaction):
+    session.info.pop('_catalog_changed', None)
@@ -0,0 +1,148 @@
+# app/products/categories.py
+"""
+Category hierarchy as a closure table.
+
+product_category_closure holds one row per (ancestor, descendant) pair,
+including each category paired with itself at depth 0, so a subtree, a
+breadcrumb trail or "products in this department" is a single indexed
+join however deep the tree is.
+
+The rows are maintained from ProductCategory mapper events on insert,
+on a change of parent (moving the whole subtree) and on delete (the
+children become roots). Moving a category under its own subtree raises
+ValueError. rebuild_category_closure() regenerates the table from
+parent_id after set-based edits.
+
+Existing installs must fill the table once as a deploy step:
+`flask products rebuild-category-tree`. Requests only read it.
+"""
+from sqlalchemy import delete, event, func, literal, select
+from sqlalchemy.orm import aliased
+from app.extensions import db
+from app.models import Product, ProductCategory, ProductCategoryClosure
+
+closure = ProductCategoryClosure.__table__
+categories = ProductCategory.__table__
+
+# Deeper than this is treated as a parent_id cycle by the rebuild
+MAX_DEPTH = 100
+
+
+# ─── Queries ─────────────────────────────────────────────────────────────────
+def subtree_ids(category_id):
+    """SELECT of the ids of a category and all its descendants."""
+    return select(closure.c.descendant_id).where(closure.c.ancestor_id == category_id)
+
+
+def products_in_subtree(category_id):
+    """Product query for a category and every category below it."""
+    return Product.query.filter(Product.category_id.in_(subtree_ids(category_id)))
+
+
+def subtree_counts(category_ids):
+    """{category_id: number of products in it or below it} in one query."""
+    if not category_ids:
+        return {}
+    rows = db.session.execute(
+        select(closure.c.ancestor_id, func.count(Product.id))
+        .join(Product, Product.category_id == closure.c.descendant_id)
+        .where(closure.c.ancestor_id.in_(list(category_ids)))
+        .group_by(closure.c.ancestor_id)
+    )
+    return dict(rows.all())
+
+
+# ─── Maintenance ─────────────────────────────────────────────────────────────
+def _parent_in_closure(connection, category_id):
+    return connection.scalar(
+        select(closure.c.ancestor_id)
+        .where(closure.c.descendant_id == category_id, closure.c.depth == 1)
+    )
+
+
+def _attach(connection, category_id, parent_id):
+    """Link the subtree rooted at `category_id` under every ancestor of `parent_id`."""
+    above = closure.alias('above')
+    below = closure.alias('below')
+    connection.execute(closure.insert().from_select(
+        ['ancestor_id', 'descendant_id', 'depth'],
+        select(above.c.ancestor_id, below.c.descendant_id, above.c.depth + below.c.depth + 1)
+        .where(above.c.descendant_id == parent_id, below.c.ancestor_id == category_id)
+    ))
+
+
+def _detach(connection, category_id):
+    """Drop the links between the subtree rooted at `category_id` and its ancestors."""
+    ids = connection.scalars(subtree_ids(category_id)).all()
+    connection.execute(
+        delete(closure)
+        .where(closure.c.descendant_id.in_(ids), closure.c.ancestor_id.notin_(ids))
+    )
+    return ids
+
+
+@event.listens_for(ProductCategory, 'after_insert')
+def _category_inserted(mapper, connection, target):
+    connection.execute(closure.insert().values(
+        ancestor_id=target.id, descendant_id=target.id, depth=0
+    ))
+    if target.parent_id is not None:
+        _attach(connection, target.id, target.parent_id)
+
+
+@event.listens_for(ProductCategory, 'before_update')
+def _check_move(mapper, connection, target):
+    if target.parent_id is None:
+        return
+    if target.parent_id == target.id or connection.scalar(
+        select(literal(1)).where(
+            closure.c.ancestor_id == target.id,
+            closure.c.descendant_id == target.parent_id
+        )
+    ):
+        raise ValueError(f"Cannot move category {target.id} under its own subcategory")
+
+
+@event.listens_for(ProductCategory, 'after_update')
+def _category_moved(mapper, connection, target):
+    # Compare with the parent recorded in the closure rather than attribute
+    # history, which is empty when parent_id was expired before the change
+    if _parent_in_closure(connection, target.id) == target.parent_id:
+        return
+    _detach(connection, target.id)
+    if target.parent_id is not None:
+        _attach(connection, target.id, target.parent_id)
+
+
+@event.listens_for(ProductCategory, 'before_delete')
+def _category_deleted(mapper, connection, target):
+    _detach(connection, target.id)
+    connection.execute(delete(closure).where(
+        (closure.c.ancestor_id == target.id) | (closure.c.descendant_id == target.id)
+    ))
+
+
+def rebuild_category_closure():
+    """
+    Regenerate the closure table from parent_id: depth-0 rows for every
+    category, then one INSERT ... SELECT per tree level. Not committed.
+    Returns the number of rows written.
+    """
+    db.session.execute(delete(closure))
+    total = db.session.execute(closure.insert().from_select(
+        ['ancestor_id', 'descendant_id', 'depth'],
+        select(categories.c.id, categories.c.id.label('descendant_id'), literal(0))
+    )).rowcount
+
+    child = aliased(ProductCategory)
+    for depth in range(MAX_DEPTH):
+        inserted = db.session.execute(closure.insert().from_select(
+            ['ancestor_id', 'descendant_id', 'depth'],
+            select(closure.c.ancestor_id, child.id, literal(depth + 1))
+            .join(child, child.parent_id == closure.c.descendant_id)
+            .where(closure.c.depth == depth)
+        )).rowcount
+        if not inserted:
+            return total
+        total += inserted
+    raise ValueError("Category parents form a cycle; fix parent_id before rebuilding")
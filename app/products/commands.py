@@ -0,0 +1,40 @@
+import click
+import time
+from flask import current_app
+from app.products import bp
+from app.products.reservations import expire_reservations
+from app.products.ratings import recompute_ratings
+from app.products.categories import rebuild_category_closure
+from app.extensions import db
+
+
+@bp.cli.command('sweep-reservations')
+@click.option('--batch-size', type=int, default=None,
+              help='Reservations deleted per transaction (default: STOCK_RESERVATION_SWEEP_BATCH).')
+@click.option('--loop', is_flag=True, help='Keep sweeping every STOCK_RESERVATION_SWEEP_INTERVAL seconds.')
+def sweep_reservations_command(batch_size, loop):
+    """Delete expired stock reservations."""
+    interval = current_app.config.get('STOCK_RESERVATION_SWEEP_INTERVAL', 60)
+    while True:
+        removed = expire_reservations(batch_size)
+        click.echo(f"Expired {removed} stock reservations.")
+        if not loop:
+            break
+        time.sleep(interval)
+
+
+@bp.cli.command('recompute-ratings')
+@click.option('--chunk-size', type=int, default=500, show_default=True,
+              help='Products checked per transaction.')
+def recompute_ratings_command(chunk_size):
+    """Rebuild product rating counts and histograms from approved reviews."""
+    checked, corrected = recompute_ratings(chunk_size)
+    click.echo(f"Checked {checked} products, corrected {corrected}.")
+
+
+@bp.cli.command('rebuild-category-tree')
+def rebuild_category_tree_command():
+    """Regenerate the category closure table from parent_id."""
+    rows = rebuild_category_closure()
+    db.session.commit()
+    click.echo(f"Category closure rebuilt with {rows} rows.")
@@ -0,0 +1,118 @@
+# app/products/inventory.py
+"""
+Stock allocation for orders.
+
+Stock is taken with one conditional UPDATE per product,
+
+    UPDATE products SET stock_quantity = stock_quantity - :q
+    WHERE id = :id AND stock_quantity >= :q
+
+so the check and the decrement happen atomically in the database and two
+concurrent checkouts can never both take the last unit. Stock held by
+other owners' active reservations (app/products/reservations.py) counts
+as unavailable; the allocating owner's own reservations are converted
+into the deduction. Matching InventoryLog rows are added to the same
+session; nothing is committed here, so the caller's commit (or rollback)
+covers the order, the stock, the reservations and the log together.
+"""
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm.util import identity_key
+from app.extensions import db
+from app.models import Product, InventoryLog, StockReservation
+
+
+class InsufficientStock(Exception):
+    """Raised when at least one product cannot cover the requested quantity."""
+
+    def __init__(self, product_ids):
+        self.product_ids = list(product_ids)
+        super().__init__(f"Insufficient stock for products {self.product_ids}")
+
+
+def _merge_lines(lines):
+    quantities = OrderedDict()
+    for product_id, quantity in sorted(lines):
+        if quantity and quantity > 0:
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return quantities
+
+
+def reserved_elsewhere(product_id_column, owner=None, now=None):
+    """Correlated SUM of active reservations on a product not held by `owner`."""
+    now = now or datetime.utcnow()
+    query = (
+        select(func.coalesce(func.sum(StockReservation.quantity), 0))
+        .where(
+            StockReservation.product_id == product_id_column,
+            StockReservation.expires_at > now
+        )
+    )
+    if owner:
+        query = query.where(StockReservation.owner != owner)
+    return query.scalar_subquery()
+
+
+def _expire_stock(product_ids):
+    # Loaded Product objects still hold the pre-update stock level
+    for product_id in product_ids:
+        product = db.session.identity_map.get(identity_key(Product, product_id))
+        if product is not None:
+            db.session.expire(product, ['stock_quantity'])
+
+
+def allocate_stock(lines, reference_id, reference_type='order', user_id=None,
+                   description=None, owner=None):
+    """
+    Deduct stock for `lines` ((product_id, quantity) pairs) and log each
+    deduction against `reference_type`/`reference_id`. Reservations held
+    by `owner` (e.g. the checking-out cart) on these products are released
+    in the same transaction.
+
+    Products are updated in id order so concurrent allocations lock rows in
+    the same order. If any product is short, InsufficientStock is raised
+    listing every short product; the caller must roll back to undo the
+    lines already applied.
+    """
+    quantities = _merge_lines(lines)
+    now = datetime.utcnow()
+    short = []
+    for product_id, quantity in quantities.items():
+        available = Product.stock_quantity - reserved_elsewhere(Product.id, owner, now)
+        result = db.session.execute(
+            update(Product)
+            .where(Product.id == product_id, available >= quantity)
+            .values(stock_quantity=Product.stock_quantity - quantity)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            short.append(product_id)
+    _expire_stock(quantities)
+
+    if short:
+        raise InsufficientStock(short)
+
+    if owner and quantities:
+        db.session.execute(
+            delete(StockReservation)
+            .where(
+                StockReservation.owner == owner,
+                StockReservation.product_id.in_(list(quantities))
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    description = description or f"{reference_type.title()} ID: {reference_id}"
+    db.session.add_all(
+        InventoryLog(
+            product_id=product_id,
+            change=-quantity,
+            description=description,
+            reference_id=reference_id,
+            reference_type=reference_type,
+            user_id=user_id
+        )
+        for product_id, quantity in quantities.items()
+    )
+    return quantities
@@ -0,0 +1,36 @@
+# app/products/loader.py
+"""
+Batched product loading.
+
+Views that need several products by id (order entry, guest carts,
+reorders) load them all with load_products() instead of one
+Product.query.get() per line: one SELECT ... WHERE id IN (...) per
+IN_CHUNK ids, returned as a dict keyed by id.
+"""
+from app.models import Product
+
+# Ids per IN list; keeps well under SQLite's bound-parameter limit
+IN_CHUNK = 500
+
+
+def load_products(product_ids, *options):
+    """
+    {product_id: Product} for `product_ids`. Ids that do not exist (or are
+    not valid integers) are simply absent. `options` are passed to
+    Query.options(), e.g. joinedload(Product.category).
+    """
+    ids = set()
+    for product_id in product_ids:
+        try:
+            ids.add(int(product_id))
+        except (TypeError, ValueError):
+            continue
+
+    ids = sorted(ids)
+    products = {}
+    for i in range(0, len(ids), IN_CHUNK):
+        query = Product.query.filter(Product.id.in_(ids[i:i + IN_CHUNK]))
+        if options:
+            query = query.options(*options)
+        products.update((product.id, product) for product in query)
+    return products
@@ -0,0 +1,170 @@
+# app/products/ratings.py
+"""
+Product.rating_count / rating_sum / rating_1..rating_5 maintenance.
+
+Only approved reviews count. Before each flush, the stored state of
+changed and deleted ProductReview rows is read back from the database and
+subtracted; after the flush, the new state of added and changed reviews
+is added. The resulting deltas are applied with one
+UPDATE products SET col = col + :delta per product in the same
+transaction, so concurrent reviews on one product never overwrite each
+other's counts.
+
+Set-based statements on product_reviews bypass these events; run
+recompute_ratings() (flask products recompute-ratings) after them.
+"""
+from collections import Counter, defaultdict
+from sqlalchemy import bindparam, case, event, func, inspect, select
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+from app.extensions import db
+from app.models import Product, ProductReview
+from app.products.cache import mark_catalog_changed
+
+STARS = range(1, 6)
+RATING_COLUMNS = ('rating_count', 'rating_sum') + tuple(f'rating_{n}' for n in STARS)
+TRACKED = ('rating', 'is_approved', 'product_id', 'product')
+
+
+def _changed(review):
+    state = inspect(review)
+    return any(state.attrs[f].history.has_changes() for f in TRACKED)
+
+
+def _add(deltas, product_id, rating, approved, sign):
+    if product_id is None or not approved or rating not in STARS:
+        return
+    delta = deltas[product_id]
+    delta['rating_count'] += sign
+    delta['rating_sum'] += sign * rating
+    delta[f'rating_{rating}'] += sign
+
+
+# ─── Flush hooks ─────────────────────────────────────────────────────────────
+@event.listens_for(Session, 'before_flush')
+def _collect_rating_changes(session, flush_context, instances):
+    new = [r for r in session.new if isinstance(r, ProductReview)]
+    changed = [r for r in session.dirty if isinstance(r, ProductReview) and _changed(r)]
+    deleted = [r for r in session.deleted if isinstance(r, ProductReview)]
+    if not (new or changed or deleted):
+        return
+
+    deltas = session.info.setdefault('_rating_deltas', defaultdict(Counter))
+    old_ids = [r.id for r in changed + deleted if r.id is not None]
+    if old_ids:
+        rows = session.execute(
+            select(ProductReview.product_id, ProductReview.rating, ProductReview.is_approved)
+            .where(ProductReview.id.in_(old_ids))
+        )
+        for product_id, rating, approved in rows:
+            _add(deltas, product_id, rating, approved, -1)
+
+    # New state is counted after the flush, once new products have ids
+    session.info.setdefault('_rating_reviews', []).extend(new + changed)
+
+
+@event.listens_for(Session, 'after_flush')
+def _write_rating_deltas(session, flush_context):
+    deltas = session.info.pop('_rating_deltas', None)
+    reviews = session.info.pop('_rating_reviews', None)
+    if not (deltas or reviews):
+        return
+    deltas = deltas if deltas is not None else defaultdict(Counter)
+    for review in reviews or ():
+        if review not in session.deleted:
+            _add(deltas, review.product_id, review.rating, review.is_approved, 1)
+
+    products = Product.__table__
+    connection = session.connection()
+    touched = session.info.setdefault('_rating_products', set())
+    for product_id, delta in deltas.items():
+        values = {c: products.c[c] + v for c, v in delta.items() if v}
+        if values:
+            connection.execute(
+                products.update().where(products.c.id == product_id).values(values)
+            )
+            touched.add(product_id)
+    if touched:
+        mark_catalog_changed(session)
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _expire_ratings(session, flush_context):
+    # Loaded products still hold the counts from before the UPDATE
+    for product_id in session.info.pop('_rating_products', ()):
+        product = session.identity_map.get(identity_key(Product, product_id))
+        if product is not None:
+            session.expire(product, list(RATING_COLUMNS))
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _drop_rating_deltas(session, previous_transaction):
+    for key in ('_rating_deltas', '_rating_reviews', '_rating_products'):
+        session.info.pop(key, None)
+
+
+# ─── Bulk recompute ──────────────────────────────────────────────────────────
+def _review_totals(product_ids):
+    approved = ProductReview.is_approved.is_(True)
+    return {
+        row[0]: tuple(row[1:])
+        for row in db.session.execute(
+            select(
+                ProductReview.product_id,
+                func.count(ProductReview.id),
+                func.coalesce(func.sum(ProductReview.rating), 0),
+                *(func.sum(case((ProductReview.rating == n, 1), else_=0)) for n in STARS)
+            )
+            .where(ProductReview.product_id.in_(product_ids), approved)
+            .group_by(ProductReview.product_id)
+        )
+    }
+
+
+def recompute_ratings(chunk_size=500, progress=None):
+    """
+    Rebuild every product's rating aggregates from its approved reviews,
+    walking products by id with one grouped query per chunk and one
+    executemany UPDATE for the products whose stored values differ.
+    Commits per chunk. Returns (checked, corrected).
+    """
+    columns = [getattr(Product, c) for c in RATING_COLUMNS]
+    products = Product.__table__
+    stmt = (
+        products.update()
+        .where(products.c.id == bindparam('product_id'))
+        .values({c: bindparam(f'new_{c}') for c in RATING_COLUMNS})
+    )
+    empty = (0,) * len(RATING_COLUMNS)
+
+    checked = corrected = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(Product.id, *columns)
+            .where(Product.id > last_id)
+            .order_by(Product.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        checked += len(rows)
+
+        totals = _review_totals([row[0] for row in rows])
+        params = []
+        for product_id, *stored in rows:
+            actual = tuple(int(v or 0) for v in totals.get(product_id, empty))
+            if tuple(v or 0 for v in stored) != actual:
+                params.append(dict(
+                    product_id=product_id,
+                    **{f'new_{c}': v for c, v in zip(RATING_COLUMNS, actual)}
+                ))
+        if params:
+            db.session.execute(stmt, params)
+            corrected += len(params)
+        db.session.commit()
+        if progress:
+            progress(checked, corrected)
+
+    return checked, corrected
@@ -0,0 +1,246 @@
+# app/products/reservations.py
+"""
+Time-limited stock reservations.
+
+Adding to a cart holds the quantity for its owner ('user:<id>' or
+'guest:<token>') for STOCK_RESERVATION_TTL seconds. While a hold is
+active, that stock is unavailable to everyone else:
+
+    available = stock_quantity - SUM(active reservations)
+
+The sum is answered from the (product_id, expires_at, quantity) index
+without touching the table. stock_quantity itself only changes when an
+order is placed: allocate_stock(..., owner=...) deducts the stock and
+deletes the owner's holds in the order's transaction.
+
+Expired holds are ignored by every query as soon as they lapse; the
+sweeper only deletes them in batches to keep the table small.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, func, select, update
+from app.extensions import db
+from app.models import Product, StockReservation
+from app.products.inventory import InsufficientStock, reserved_elsewhere
+
+
+def _ttl(ttl=None):
+    return timedelta(seconds=ttl or current_app.config.get('STOCK_RESERVATION_TTL', 900))
+
+
+def user_owner(user_id):
+    return f"user:{user_id}"
+
+
+# ─── Availability ────────────────────────────────────────────────────────────
+def reserved_quantities(product_ids, exclude_owner=None):
+    """{product_id: quantity held by active reservations} with one grouped query."""
+    ids = list(set(product_ids))
+    if not ids:
+        return {}
+    query = (
+        select(StockReservation.product_id, func.sum(StockReservation.quantity))
+        .where(
+            StockReservation.product_id.in_(ids),
+            StockReservation.expires_at > datetime.utcnow()
+        )
+        .group_by(StockReservation.product_id)
+    )
+    if exclude_owner:
+        query = query.where(StockReservation.owner != exclude_owner)
+    return dict(db.session.execute(query).all())
+
+
+def available_stock(products, exclude_owner=None):
+    """{product_id: stock not held by other carts} for loaded Product objects."""
+    reserved = reserved_quantities((p.id for p in products), exclude_owner)
+    return {
+        p.id: max((p.stock_quantity or 0) - reserved.get(p.id, 0), 0)
+        for p in products
+    }
+
+
+# ─── Holding and releasing ───────────────────────────────────────────────────
+def reserve_stock(owner, product_id, quantity, ttl=None):
+    """
+    Hold `quantity` units of a product for `owner`, replacing the owner's
+    previous hold on it and restarting its expiry. Raises InsufficientStock
+    if other holds leave too little stock. Not committed.
+
+    The product row is locked (SELECT ... FOR UPDATE where supported) so
+    two carts cannot both reserve the last unit.
+    """
+    if quantity <= 0:
+        release_reservations(owner, [product_id])
+        return None
+
+    now = datetime.utcnow()
+    available = db.session.execute(
+        select(Product.stock_quantity - reserved_elsewhere(Product.id, owner, now))
+        .where(Product.id == product_id)
+        .with_for_update()
+    ).scalar()
+    if available is None or available < quantity:
+        raise InsufficientStock([product_id])
+
+    expires_at = now + _ttl(ttl)
+    reservation = StockReservation.query.filter_by(owner=owner, product_id=product_id).first()
+    if reservation:
+        reservation.quantity = quantity
+        reservation.expires_at = expires_at
+    else:
+        reservation = StockReservation(
+            owner=owner, product_id=product_id, quantity=quantity, expires_at=expires_at
+        )
+        db.session.add(reservation)
+    return reservation
+
+
+def release_reservations(owner, product_ids=None):
+    """Drop the owner's holds (all of them, or only on `product_ids`). Not committed."""
+    query = delete(StockReservation).where(StockReservation.owner == owner)
+    if product_ids is not None:
+        query = query.where(StockReservation.product_id.in_(list(product_ids)))
+    return db.session.execute(
+        query.execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def extend_reservations(owner, ttl=None):
+    """Restart the expiry of the owner's active holds, e.g. on reaching checkout."""
+    now = datetime.utcnow()
+    return db.session.execute(
+        update(StockReservation)
+        .where(StockReservation.owner == owner, StockReservation.expires_at > now)
+        .values(expires_at=now + _ttl(ttl))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def transfer_reservations(from_owner, to_owner):
+    """
+    Move a guest's holds to the signed-in user. Where both hold the same
+    product the quantities are added, as merge_guest_cart() adds the cart
+    lines, capped at the stock not held by anyone else (but never below
+    what the user already held). Not committed.
+    """
+    if from_owner == to_owner:
+        return
+    guest = StockReservation.query.filter_by(owner=from_owner).all()
+    if not guest:
+        return
+    product_ids = [r.product_id for r in guest]
+    existing = {
+        r.product_id: r for r in StockReservation.query.filter(
+            StockReservation.owner == to_owner,
+            StockReservation.product_id.in_(product_ids)
+        )
+    }
+    now = datetime.utcnow()
+    shared = [pid for pid in product_ids if pid in existing]
+    held_by_others = (
+        select(func.coalesce(func.sum(StockReservation.quantity), 0))
+        .where(
+            StockReservation.product_id == Product.id,
+            StockReservation.expires_at > now,
+            StockReservation.owner.notin_([from_owner, to_owner])
+        )
+        .scalar_subquery()
+    )
+    available = dict(db.session.execute(
+        select(Product.id, Product.stock_quantity - held_by_others)
+        .where(Product.id.in_(shared))
+        .with_for_update()
+    ).all()) if shared else {}
+
+    for reservation in guest:
+        held = existing.get(reservation.product_id)
+        if held is None:
+            reservation.owner = to_owner
+            continue
+        total = held.quantity + reservation.quantity
+        cap = available.get(reservation.product_id, 0)
+        held.quantity = max(min(total, cap), held.quantity)
+        held.expires_at = max(held.expires_at, reservation.expires_at)
+        db.session.delete(reservation)
+
+
+# ─── Expiry ──────────────────────────────────────────────────────────────────
+def expire_reservations(batch_size=None, now=None):
+    """
+    Delete lapsed holds, `batch_size` rows per transaction, walking the
+    expires_at index. Returns the number of rows removed.
+    """
+    batch_size = batch_size or current_app.config.get('STOCK_RESERVATION_SWEEP_BATCH', 1000)
+    now = now or datetime.utcnow()
+    removed = 0
+    while True:
+        ids = db.session.scalars(
+            select(StockReservation.id)
+            .where(StockReservation.expires_at <= now)
+            .order_by(StockReservation.expires_at)
+            .limit(batch_size)
+        ).all()
+        if not ids:
+            break
+        removed += db.session.execute(
+            delete(StockReservation)
+            .where(StockReservation.id.in_(ids))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if len(ids) < batch_size:
+            break
+    return removed
+
+
+class ReservationSweeper:
+    """
+    Daemon thread that calls expire_reservations() every
+    STOCK_RESERVATION_SWEEP_INTERVAL seconds. Started on first use from a
+    request, like the M-PESA callback ingestor. Other periodic cleanups
+    (e.g. expired guest carts) can ride along via add_task().
+    """
+
+    def __init__(self, interval=60):
+        self.interval = interval
+        self.tasks = [expire_reservations]
+        self._lock = threading.Lock()
+        self._thread = None
+        self._app = None
+
+    def add_task(self, task):
+        """Run `task()` (returning a count of rows removed) on every sweep."""
+        if task not in self.tasks:
+            self.tasks.append(task)
+
+    def ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._app = current_app._get_current_object()
+                self.interval = self._app.config.get(
+                    'STOCK_RESERVATION_SWEEP_INTERVAL', self.interval
+                )
+                self._thread = threading.Thread(
+                    target=self._run, name="reservation-sweeper", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._app.app_context():
+                for task in self.tasks:
+                    try:
+                        removed = task()
+                        if removed:
+                            self._app.logger.info(f"{task.__name__}: removed {removed} rows")
+                    except Exception:
+                        db.session.rollback()
+                        self._app.logger.exception(f"Sweep task {task.__name__} failed")
+                db.session.remove()
+
+
+sweeper = ReservationSweeper()
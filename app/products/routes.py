@@ -1,19 +1,66 @@
-from flask import render_template, redirect, url_for, flash
-from flask_login import login_required
+from flask import render_template, redirect, url_for, flash, session, request, abort, jsonify
+from flask_login import login_required, current_user
 from app import db
-from app.models import Product
+from app.models import Product, ProductCategory
 from app.products import bp
 from app.products.forms import ProductForm
+from app.products.reservations import available_stock, user_owner
+from app.products.categories import products_in_subtree, subtree_counts
+from app.products.cache import catalog_cache, card_fragments
+from app.utils.pagination import keyset_page
 from app.admin.routes import admin_required
 @bp.route('/')
 def list_products():
-    products = Product.query.order_by(Product.name).all()
+    products = catalog_cache.products(
+        'all:by-name', lambda: Product.query.order_by(Product.name).all()
+    )
     return render_template('products/list.html', products=products)
 
 @bp.route('/<int:product_id>')
 def view_product(product_id):
-    product = Product.query.get_or_404(product_id)
-    return render_template('products/view.html', product=product)
+    product = catalog_cache.product(product_id)
+    if product is None:
+        abort(404)
+    # Stock held by other carts is not on offer; the viewer's own hold is
+    if current_user.is_authenticated:
+        owner = user_owner(current_user.id)
+    else:
+        owner = f"guest:{session['cart_token']}" if session.get('cart_token') else None
+    available = available_stock([product], exclude_owner=owner)[product.id]
+    return render_template('products/view.html', product=product, available=available)
+
+@bp.route('/category/<int:category_id>')
+def category_products(category_id):
+    """Products in a category and all its subcategories, newest first."""
+    category = ProductCategory.query.get_or_404(category_id)
+    cursor = request.args.get('cursor')
+    per_page = min(max(request.args.get('per_page', 24, type=int), 1), 96)
+
+    products, next_cursor = keyset_page(
+        products_in_subtree(category.id), Product.created_at, Product.id,
+        cursor=cursor, per_page=per_page
+    )
+    subcategories = category.children
+    counts = subtree_counts([c.id for c in subcategories])
+
+    return render_template(
+        'products/category.html',
+        category=category,
+        breadcrumbs=category.path,
+        subcategories=subcategories,
+        counts=counts,
+        products=products,
+        next_cursor=next_cursor,
+        is_first_page=not cursor,
+        per_page=per_page
+    )
+
+@bp.route('/cache/stats')
+@login_required
+@admin_required
+def cache_stats():
+    """Catalog and product card cache counters for this worker."""
+    return jsonify(catalog=catalog_cache.report(), fragments=card_fragments.report())
 
 @bp.route('/add', methods=['GET', 'POST'])
 @login_required
@@ -2,4 +2,4 @@ from flask import Blueprint
 
 bp = Blueprint('reports', __name__)
 
-from app.reports import routes
\ No newline at end of file
+from app.reports import routes, rollup, commands
@@ -0,0 +1,17 @@
+import click
+from datetime import date
+from app.reports import bp
+from app.reports.rollup import backfill_rollup
+
+
+@bp.cli.command('backfill-rollup')
+@click.option('--start', help='First order date to rebuild (YYYY-MM-DD); defaults to the oldest order.')
+@click.option('--end', help='Last order date to rebuild (YYYY-MM-DD); defaults to the newest order.')
+@click.option('--chunk-days', type=int, default=31, show_default=True,
+              help='Days rebuilt per transaction.')
+def backfill_rollup_command(start, end, chunk_days):
+    """Rebuild daily_sales_rollup rows from the orders table."""
+    start_date = date.fromisoformat(start) if start else None
+    end_date = date.fromisoformat(end) if end else None
+    days = backfill_rollup(start_date, end_date, chunk_days)
+    click.echo(f"Sales rollup rebuilt for {days} days.")
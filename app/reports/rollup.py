@@ -0,0 +1,380 @@
+# app/reports/rollup.py
+"""
+Incremental maintenance of the daily_sales_rollup table.
+
+Each row holds the totals for one (date, status, payment_status) key, so
+reports read at most a few rows per day instead of scanning orders.
+
+Order, OrderItem and Payment flushes turn every change into +/- deltas
+against the affected keys. Deltas are summed on the session and written
+with one upsert per key at the end of the flush, inside the same
+transaction as the change itself. Failed payments do not count towards
+amount_paid, as in app.orders.balances. Old values are read back from the
+database before an update or delete, so changes to expired attributes are
+still accounted for correctly. Set-based UPDATE/DELETE statements bypass
+these events; callers must use remove_orders() before deleting orders that
+way, or run backfill_rollup() for the affected days.
+
+Adding the table to an existing install requires one
+`flask reports backfill-rollup` as a deploy step. Until it has run,
+reports fall back to aggregating the orders table directly
+(daily_totals()); the web path never backfills.
+"""
+from collections import Counter
+from datetime import date, datetime, timedelta
+from sqlalchemy import event, func, inspect, select, and_, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, object_session
+from app.extensions import db
+from app.models import DailySalesRollup, Order, OrderItem, Payment, PaymentStatus
+
+rollup = DailySalesRollup.__table__
+
+MEASURES = (
+    'order_count', 'revenue', 'tax_amount', 'shipping_cost',
+    'discount_amount', 'item_count', 'amount_paid'
+)
+# Rollup measure -> Order column it sums
+ORDER_MEASURES = {
+    'revenue': 'total_amount',
+    'tax_amount': 'tax_amount',
+    'shipping_cost': 'shipping_cost',
+    'discount_amount': 'discount_amount',
+}
+KEY_FIELDS = ('order_date', 'status', 'payment_status')
+ORDER_FIELDS = KEY_FIELDS + tuple(ORDER_MEASURES.values())
+# Payments that count towards amount_paid
+COUNTED_PAYMENT = or_(Payment.status.is_(None), Payment.status != PaymentStatus.FAILED)
+
+
+def _item_total(order_id_column):
+    return (
+        select(func.coalesce(func.sum(OrderItem.quantity), 0))
+        .where(OrderItem.order_id == order_id_column)
+        .scalar_subquery()
+    )
+
+
+def _paid_total(order_id_column):
+    return (
+        select(func.coalesce(func.sum(Payment.amount), 0))
+        .where(Payment.order_id == order_id_column, COUNTED_PAYMENT)
+        .scalar_subquery()
+    )
+
+
+# ─── Writing deltas ──────────────────────────────────────────────────────────
+def _upsert(connection, key, deltas):
+    day, status, payment_status = key
+    values = {m: deltas.get(m, 0) for m in MEASURES}
+    dialect = connection.dialect.name
+
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert(rollup).values(
+            date=day, status=status, payment_status=payment_status, **values
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['date', 'status', 'payment_status'],
+            set_={m: rollup.c[m] + stmt.excluded[m] for m in deltas}
+        )
+        connection.execute(stmt)
+        return
+
+    result = connection.execute(
+        rollup.update()
+        .where(and_(
+            rollup.c.date == day,
+            rollup.c.status == status,
+            rollup.c.payment_status == payment_status
+        ))
+        .values({m: rollup.c[m] + v for m, v in deltas.items()})
+    )
+    if result.rowcount == 0:
+        connection.execute(rollup.insert().values(
+            date=day, status=status, payment_status=payment_status, **values
+        ))
+
+
+def _key(order_date, status, payment_status):
+    if isinstance(order_date, datetime):
+        order_date = order_date.date()
+    return order_date, status, payment_status
+
+
+def _add(target, key, deltas, sign=1):
+    session = object_session(target)
+    if session is None or key[0] is None:
+        return
+    pending = session.info.setdefault('_rollup_deltas', {})
+    counter = pending.setdefault(key, Counter())
+    for measure, value in deltas.items():
+        if value:
+            counter[measure] += sign * value
+
+
+def _order_key(connection, order_id):
+    row = connection.execute(
+        select(Order.order_date, Order.status, Order.payment_status)
+        .where(Order.id == order_id)
+    ).first()
+    return _key(*row) if row else None
+
+
+def _changed(target, fields):
+    state = inspect(target)
+    return any(state.attrs[f].history.has_changes() for f in fields)
+
+
+# ─── Order events ────────────────────────────────────────────────────────────
+def _order_measures(values):
+    measures = {m: values[col] or 0 for m, col in ORDER_MEASURES.items()}
+    measures['order_count'] = 1
+    return measures
+
+
+@event.listens_for(Order, 'after_insert')
+def _order_inserted(mapper, connection, target):
+    values = {f: getattr(target, f) for f in ORDER_FIELDS}
+    key = _key(*(values[f] for f in KEY_FIELDS))
+    _add(target, key, _order_measures(values))
+
+
+def _old_order(connection, order_id):
+    return connection.execute(
+        select(
+            *(getattr(Order, f) for f in ORDER_FIELDS),
+            _item_total(Order.id).label('item_count'),
+            _paid_total(Order.id).label('amount_paid')
+        )
+        .where(Order.id == order_id)
+    ).mappings().first()
+
+
+@event.listens_for(Order, 'before_update')
+def _order_updating(mapper, connection, target):
+    if not _changed(target, ORDER_FIELDS):
+        return
+    old = _old_order(connection, target.id)
+    if old is None:
+        return
+    current = inspect(target).dict
+    new = {f: current.get(f, old[f]) for f in ORDER_FIELDS}
+
+    old_key = _key(*(old[f] for f in KEY_FIELDS))
+    new_key = _key(*(new[f] for f in KEY_FIELDS))
+    old_measures, new_measures = _order_measures(old), _order_measures(new)
+    if old_key != new_key:
+        # Items and payments move with the order
+        for measure in ('item_count', 'amount_paid'):
+            old_measures[measure] = new_measures[measure] = old[measure]
+    _add(target, old_key, old_measures, sign=-1)
+    _add(target, new_key, new_measures)
+
+
+@event.listens_for(Order, 'before_delete')
+def _order_deleting(mapper, connection, target):
+    # Cascaded items and payments have already removed themselves by now
+    old = _old_order(connection, target.id)
+    if old is None:
+        return
+    measures = _order_measures(old)
+    measures['item_count'] = old['item_count']
+    measures['amount_paid'] = old['amount_paid']
+    _add(target, _key(*(old[f] for f in KEY_FIELDS)), measures, sign=-1)
+
+
+# ─── OrderItem / Payment events ──────────────────────────────────────────────
+def _item_quantity(quantity):
+    return quantity or 0
+
+
+def _paid_amount(amount, status):
+    if isinstance(status, str):
+        status = PaymentStatus[status.upper()]
+    if status == PaymentStatus.FAILED:
+        return 0
+    return amount or 0
+
+
+def _child_events(model, fields, measure, value):
+    """Track `value(*fields)` of each `model` row as `measure` on its order's rollup key."""
+    table = model.__table__
+
+    def inserted(mapper, connection, target):
+        key = _order_key(connection, target.order_id)
+        if key:
+            _add(target, key, {measure: value(*(getattr(target, f) for f in fields))})
+
+    def _old(connection, target):
+        return connection.execute(
+            select(table.c.order_id, *(table.c[f] for f in fields))
+            .where(table.c.id == target.id)
+        ).first()
+
+    def updating(mapper, connection, target):
+        if not _changed(target, ('order_id',) + fields):
+            return
+        old = _old(connection, target)
+        if old is None:
+            return
+        old_key = _order_key(connection, old.order_id)
+        if old_key:
+            _add(target, old_key, {measure: value(*old[1:])}, sign=-1)
+        current = inspect(target).dict
+        new_key = _order_key(connection, current.get('order_id', old.order_id))
+        if new_key:
+            new_values = (current.get(f, v) for f, v in zip(fields, old[1:]))
+            _add(target, new_key, {measure: value(*new_values)})
+
+    def deleting(mapper, connection, target):
+        old = _old(connection, target)
+        key = _order_key(connection, old.order_id) if old else None
+        if key:
+            _add(target, key, {measure: value(*old[1:])}, sign=-1)
+
+    event.listen(model, 'after_insert', inserted)
+    event.listen(model, 'before_update', updating)
+    event.listen(model, 'before_delete', deleting)
+
+
+_child_events(OrderItem, ('quantity',), 'item_count', _item_quantity)
+_child_events(Payment, ('amount', 'status'), 'amount_paid', _paid_amount)
+
+
+@event.listens_for(Session, 'after_flush')
+def _write_deltas(session, flush_context):
+    pending = session.info.pop('_rollup_deltas', None)
+    if not pending:
+        return
+    connection = session.connection()
+    for key, deltas in pending.items():
+        deltas = {m: v for m, v in deltas.items() if v}
+        if deltas:
+            _upsert(connection, key, deltas)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _drop_deltas(session, previous_transaction):
+    session.info.pop('_rollup_deltas', None)
+
+
+# ─── Set-based changes ───────────────────────────────────────────────────────
+def _grouped_totals(*where):
+    """SELECT of rollup keys and MEASURES for the orders matching `where`."""
+    items = (
+        select(OrderItem.order_id, func.sum(OrderItem.quantity).label('total'))
+        .group_by(OrderItem.order_id)
+        .subquery()
+    )
+    paid = (
+        select(Payment.order_id, func.sum(Payment.amount).label('total'))
+        .where(COUNTED_PAYMENT)
+        .group_by(Payment.order_id)
+        .subquery()
+    )
+    day_column = func.date(Order.order_date, type_=db.Date)
+    return (
+        select(
+            day_column.label('date'),
+            Order.status,
+            Order.payment_status,
+            func.count(Order.id).label('order_count'),
+            func.coalesce(func.sum(Order.total_amount), 0).label('revenue'),
+            func.coalesce(func.sum(Order.tax_amount), 0).label('tax_amount'),
+            func.coalesce(func.sum(Order.shipping_cost), 0).label('shipping_cost'),
+            func.coalesce(func.sum(Order.discount_amount), 0).label('discount_amount'),
+            func.coalesce(func.sum(items.c.total), 0).label('item_count'),
+            func.coalesce(func.sum(paid.c.total), 0).label('amount_paid'),
+        )
+        .select_from(Order)
+        .outerjoin(items, items.c.order_id == Order.id)
+        .outerjoin(paid, paid.c.order_id == Order.id)
+        .where(*where)
+        .group_by(day_column, Order.status, Order.payment_status)
+    )
+
+
+def remove_orders(order_ids):
+    """
+    Subtract orders from the rollup before they are deleted with set-based
+    statements that bypass the flush events. Runs in the caller's
+    transaction.
+    """
+    connection = db.session.connection()
+    for day, status, payment_status, *sums in connection.execute(
+        _grouped_totals(Order.id.in_(order_ids))
+    ):
+        if isinstance(day, str):
+            day = date.fromisoformat(day[:10])
+        deltas = {m: -v for m, v in zip(MEASURES, sums) if v}
+        if deltas:
+            _upsert(connection, (day, status, payment_status), deltas)
+
+
+# ─── Backfill ────────────────────────────────────────────────────────────────
+def backfill_rollup(start=None, end=None, chunk_days=31):
+    """
+    Recompute rollup rows for orders dated `start`..`end` (dates, inclusive;
+    defaults to the full order history) from the orders table.
+
+    Works in chunks of `chunk_days`, deleting and re-inserting each chunk
+    with INSERT ... SELECT in its own transaction. Returns the number of
+    days covered.
+    """
+    if start is None or end is None:
+        first, last = db.session.query(
+            func.min(Order.order_date), func.max(Order.order_date)
+        ).one()
+        if first is None:
+            return 0
+        start = start or first.date()
+        end = end or last.date()
+
+    days = 0
+    chunk_start = start
+    while chunk_start <= end:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), end)
+        lower = datetime.combine(chunk_start, datetime.min.time())
+        upper = datetime.combine(chunk_end + timedelta(days=1), datetime.min.time())
+
+        db.session.execute(
+            rollup.delete().where(rollup.c.date.between(chunk_start, chunk_end))
+        )
+        grouped = _grouped_totals(Order.order_date >= lower, Order.order_date < upper)
+        db.session.execute(rollup.insert().from_select(
+            ['date', 'status', 'payment_status', *MEASURES], grouped
+        ))
+        db.session.commit()
+
+        days += (chunk_end - chunk_start).days + 1
+        chunk_start = chunk_end + timedelta(days=1)
+    return days
+
+
+# ─── Reading ─────────────────────────────────────────────────────────────────
+def rollup_ready():
+    """
+    True once the rollup can be trusted: it has rows, or there are no
+    orders yet (the flush events then fill it from the first order on).
+    An existing install needs `flask reports backfill-rollup` once, as a
+    deploy step; until then this is False. Checks the database on every
+    call (two LIMIT 1 queries), so a reset or restored database is never
+    mistaken for a backfilled one. Never writes.
+    """
+    if db.session.query(rollup.c.id).limit(1).first() is not None:
+        return True
+    return db.session.query(Order.id).limit(1).first() is None
+
+
+def daily_totals(start, end):
+    """
+    Selectable with the rollup's columns (date, status, payment_status and
+    MEASURES) for the days `start`..`end`: the rollup table itself, or a
+    live aggregate over orders while the rollup has not been backfilled.
+    """
+    if rollup_ready():
+        return rollup
+    lower = datetime.combine(start, datetime.min.time())
+    upper = datetime.combine(end + timedelta(days=1), datetime.min.time())
+    return _grouped_totals(Order.order_date >= lower, Order.order_date < upper).subquery('live_rollup')
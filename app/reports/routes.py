@@ -1,29 +1,71 @@
-from flask import render_template, request
+from flask import render_template, request, jsonify
 from flask_login import login_required
+from sqlalchemy.orm import joinedload
 from app.models import Order
 from app.reports import bp
+from app.reports.utils import GRANULARITIES, sales_by_period, serialize_periods
+from app.utils.pagination import keyset_page
 from datetime import datetime, timedelta
 
+
+def _date_range(default_days):
+    """Read start_date/end_date from the querystring, falling back to the last `default_days`."""
+    now = datetime.utcnow()
+    try:
+        start = datetime.fromisoformat(request.args['start_date'])
+    except (KeyError, ValueError):
+        start = now - timedelta(days=default_days)
+    try:
+        end = datetime.fromisoformat(request.args['end_date'])
+        if len(request.args['end_date']) <= 10:
+            # A bare date means "through the end of that day"
+            end = end + timedelta(days=1) - timedelta(microseconds=1)
+    except (KeyError, ValueError):
+        end = now
+    return start, end
+
+
+def _granularity(default):
+    granularity = request.args.get('granularity', default)
+    return granularity if granularity in GRANULARITIES else default
+
+
+def _order_page(start, end):
+    """One keyset page of orders in the range, newest first."""
+    per_page = min(max(request.args.get('per_page', 25, type=int), 1), 100)
+    cursor = request.args.get('cursor')
+    query = (
+        Order.query
+        .options(joinedload(Order.customer))
+        .filter(Order.order_date >= start, Order.order_date <= end)
+    )
+    orders, next_cursor = keyset_page(
+        query, Order.order_date, Order.id, cursor=cursor, per_page=per_page
+    )
+    return orders, next_cursor, not cursor, per_page
+
+
 @bp.route('/sales')
 @login_required
 def sales_report():
     # Default to last 30 days
-    start_date = datetime.utcnow() - timedelta(days=30)
-    end_date = datetime.utcnow()
-    
-    orders = Order.query.filter(
-        Order.order_date >= start_date,
-        Order.order_date <= end_date
-    ).order_by(Order.order_date.desc()).all()
-    
-    total_sales = sum(o.total_amount for o in orders)
-    avg_order_value = total_sales / len(orders) if orders else 0
-    
+    start_date, end_date = _date_range(30)
+    granularity = _granularity('day')
+
+    periods, totals = sales_by_period(start_date, end_date, granularity)
+    orders, next_cursor, is_first_page, per_page = _order_page(start_date, end_date)
+
     return render_template(
         'reports/sales.html',
         orders=orders,
-        total_sales=total_sales,
-        avg_order_value=avg_order_value,
+        periods=periods,
+        totals=totals,
+        total_sales=totals['revenue'],
+        avg_order_value=totals['aov'],
+        granularity=granularity,
+        next_cursor=next_cursor,
+        is_first_page=is_first_page,
+        per_page=per_page,
         start_date=start_date.date(),
         end_date=end_date.date()
     )
@@ -32,31 +74,41 @@ def sales_report():
 @login_required
 def full_sales_report():
     # Accept optional date filters via querystring
-    start_str = request.args.get('start_date')
-    end_str = request.args.get('end_date')
-    
-    try:
-        start = datetime.fromisoformat(start_str) if start_str else datetime.utcnow() - timedelta(days=365)
-    except ValueError:
-        start = datetime.utcnow() - timedelta(days=365)
-    try:
-        end = datetime.fromisoformat(end_str) if end_str else datetime.utcnow()
-    except ValueError:
-        end = datetime.utcnow()
-    
-    orders = Order.query.filter(
-        Order.order_date >= start,
-        Order.order_date <= end
-    ).order_by(Order.order_date.desc()).all()
-    
-    total_amount = sum(o.total_amount for o in orders)
-    total_count = len(orders)
-    
+    start, end = _date_range(365)
+    granularity = _granularity('month')
+
+    periods, totals = sales_by_period(start, end, granularity)
+    orders, next_cursor, is_first_page, per_page = _order_page(start, end)
+
     return render_template(
         'reports/full_report.html',
         orders=orders,
-        total_amount=total_amount,
-        total_count=total_count,
+        periods=periods,
+        totals=totals,
+        total_amount=totals['revenue'],
+        total_count=totals['orders'],
+        granularity=granularity,
+        next_cursor=next_cursor,
+        is_first_page=is_first_page,
+        per_page=per_page,
         start=start.date(),
         end=end.date()
     )
+
+@bp.route('/sales/data')
+@login_required
+def sales_data():
+    """Bucketed sales figures as JSON, for charts."""
+    start, end = _date_range(30)
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        return jsonify({'error': f'granularity must be one of {", ".join(GRANULARITIES)}'}), 400
+
+    periods, totals = sales_by_period(start, end, granularity)
+    return jsonify({
+        'start_date': start.date().isoformat(),
+        'end_date': end.date().isoformat(),
+        'granularity': granularity,
+        'totals': dict(totals, period=None),
+        'periods': serialize_periods(periods)
+    })
@@ -1,22 +1,157 @@
-from datetime import datetime, timedelta
-from app.models import Order, OrderItem, Product
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, cast
+from app.extensions import db
+from app.models import OrderItem, Product
+from app.reports.rollup import daily_totals
 
-def get_sales_data(start_date=None, end_date=None):
+GRANULARITIES = ('day', 'week', 'month')
+
+
+# ─── Time buckets ────────────────────────────────────────────────────────────
+def period_bucket(column, granularity, dialect):
+    """
+    SQL expression for the first day of the day/week/month containing
+    `column`. Weeks start on Monday.
+    """
+    if dialect == 'sqlite':
+        if granularity == 'day':
+            return func.date(column)
+        if granularity == 'week':
+            # 'weekday 1' moves forward to the next Monday, so step back first
+            return func.date(column, '-6 days', 'weekday 1')
+        return func.strftime('%Y-%m-01', column)
+    return cast(func.date_trunc(granularity, column), db.Date)
+
+
+def bucket_start(value, granularity):
+    """Python counterpart of period_bucket()."""
+    if isinstance(value, datetime):
+        value = value.date()
+    if granularity == 'week':
+        return value - timedelta(days=value.weekday())
+    if granularity == 'month':
+        return value.replace(day=1)
+    return value
+
+
+def _next_bucket(value, granularity):
+    if granularity == 'week':
+        return value + timedelta(days=7)
+    if granularity == 'month':
+        return (value.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return value + timedelta(days=1)
+
+
+def _as_date(value):
+    # SQLite returns bucket keys as 'YYYY-MM-DD' text, Postgres as dates
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+# Key in the returned buckets -> rollup column
+SUMS = {
+    'orders': 'order_count',
+    'revenue': 'revenue',
+    'tax': 'tax_amount',
+    'shipping': 'shipping_cost',
+    'discount': 'discount_amount',
+    'items': 'item_count',
+    'paid': 'amount_paid',
+}
+
+
+def _empty_bucket(period):
+    bucket = {'period': period, 'aov': 0.0, 'statuses': {}, 'payment_statuses': {}}
+    bucket.update((name, 0) for name in SUMS)
+    return bucket
+
+
+# ─── Aggregation ─────────────────────────────────────────────────────────────
+def sales_by_period(start_date, end_date, granularity='day'):
+    """
+    Revenue, order count, average order value, tax/shipping/discount and
+    item totals, and status breakdowns for orders placed on the days from
+    `start_date` to `end_date`, bucketed by day, week or month.
+
+    Reads the daily_sales_rollup table with a single GROUP BY query, so the
+    cost depends on the number of days, not orders (until the rollup has
+    been backfilled, the same query runs over a live aggregate of orders). Returns
+    (periods, totals): `periods` is one dict per bucket in date order,
+    including empty buckets, and `totals` has the same keys for the whole
+    range.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Invalid granularity: {granularity}")
+    if isinstance(start_date, datetime):
+        start_date = start_date.date()
+    if isinstance(end_date, datetime):
+        end_date = end_date.date()
+
+    source = daily_totals(start_date, end_date).c
+    dialect = db.session.get_bind().dialect.name
+    bucket = period_bucket(source.date, granularity, dialect).label('period')
+    rows = (
+        db.session.query(
+            bucket,
+            source.status,
+            source.payment_status,
+            *(func.coalesce(func.sum(source[column]), 0) for column in SUMS.values())
+        )
+        .filter(source.date >= start_date, source.date <= end_date)
+        .group_by(bucket, source.status, source.payment_status)
+        .all()
+    )
+
+    periods = {}
+    current = bucket_start(start_date, granularity)
+    last = bucket_start(end_date, granularity)
+    while current <= last:
+        periods[current] = _empty_bucket(current)
+        current = _next_bucket(current, granularity)
+
+    totals = _empty_bucket(None)
+    for period, status, payment_status, *sums in rows:
+        values = dict(zip(SUMS, sums))
+        if not values['orders']:
+            continue  # every order for this key has since moved or been deleted
+        period = _as_date(period)
+        entry = periods.setdefault(period, _empty_bucket(period))
+        for target in (entry, totals):
+            for name, value in values.items():
+                target[name] += value
+            for group, key in (('statuses', status), ('payment_statuses', payment_status)):
+                breakdown = target[group].setdefault(
+                    key.name if key else 'UNKNOWN', {'orders': 0, 'revenue': 0.0}
+                )
+                breakdown['orders'] += values['orders']
+                breakdown['revenue'] += values['revenue']
+
+    for entry in list(periods.values()) + [totals]:
+        entry['aov'] = entry['revenue'] / entry['orders'] if entry['orders'] else 0.0
+
+    return [periods[k] for k in sorted(periods)], totals
+
+
+def serialize_periods(periods):
+    """JSON-friendly copy of sales_by_period() buckets."""
+    return [dict(p, period=p['period'].isoformat()) for p in periods]
+
+
+def get_sales_data(start_date=None, end_date=None, granularity='day'):
     """Generate sales data for the given date range"""
     if not start_date:
         start_date = datetime.utcnow() - timedelta(days=30)
     if not end_date:
         end_date = datetime.utcnow()
-    
-    query = Order.query.filter(
-        Order.order_date >= start_date,
-        Order.order_date <= end_date
-    )
-    
+
+    periods, totals = sales_by_period(start_date, end_date, granularity)
+
     return {
-        'total_orders': query.count(),
-        'total_sales': sum(order.total_amount for order in query.all()),
-        'orders': query.order_by(Order.order_date).all()
+        'total_orders': totals['orders'],
+        'total_sales': totals['revenue'],
+        'totals': totals,
+        'periods': periods
     }
 
 def get_top_products(limit=5):
@@ -25,4 +160,4 @@ def get_top_products(limit=5):
         Product.name,
         db.func.sum(OrderItem.quantity).label('total_quantity'),
         db.func.sum(OrderItem.quantity * OrderItem.unit_price).label('total_revenue')
-    ).join(OrderItem).group_by(Product.id).order_by(db.desc('total_revenue')).limit(limit).all()
\ No newline at end of file
+    ).join(OrderItem).group_by(Product.id).order_by(db.desc('total_revenue')).limit(limit).all()
@@ -1 +1,2 @@
 from app.search.routes import bp
+from app.search import index, suggestions, commands
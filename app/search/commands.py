@@ -0,0 +1,10 @@
+import click
+from app.search.routes import bp
+from app.search.index import rebuild_search_index
+
+
+@bp.cli.command('rebuild')
+def rebuild_command():
+    """Rebuild the product full-text search index from scratch."""
+    count = rebuild_search_index()
+    click.echo(f"Search index rebuilt ({count} products).")
@@ -0,0 +1,207 @@
+# app/search/index.py
+"""
+Full-text product search.
+
+SQLite: an FTS5 table `product_search` (rowid = products.id) kept in sync
+by mapper events on Product. The table is created and filled from the
+existing products on first use; `flask search rebuild` regenerates it.
+PostgreSQL: a GIN index over a `to_tsvector` expression on products, which
+the database maintains itself.
+Any other dialect falls back to ILIKE matching.
+"""
+import re
+from sqlalchemy import event, text, or_, inspect
+from app.extensions import db
+from app.models import Product
+
+FTS_TABLE = 'product_search'
+INDEXED_FIELDS = ('name', 'sku', 'description')
+PG_INDEX = 'ix_products_search_tsv'
+PG_DOCUMENT = (
+    "to_tsvector('english', coalesce(name, '') || ' ' || "
+    "coalesce(sku, '') || ' ' || coalesce(description, ''))"
+)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _dialect(bind):
+    return bind.dialect.name
+
+
+# ─── Index DDL ───────────────────────────────────────────────────────────────
+def _backfill_fts(connection):
+    connection.execute(text(
+        f"INSERT INTO {FTS_TABLE} (rowid, name, sku, description) "
+        f"SELECT id, name, coalesce(sku, ''), coalesce(description, '') FROM products"
+    ))
+
+
+def ensure_search_index(connection):
+    """
+    Create the search structure for this database if it is missing. A
+    newly created SQLite FTS table is filled from the products table in
+    the same step; returns True when that happened.
+
+    Existence is checked in the catalog on every call (one indexed lookup)
+    rather than remembered per process, so a database recreated under the
+    same URL (tests, drop_all/create_all) gets its index back.
+    """
+    created = False
+    dialect = _dialect(connection)
+    if dialect == 'sqlite':
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': FTS_TABLE}
+        ).first()
+        if not exists:
+            connection.execute(text(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} "
+                f"USING fts5(name, sku, description, tokenize='unicode61')"
+            ))
+            _backfill_fts(connection)
+            created = True
+    elif dialect == 'postgresql':
+        exists = connection.execute(
+            text("SELECT to_regclass(:name)"), {'name': PG_INDEX}
+        ).scalar()
+        if exists is None:
+            connection.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {PG_INDEX} ON products USING GIN ({PG_DOCUMENT})"
+            ))
+    return created
+
+
+def rebuild_search_index():
+    """Drop and repopulate the search index from the products table."""
+    with db.engine.begin() as connection:
+        dialect = _dialect(connection)
+        if dialect == 'sqlite':
+            connection.execute(text(f"DROP TABLE IF EXISTS {FTS_TABLE}"))
+            ensure_search_index(connection)
+            return connection.execute(text(f"SELECT count(*) FROM {FTS_TABLE}")).scalar()
+        if dialect == 'postgresql':
+            connection.execute(text(f"DROP INDEX IF EXISTS {PG_INDEX}"))
+            ensure_search_index(connection)
+        return connection.execute(text("SELECT count(*) FROM products")).scalar()
+
+
+# ─── Sync from Product flushes (SQLite only) ────────────────────────────────
+def _index_row(connection, target):
+    connection.execute(
+        text(f"INSERT INTO {FTS_TABLE} (rowid, name, sku, description) "
+             f"VALUES (:id, :name, :sku, :description)"),
+        {
+            'id': target.id,
+            'name': target.name or '',
+            'sku': target.sku or '',
+            'description': target.description or '',
+        }
+    )
+
+
+def _unindex_row(connection, product_id):
+    connection.execute(
+        text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {'id': product_id}
+    )
+
+
+@event.listens_for(Product, 'after_insert')
+def _product_inserted(mapper, connection, target):
+    if _dialect(connection) == 'sqlite':
+        if not ensure_search_index(connection):
+            # else the backfill included it; a leftover row from a dropped
+            # products table must not block the rowid
+            _unindex_row(connection, target.id)
+            _index_row(connection, target)
+
+
+@event.listens_for(Product, 'after_update')
+def _product_updated(mapper, connection, target):
+    state = inspect(target)
+    if not any(state.attrs[field].history.has_changes() for field in INDEXED_FIELDS):
+        return  # e.g. stock or price changes
+    if _dialect(connection) == 'sqlite':
+        ensure_search_index(connection)
+        _unindex_row(connection, target.id)
+        _index_row(connection, target)
+
+
+@event.listens_for(Product, 'after_delete')
+def _product_deleted(mapper, connection, target):
+    if _dialect(connection) == 'sqlite':
+        ensure_search_index(connection)
+        _unindex_row(connection, target.id)
+
+
+# ─── Querying ────────────────────────────────────────────────────────────────
+def _fts5_query(query):
+    """Turn free text into an FTS5 expression of quoted prefix terms."""
+    tokens = _TOKEN_RE.findall(query)
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _ids_sqlite(connection, query, limit, offset):
+    match = _fts5_query(query)
+    if not match:
+        return [], 0
+    total = connection.execute(
+        text(f"SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :q"),
+        {'q': match}
+    ).scalar()
+    rows = connection.execute(
+        text(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :q "
+             f"ORDER BY bm25({FTS_TABLE}, 10.0, 5.0, 1.0) LIMIT :limit OFFSET :offset"),
+        {'q': match, 'limit': limit, 'offset': offset}
+    )
+    return [row[0] for row in rows], total
+
+
+def _ids_postgres(connection, query, limit, offset):
+    params = {'q': query, 'limit': limit, 'offset': offset}
+    total = connection.execute(
+        text(f"SELECT count(*) FROM products "
+             f"WHERE {PG_DOCUMENT} @@ websearch_to_tsquery('english', :q)"),
+        params
+    ).scalar()
+    rows = connection.execute(
+        text(f"SELECT id FROM products "
+             f"WHERE {PG_DOCUMENT} @@ websearch_to_tsquery('english', :q) "
+             f"ORDER BY ts_rank({PG_DOCUMENT}, websearch_to_tsquery('english', :q)) DESC, id "
+             f"LIMIT :limit OFFSET :offset"),
+        params
+    )
+    return [row[0] for row in rows], total
+
+
+def search_products(query, page=1, per_page=20):
+    """
+    Relevance-ranked product search.
+
+    Returns (products, total) where `products` is the requested page in
+    rank order and `total` is the number of matching products.
+    """
+    query = (query or '').strip()
+    if not query:
+        return [], 0
+    page = max(page, 1)
+    offset = (page - 1) * per_page
+
+    connection = db.session.connection()
+    dialect = _dialect(connection)
+
+    if dialect in ('sqlite', 'postgresql'):
+        ensure_search_index(connection)
+        fetch = _ids_sqlite if dialect == 'sqlite' else _ids_postgres
+        ids, total = fetch(connection, query, per_page, offset)
+        if not ids:
+            return [], total
+        by_id = {p.id: p for p in Product.query.filter(Product.id.in_(ids))}
+        return [by_id[i] for i in ids if i in by_id], total
+
+    pattern = f'%{query}%'
+    matches = Product.query.filter(
+        or_(Product.name.ilike(pattern), Product.description.ilike(pattern))
+    )
+    total = matches.count()
+    return matches.order_by(Product.name).offset(offset).limit(per_page).all(), total
@@ -0,0 +1,314 @@
+# app/search/suggestions.py
+"""
+In-process prefix indexes for the autocomplete endpoint.
+
+Each index is a sorted array of (term, doc_id) pairs searched with bisect,
+so a lookup costs O(log n + k) and never touches the database. Indexes are
+loaded on first use and then kept current from Product / Order / Customer
+flushes, applied only once the session commits. Changes committed by other
+worker processes are picked up by a full reload every SUGGEST_INDEX_MAX_AGE
+seconds, run in a background thread while requests keep reading the
+current index.
+
+The order index holds the SUGGEST_ORDER_LIMIT most recent orders (plus any
+committed since), not the whole table. Customer lookups only examine that
+customer's own orders.
+"""
+import bisect
+import threading
+import time
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from app.extensions import db
+from app.models import Product, Order, Customer
+
+
+def normalize(value):
+    return ' '.join(str(value).casefold().split()) if value else ''
+
+
+def terms_for(*values):
+    """Index a value as a whole and by each of its words."""
+    terms = set()
+    for value in values:
+        norm = normalize(value)
+        if norm:
+            terms.add(norm)
+            terms.update(norm.split(' '))
+    return terms
+
+
+class PrefixIndex:
+    def __init__(self):
+        self._entries = []  # sorted [(term, doc_id)]
+        self._docs = {}     # doc_id -> (terms, payload)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._docs = {}
+
+    def load(self, docs):
+        """Replace the contents with an iterable of (doc_id, terms, payload)."""
+        entries, stored = [], {}
+        for doc_id, terms, payload in docs:
+            stored[doc_id] = (terms, payload)
+            entries.extend((term, doc_id) for term in terms)
+        entries.sort()
+        with self._lock:
+            self._entries = entries
+            self._docs = stored
+
+    def put(self, doc_id, terms, payload):
+        with self._lock:
+            self.discard(doc_id)
+            self._docs[doc_id] = (terms, payload)
+            for term in terms:
+                bisect.insort(self._entries, (term, doc_id))
+
+    def discard(self, doc_id):
+        with self._lock:
+            existing = self._docs.pop(doc_id, None)
+            if not existing:
+                return
+            for term in existing[0]:
+                i = bisect.bisect_left(self._entries, (term, doc_id))
+                if i < len(self._entries) and self._entries[i] == (term, doc_id):
+                    del self._entries[i]
+
+    def payload(self, doc_id):
+        doc = self._docs.get(doc_id)
+        return doc[1] if doc else None
+
+    def search(self, prefix, limit=5, predicate=None):
+        """Return up to `limit` payloads whose terms start with `prefix`."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        results, seen = [], set()
+        with self._lock:
+            i = bisect.bisect_left(self._entries, (prefix,))
+            while i < len(self._entries) and len(results) < limit:
+                term, doc_id = self._entries[i]
+                if not term.startswith(prefix):
+                    break
+                i += 1
+                if doc_id in seen:
+                    continue
+                seen.add(doc_id)
+                payload = self._docs[doc_id][1]
+                if predicate is None or predicate(payload):
+                    results.append(payload)
+        return results
+
+    def search_in(self, prefix, doc_ids, limit=5):
+        """
+        Like search(), but only over `doc_ids`: each candidate document's
+        terms are checked directly, so the cost depends on len(doc_ids)
+        rather than on how many documents share the prefix.
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        matches = []
+        with self._lock:
+            for doc_id in doc_ids:
+                doc = self._docs.get(doc_id)
+                if doc is None:
+                    continue
+                term = min((t for t in doc[0] if t.startswith(prefix)), default=None)
+                if term is not None:
+                    matches.append((term, doc_id, doc[1]))
+        matches.sort(key=lambda match: match[:2])
+        return [payload for _, _, payload in matches[:limit]]
+
+
+# ─── Application indexes ─────────────────────────────────────────────────────
+products_index = PrefixIndex()
+orders_index = PrefixIndex()
+_customer_names = {}
+_customer_orders = {}  # customer_id -> {order_id}
+_state = {'loaded_at': None, 'refreshing': False}
+_build_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+
+
+def _order_doc(order_id, order_number, customer_id):
+    name = _customer_names.get(customer_id, '')
+    order_number = order_number or f"ORD{order_id:06d}"
+    payload = {
+        'id': order_id,
+        'order_number': order_number,
+        'customer_id': customer_id,
+        'customer_name': name,
+    }
+    return order_id, terms_for(order_number, str(order_id), name), payload
+
+
+def _put_order(order_id, order_number, customer_id):
+    orders_index.put(*_order_doc(order_id, order_number, customer_id))
+    _customer_orders.setdefault(customer_id, set()).add(order_id)
+
+
+def _discard_order(order_id):
+    payload = orders_index.payload(order_id)
+    if payload:
+        _customer_orders.get(payload['customer_id'], set()).discard(order_id)
+    orders_index.discard(order_id)
+
+
+def rebuild_suggestion_indexes():
+    """
+    Reload both indexes from the database using column-only queries; the
+    order index gets the SUGGEST_ORDER_LIMIT most recent orders.
+    """
+    limit = current_app.config.get('SUGGEST_ORDER_LIMIT', 50000)
+    with _build_lock:
+        products_index.load(
+            (pid, terms_for(name, sku), {'id': pid, 'name': name})
+            for pid, name, sku in db.session.query(Product.id, Product.name, Product.sku)
+        )
+        _customer_names.clear()
+        _customer_names.update(db.session.query(Customer.id, Customer.name))
+        _customer_orders.clear()
+        rows = (
+            db.session.query(Order.id, Order.order_number, Order.customer_id)
+            .order_by(Order.id.desc())
+            .limit(limit)
+            .all()
+        )
+        for order_id, _, customer_id in rows:
+            _customer_orders.setdefault(customer_id, set()).add(order_id)
+        orders_index.load(_order_doc(*row) for row in rows)
+        _state['loaded_at'] = time.monotonic()
+
+
+def _reload(app):
+    try:
+        with app.app_context():
+            try:
+                rebuild_suggestion_indexes()
+            except Exception:
+                app.logger.exception("Failed to reload the suggestion indexes")
+            finally:
+                db.session.remove()
+    finally:
+        _state['refreshing'] = False
+
+
+def _ensure_loaded():
+    loaded_at = _state['loaded_at']
+    if loaded_at is None:
+        rebuild_suggestion_indexes()  # first use in this worker
+        return
+    max_age = current_app.config.get('SUGGEST_INDEX_MAX_AGE', 600)
+    if time.monotonic() - loaded_at <= max_age:
+        return
+    with _refresh_lock:
+        if _state['refreshing']:
+            return
+        _state['refreshing'] = True
+    threading.Thread(
+        target=_reload, args=(current_app._get_current_object(),),
+        name='suggest-reload', daemon=True
+    ).start()
+
+
+def suggest_products(prefix, limit=5):
+    _ensure_loaded()
+    return products_index.search(prefix, limit)
+
+
+def suggest_orders(prefix, limit=5, customer_id=None):
+    _ensure_loaded()
+    if customer_id is not None:
+        return orders_index.search_in(prefix, list(_customer_orders.get(customer_id, ())), limit)
+    return orders_index.search(prefix, limit)
+
+
+# ─── Incremental maintenance ─────────────────────────────────────────────────
+# Mapper events only queue changes on the session; they are applied after
+# commit so that rolled-back writes never reach the indexes.
+def _queue(target, op):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('_suggest_ops', []).append(op)
+
+
+def forget_orders(session, order_ids):
+    """Queue index removal for orders deleted without flush events."""
+    session.info.setdefault('_suggest_ops', []).extend(
+        ('order_delete', order_id) for order_id in order_ids
+    )
+
+
+@event.listens_for(Product, 'after_insert')
+@event.listens_for(Product, 'after_update')
+def _product_saved(mapper, connection, target):
+    _queue(target, ('product', target.id, target.name, target.sku))
+
+
+@event.listens_for(Product, 'after_delete')
+def _product_deleted(mapper, connection, target):
+    _queue(target, ('product_delete', target.id))
+
+
+@event.listens_for(Customer, 'after_insert')
+@event.listens_for(Customer, 'after_update')
+def _customer_saved(mapper, connection, target):
+    _queue(target, ('customer', target.id, target.name))
+
+
+@event.listens_for(Order, 'after_insert')
+@event.listens_for(Order, 'after_update')
+def _order_saved(mapper, connection, target):
+    _queue(target, ('order', target.id, target.order_number, target.customer_id))
+
+
+@event.listens_for(Order, 'after_delete')
+def _order_deleted(mapper, connection, target):
+    _queue(target, ('order_delete', target.id))
+
+
+def _apply(op):
+    kind = op[0]
+    if kind == 'product':
+        _, pid, name, sku = op
+        products_index.put(pid, terms_for(name, sku), {'id': pid, 'name': name})
+    elif kind == 'product_delete':
+        products_index.discard(op[1])
+    elif kind == 'customer':
+        _, customer_id, name = op
+        if _customer_names.get(customer_id) == name:
+            return
+        _customer_names[customer_id] = name
+        for order_id in list(_customer_orders.get(customer_id, ())):
+            payload = orders_index.payload(order_id)
+            if payload:
+                _put_order(order_id, payload['order_number'], customer_id)
+    elif kind == 'order':
+        _, order_id, order_number, customer_id = op
+        _discard_order(order_id)
+        _put_order(order_id, order_number, customer_id)
+    elif kind == 'order_delete':
+        _discard_order(op[1])
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_queued(session):
+    ops = session.info.pop('_suggest_ops', None)
+    if not ops or _state['loaded_at'] is None:
+        return
+    with _build_lock:
+        for op in ops:
+            _apply(op)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _drop_queued(session, previous_transaction):
+    session.info.pop('_suggest_ops', None)
@@ -0,0 +1,82 @@
+# app/utils/fragment_cache.py
+"""
+Bounded in-process cache of rendered template fragments.
+
+Callers build a key that changes whenever the fragment's output would
+(e.g. product id + updated_at + catalog version + viewer role), so
+entries never need explicit invalidation; superseded ones fall off the
+LRU end. The cache is bounded both by entry count and by the approximate
+memory of the stored strings.
+"""
+import sys
+import threading
+from collections import OrderedDict
+from markupsafe import Markup
+
+
+class FragmentCache:
+
+    def __init__(self, max_entries=5000, max_bytes=16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(self, max_entries=None, max_bytes=None):
+        with self._lock:
+            self.max_entries = max_entries or self.max_entries
+            self.max_bytes = max_bytes or self.max_bytes
+            self._evict()
+
+    def _evict(self):
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            _, (_, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+    def get_or_render(self, key, render):
+        """Cached fragment for `key`, calling `render()` to produce it on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        html = Markup(render())
+        size = sys.getsizeof(str(html))
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (html, size)
+            self._bytes += size
+            self._evict()
+        return html
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def report(self):
+        """Hit rate and memory use, for monitoring."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+            }
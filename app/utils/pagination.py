@@ -0,0 +1,61 @@
+# app/utils/pagination.py
+
+import base64
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(sort_value, row_id):
+    """Encode a (datetime, id) keyset position into a URL-safe token."""
+    if sort_value is None:
+        # NULLs sort outside the keyset filter; the sort column must be NOT NULL
+        raise ValueError(f"Cannot build a cursor for row {row_id}: sort value is NULL")
+    raw = f"{sort_value.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a cursor token back into (datetime, id); None if malformed."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        sort_str, id_str = raw.rsplit('|', 1)
+        return datetime.fromisoformat(sort_str), int(id_str)
+    except (ValueError, TypeError):
+        return None
+
+
+def keyset_page(query, sort_column, id_column, cursor=None, per_page=25):
+    """
+    Fetch one page of `query` ordered by (sort_column DESC, id_column DESC),
+    starting strictly after `cursor`.
+
+    Returns (rows, next_cursor). `next_cursor` is None on the last page.
+    Page cost depends only on `per_page`, not on how deep the cursor is,
+    provided an index on (sort_column, id_column) exists.
+    """
+    position = decode_cursor(cursor)
+    if position:
+        sort_value, row_id = position
+        query = query.filter(or_(
+            sort_column < sort_value,
+            and_(sort_column == sort_value, id_column < row_id)
+        ))
+
+    rows = (
+        query
+        .order_by(sort_column.desc(), id_column.desc())
+        .limit(per_page + 1)
+        .all()
+    )
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor(
+            getattr(last, sort_column.key), getattr(last, id_column.key)
+        )
+    return rows, next_cursor
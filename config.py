@@ -26,6 +26,61 @@ class Config:
         'SEED_DEFAULT_DATA', 'false'
     ).strip().lower() == 'true'
 
+    # Seconds a cached cart badge count may be served before re-querying.
+    # The cache is per worker process, so this bounds how long another
+    # worker can show a stale count; keep it short.
+    CART_COUNT_CACHE_TTL = int(os.environ.get('CART_COUNT_CACHE_TTL', 5))
+
+    # Seconds before the in-process autocomplete indexes are reloaded (in
+    # a background thread; requests keep using the current index meanwhile)
+    SUGGEST_INDEX_MAX_AGE = int(os.environ.get('SUGGEST_INDEX_MAX_AGE', 600))
+
+    # Most recent orders loaded into each worker's order autocomplete index
+    SUGGEST_ORDER_LIMIT = int(os.environ.get('SUGGEST_ORDER_LIMIT', 50000))
+
+    # Rows fetched per round trip when streaming CSV exports
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+
+    # Orders deleted per transaction by the bulk delete engine
+    BULK_DELETE_CHUNK_SIZE = int(os.environ.get('BULK_DELETE_CHUNK_SIZE', 500))
+
+    # Seconds a cart holds the stock it reserved
+    STOCK_RESERVATION_TTL = int(os.environ.get('STOCK_RESERVATION_TTL', 900))
+
+    # Seconds between background sweeps of expired reservations
+    STOCK_RESERVATION_SWEEP_INTERVAL = int(os.environ.get('STOCK_RESERVATION_SWEEP_INTERVAL', 60))
+
+    # Expired reservations deleted per transaction by the sweeper
+    STOCK_RESERVATION_SWEEP_BATCH = int(os.environ.get('STOCK_RESERVATION_SWEEP_BATCH', 1000))
+
+    # Guest cart store: unset for instance/guest_carts.db, sqlite:///<path>, or redis://...
+    CART_STORE_URL = os.environ.get('CART_STORE_URL') or os.environ.get('REDIS_URL')
+
+    # Seconds an untouched guest cart is kept
+    CART_SESSION_TTL = int(os.environ.get('CART_SESSION_TTL', 7 * 24 * 3600))
+
+    # Expired guest carts deleted per transaction
+    CART_STORE_GC_BATCH = int(os.environ.get('CART_STORE_GC_BATCH', 500))
+
+    # Catalog cache: unset for an in-process LRU (single worker only), or redis://... to share it
+    CATALOG_CACHE_URL = os.environ.get('CATALOG_CACHE_URL')
+
+    # Entries kept by the in-process catalog LRU
+    CATALOG_CACHE_SIZE = int(os.environ.get('CATALOG_CACHE_SIZE', 1000))
+
+    # Seconds a catalog entry is served; bounds staleness of columns changed by bulk statements
+    CATALOG_CACHE_TTL = int(os.environ.get('CATALOG_CACHE_TTL', 300))
+
+    # Products per storefront page (first page server-rendered, the rest via JSON)
+    HOME_PAGE_SIZE = int(os.environ.get('HOME_PAGE_SIZE', 24))
+
+    # Products in the storefront's featured and new-arrivals strips
+    HOME_FEATURED_COUNT = int(os.environ.get('HOME_FEATURED_COUNT', 12))
+
+    # Rendered product cards kept per worker, by count and by approximate bytes
+    FRAGMENT_CACHE_MAX_ENTRIES = int(os.environ.get('FRAGMENT_CACHE_MAX_ENTRIES', 5000))
+    FRAGMENT_CACHE_MAX_BYTES = int(os.environ.get('FRAGMENT_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+
     # ================= M-PESA (SANDBOX) =================
     MPESA_ENV = os.environ.get("MPESA_ENV", "sandbox")
 
@@ -40,6 +95,43 @@ class Config:
 
     MPESA_CALLBACK_URL = os.environ.get("MPESA_CALLBACK_URL")
     MPESA_TEST_PHONE = os.environ.get("MPESA_TEST_PHONE", "254729177471")
+
+    # Gateway HTTP client (app/mpesa/client.py). MPESA_BASE_URL overrides the
+    # MPESA_ENV default, e.g. to point at a local stand-in server.
+    MPESA_BASE_URL = os.environ.get("MPESA_BASE_URL")
+    MPESA_HTTP_POOL_SIZE = int(os.environ.get(
+        "MPESA_HTTP_POOL_SIZE", os.environ.get("WEB_CONCURRENCY", 10)
+    ))
+    MPESA_CONNECT_TIMEOUT = float(os.environ.get("MPESA_CONNECT_TIMEOUT", 3.05))
+    MPESA_READ_TIMEOUT = float(os.environ.get("MPESA_READ_TIMEOUT", 15))
+    MPESA_MAX_RETRIES = int(os.environ.get("MPESA_MAX_RETRIES", 2))
+    MPESA_RETRY_BACKOFF = float(os.environ.get("MPESA_RETRY_BACKOFF", 0.25))
+
+    # STK push initiation off the request thread (app/mpesa/jobs.py)
+    MPESA_ASYNC_PUSH = os.environ.get(
+        "MPESA_ASYNC_PUSH", "true"
+    ).strip().lower() == "true"
+    MPESA_PUSH_WORKERS = int(os.environ.get("MPESA_PUSH_WORKERS", 4))
+
+    # Callback ingestion (app/mpesa/callbacks.py): store the raw callback,
+    # acknowledge, and apply stored callbacks in batches in the background.
+    # Unmatched callbacks are retried for MPESA_CALLBACK_RETRY_WINDOW seconds.
+    MPESA_CALLBACK_QUEUE = os.environ.get(
+        "MPESA_CALLBACK_QUEUE", "true"
+    ).strip().lower() == "true"
+    MPESA_CALLBACK_BATCH_SIZE = int(os.environ.get("MPESA_CALLBACK_BATCH_SIZE", 100))
+    MPESA_CALLBACK_FLUSH_INTERVAL = float(os.environ.get("MPESA_CALLBACK_FLUSH_INTERVAL", 0.5))
+    MPESA_CALLBACK_POLL_INTERVAL = float(os.environ.get("MPESA_CALLBACK_POLL_INTERVAL", 30))
+    MPESA_CALLBACK_RETRY_WINDOW = int(os.environ.get("MPESA_CALLBACK_RETRY_WINDOW", 3600))
+
+    # Reconciler for PENDING transactions whose callback never arrived
+    # (`flask mpesa reconcile`, run from cron or with --loop)
+    MPESA_RECONCILE_AFTER = int(os.environ.get("MPESA_RECONCILE_AFTER", 120))
+    # Seconds before a PENDING push that never got a CheckoutRequestID is
+    # given up on; until then it may still be in a worker's push queue
+    MPESA_PUSH_ABANDON_AFTER = int(os.environ.get("MPESA_PUSH_ABANDON_AFTER", 1800))
+    MPESA_RECONCILE_BATCH_SIZE = int(os.environ.get("MPESA_RECONCILE_BATCH_SIZE", 200))
+    MPESA_RECONCILE_CONCURRENCY = int(os.environ.get("MPESA_RECONCILE_CONCURRENCY", 8))
     # ====================================================
 
 
@@ -51,7 +143,16 @@ class ProductionConfig(Config):
     DEBUG = False
 
 
+class TestingConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    WTF_CSRF_ENABLED = False
+    # Apply callbacks in the request instead of a background thread
+    MPESA_CALLBACK_QUEUE = False
+
+
 config = {
     'development': DevelopmentConfig,
-    'production': ProductionConfig
+    'production': ProductionConfig,
+    'testing': TestingConfig
 }
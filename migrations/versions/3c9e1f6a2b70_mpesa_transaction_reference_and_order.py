@@ -0,0 +1,55 @@
+"""M-PESA transaction reference and order_id
+
+Adds the public polling reference and the order link to
+mpesa_transactions, plus the indexes the callback and status lookups
+use. Safe on databases where db.create_all() already created them.
+
+Revision ID: 3c9e1f6a2b70
+Revises:
+Create Date: 2026-10-17 09:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9e1f6a2b70'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _existing(table):
+    inspector = sa.inspect(op.get_bind())
+    return (
+        {c['name'] for c in inspector.get_columns(table)},
+        {i['name'] for i in inspector.get_indexes(table)},
+    )
+
+
+def upgrade():
+    columns, indexes = _existing('mpesa_transactions')
+    with op.batch_alter_table('mpesa_transactions') as batch_op:
+        if 'reference' not in columns:
+            batch_op.add_column(sa.Column('reference', sa.String(length=64), nullable=True))
+        if 'order_id' not in columns:
+            batch_op.add_column(sa.Column('order_id', sa.Integer(), nullable=True))
+            batch_op.create_foreign_key(
+                'fk_mpesa_transactions_order_id', 'orders', ['order_id'], ['id']
+            )
+        if 'ix_mpesa_transactions_reference' not in indexes:
+            batch_op.create_index('ix_mpesa_transactions_reference', ['reference'], unique=True)
+        if 'ix_mpesa_transactions_checkout' not in indexes:
+            batch_op.create_index('ix_mpesa_transactions_checkout', ['checkout_request_id'], unique=True)
+        if 'ix_mpesa_transactions_order' not in indexes:
+            batch_op.create_index('ix_mpesa_transactions_order', ['order_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('mpesa_transactions') as batch_op:
+        batch_op.drop_index('ix_mpesa_transactions_order')
+        batch_op.drop_index('ix_mpesa_transactions_checkout')
+        batch_op.drop_index('ix_mpesa_transactions_reference')
+        batch_op.drop_column('order_id')
+        batch_op.drop_column('reference')
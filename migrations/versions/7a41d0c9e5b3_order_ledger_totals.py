@@ -0,0 +1,40 @@
+"""Order amount_paid and amount_refunded
+
+Adds the ledger totals kept on orders. Existing orders start at 0; fill
+them in from their payments and refunds with
+
+    flask orders verify-balances --fix
+
+Revision ID: 7a41d0c9e5b3
+Revises: 3c9e1f6a2b70
+Create Date: 2026-10-17 09:20:05.774519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a41d0c9e5b3'
+down_revision = '3c9e1f6a2b70'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('orders')}
+    if 'amount_paid' in columns:
+        return
+    with op.batch_alter_table('orders') as batch_op:
+        batch_op.add_column(sa.Column('amount_paid', sa.Float(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('amount_refunded', sa.Float(), nullable=False, server_default='0'))
+        batch_op.create_check_constraint('check_amount_paid_positive', 'amount_paid >= 0')
+        batch_op.create_check_constraint('check_amount_refunded_positive', 'amount_refunded >= 0')
+
+
+def downgrade():
+    with op.batch_alter_table('orders') as batch_op:
+        batch_op.drop_constraint('check_amount_refunded_positive', type_='check')
+        batch_op.drop_constraint('check_amount_paid_positive', type_='check')
+        batch_op.drop_column('amount_refunded')
+        batch_op.drop_column('amount_paid')
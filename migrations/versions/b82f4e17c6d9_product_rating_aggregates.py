@@ -0,0 +1,37 @@
+"""Product rating aggregates
+
+Adds rating_count, rating_sum and the per-star counters to products.
+Existing products start at 0; compute them from approved reviews with
+
+    flask products recompute-ratings
+
+Revision ID: b82f4e17c6d9
+Revises: 7a41d0c9e5b3
+Create Date: 2026-10-17 09:27:48.102937
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b82f4e17c6d9'
+down_revision = '7a41d0c9e5b3'
+branch_labels = None
+depends_on = None
+
+COLUMNS = ('rating_count', 'rating_sum', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5')
+
+
+def upgrade():
+    existing = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('products')}
+    with op.batch_alter_table('products') as batch_op:
+        for name in COLUMNS:
+            if name not in existing:
+                batch_op.add_column(sa.Column(name, sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('products') as batch_op:
+        for name in reversed(COLUMNS):
+            batch_op.drop_column(name)
@@ -0,0 +1,58 @@
+"""Cart item variant: '' instead of NULL
+
+uq_cart_item_user_product_variant never matched rows without a variant,
+because NULLs are distinct, so plain products could end up with several
+rows per user. Merges those duplicates, stores '' for "no variant" and
+makes the column NOT NULL, so the constraint (and the guest cart merge's
+ON CONFLICT upsert) covers them.
+
+Revision ID: d5c7a93e18f2
+Revises: b82f4e17c6d9
+Create Date: 2026-10-17 09:41:13.650281
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5c7a93e18f2'
+down_revision = 'b82f4e17c6d9'
+branch_labels = None
+depends_on = None
+
+# First NULL-variant row of each (user_id, product_id), which keeps the total
+FIRST_ROW = """
+    SELECT MIN(kept.id) FROM cart_items kept
+    WHERE kept.user_id = cart_items.user_id
+      AND kept.product_id = cart_items.product_id
+      AND kept.variant IS NULL
+"""
+
+
+def upgrade():
+    op.execute(f"""
+        UPDATE cart_items SET quantity = (
+            SELECT SUM(dup.quantity) FROM cart_items dup
+            WHERE dup.user_id = cart_items.user_id
+              AND dup.product_id = cart_items.product_id
+              AND dup.variant IS NULL
+        )
+        WHERE variant IS NULL AND id = ({FIRST_ROW})
+    """)
+    op.execute(f"DELETE FROM cart_items WHERE variant IS NULL AND id <> ({FIRST_ROW})")
+    op.execute("UPDATE cart_items SET variant = '' WHERE variant IS NULL")
+    with op.batch_alter_table('cart_items') as batch_op:
+        batch_op.alter_column(
+            'variant', existing_type=sa.String(length=100),
+            nullable=False, server_default=''
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('cart_items') as batch_op:
+        batch_op.alter_column(
+            'variant', existing_type=sa.String(length=100),
+            nullable=True, server_default=None
+        )
+    op.execute("UPDATE cart_items SET variant = NULL WHERE variant = ''")
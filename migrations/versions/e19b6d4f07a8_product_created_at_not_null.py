@@ -0,0 +1,48 @@
+"""Product created_at NOT NULL, storefront indexes
+
+The storefront and category listings page through products by
+(created_at, id). Products with a NULL created_at fell out of those pages
+(NULL never compares below a cursor) and broke the cursor when they came
+last on a page. Backfills them from updated_at (or now), makes the column
+NOT NULL and adds the keyset indexes.
+
+Revision ID: e19b6d4f07a8
+Revises: d5c7a93e18f2
+Create Date: 2026-10-17 09:58:36.207154
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e19b6d4f07a8'
+down_revision = 'd5c7a93e18f2'
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    'ix_products_created': ['created_at', 'id'],
+    'ix_products_featured_created': ['is_featured', 'created_at'],
+    'ix_products_category_created': ['category_id', 'created_at', 'id'],
+}
+
+
+def upgrade():
+    op.execute(
+        "UPDATE products SET created_at = COALESCE(updated_at, CURRENT_TIMESTAMP) "
+        "WHERE created_at IS NULL"
+    )
+    existing = {i['name'] for i in sa.inspect(op.get_bind()).get_indexes('products')}
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+        for name, columns in INDEXES.items():
+            if name not in existing:
+                batch_op.create_index(name, columns)
+
+
+def downgrade():
+    with op.batch_alter_table('products') as batch_op:
+        for name in reversed(list(INDEXES)):
+            batch_op.drop_index(name)
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=True)
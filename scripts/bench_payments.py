@@ -0,0 +1,222 @@
+"""
+Payment load benchmark.
+
+Drives POST /payments/mpesa and/or POST /mpesa/callback on a running app at
+a fixed target rate (open loop) and reports throughput and p50/p95/p99
+latency. Latency is measured from each request's scheduled start, so a
+server that falls behind is charged for the queueing it causes.
+
+/payments/mpesa only accepts orders the signed-in user may pay, so each
+worker first logs in (by default as the seeded admin1, who may pay any
+order) and pays order ids drawn from --order-ids, which must exist (the
+seeded data has ids 1..NUM_ORDERS).
+
+Standard library only. Typical run against the local simulator:
+
+    python scripts/mpesa_simulator.py --seed 1 &
+    python scripts/bench_payments.py --base-url http://127.0.0.1:5000 --rate 50 --duration 30 \
+        --username admin1 --password admin1.p --order-ids 1-200
+"""
+import argparse
+import http.cookiejar
+import json
+import queue
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+CSRF_RE = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+
+
+def parse_ids(spec):
+    """'1-200,350,400-410' -> sorted list of ids."""
+    ids = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        lo, _, hi = part.partition("-")
+        ids.update(range(int(lo), int(hi or lo) + 1))
+    return sorted(ids)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+class Client:
+    """One keep-alive cookie session per worker thread."""
+
+    def __init__(self, base_url, timeout, username=None, password=None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.username = username
+        self.password = password
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+        self.csrf_token = None
+
+    def _open(self, request):
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def _csrf(self, path):
+        _, page = self._open(self.base_url + path)
+        match = CSRF_RE.search(page.decode(errors="replace"))
+        return match.group(1) if match else ""
+
+    def login(self):
+        """Sign in once per worker; raises if the credentials are rejected."""
+        form = {
+            "username": self.username,
+            "password": self.password,
+            "csrf_token": self._csrf("/login"),
+        }
+        self._open(urllib.request.Request(
+            self.base_url + "/login", data=urllib.parse.urlencode(form).encode()
+        ))
+        # Signed-in users are redirected away from the login form
+        _, page = self._open(self.base_url + "/login")
+        if b'name="password"' in page:
+            raise RuntimeError(f"Login failed for {self.username!r}")
+
+    def payment(self, rng, order_ids):
+        if self.csrf_token is None:
+            if self.username:
+                self.login()
+            self.csrf_token = self._csrf("/payments/mpesa")
+        form = {
+            "phone": f"2547{rng.randrange(10 ** 8):08d}",
+            "amount": f"{rng.randint(10, 5000)}",
+            "order_id": str(rng.choice(order_ids)),
+            "pin": f"{rng.randrange(10 ** 4):04d}",
+            "csrf_token": self.csrf_token,
+        }
+        request = urllib.request.Request(
+            self.base_url + "/payments/mpesa",
+            data=urllib.parse.urlencode(form).encode()
+        )
+        return self._open(request)[0]
+
+    def callback(self, rng, seq, duplicate_rate):
+        # Re-send an earlier CheckoutRequestID now and then, like gateway retries
+        ref = rng.randrange(max(seq, 1)) if rng.random() < duplicate_rate else seq
+        success = rng.random() < 0.8
+        stk = {
+            "MerchantRequestID": f"BENCH-{ref}",
+            "CheckoutRequestID": f"ws_CO_BENCH_{ref:010d}",
+            "ResultCode": 0 if success else 1032,
+            "ResultDesc": "OK" if success else "Request cancelled by user.",
+        }
+        if success:
+            stk["CallbackMetadata"] = {"Item": [
+                {"Name": "MpesaReceiptNumber", "Value": f"BENCH{ref:08d}"},
+                {"Name": "TransactionDate", "Value": 20240101120000},
+            ]}
+        request = urllib.request.Request(
+            self.base_url + "/mpesa/callback",
+            data=json.dumps({"Body": {"stkCallback": stk}}).encode(),
+            headers={"Content-Type": "application/json"}
+        )
+        return self._open(request)[0]
+
+
+def run(args):
+    targets = ["payments", "callback"] if args.target == "both" else [args.target]
+    jobs = queue.Queue()
+    results = {t: [] for t in targets}
+    errors = {t: 0 for t in targets}
+    lock = threading.Lock()
+
+    order_ids = parse_ids(args.order_ids)
+    if "payments" in targets and not (args.username and order_ids):
+        raise SystemExit("the payments target needs --username/--password and --order-ids")
+
+    def worker(worker_id):
+        client = Client(args.base_url, args.timeout, args.username, args.password)
+        rng = random.Random(f"{args.seed}:{worker_id}")
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            target, seq, scheduled = job
+            try:
+                if target == "payments":
+                    status = client.payment(rng, order_ids)
+                else:
+                    status = client.callback(rng, seq, args.duplicate_rate)
+                ok = 200 <= status < 300
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - scheduled
+            with lock:
+                results[target].append(elapsed)
+                if not ok:
+                    errors[target] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True)
+               for i in range(args.concurrency)]
+    for t in threads:
+        t.start()
+
+    interval = 1.0 / args.rate
+    total = int(args.rate * args.duration)
+    start = time.perf_counter()
+    for seq in range(total):
+        scheduled = start + seq * interval
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        jobs.put((targets[seq % len(targets)], seq, scheduled))
+    for _ in threads:
+        jobs.put(None)
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+
+    print(f"Target {args.rate:.1f} req/s for {args.duration}s, "
+          f"{args.concurrency} workers, seed {args.seed}")
+    print(f"{'endpoint':<10} {'count':>7} {'errors':>7} {'req/s':>8} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for target in targets:
+        values = sorted(results[target])
+        print(f"{target:<10} {len(values):>7} {errors[target]:>7} "
+              f"{len(values) / wall:>8.1f} "
+              f"{percentile(values, 50) * 1000:>9.1f} "
+              f"{percentile(values, 95) * 1000:>9.1f} "
+              f"{percentile(values, 99) * 1000:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--target", choices=["payments", "callback", "both"], default="both")
+    parser.add_argument("--rate", type=float, default=20, help="requests per second")
+    parser.add_argument("--duration", type=float, default=10, help="seconds")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duplicate-rate", type=float, default=0.1,
+                        help="fraction of callbacks that repeat an earlier CheckoutRequestID")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--username", default="admin1",
+                        help="account the payment requests are made as")
+    parser.add_argument("--password", default="admin1.p")
+    parser.add_argument("--order-ids", default="1-200",
+                        help="existing order ids to pay, e.g. 1-200,350")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Local M-PESA (Daraja) gateway simulator.
+
+Serves the OAuth, STK push and STK query endpoints and delivers STK
+callbacks to the CallBackURL of each push, with configurable latency and
+outcome ratios. Every push draws from its own RNG seeded by (--seed, push
+number), so a run with the same seed and request order is reproducible.
+
+Standard library only. Point the app at it with:
+
+    python scripts/mpesa_simulator.py --port 8089 --seed 42
+    MPESA_BASE_URL=http://127.0.0.1:8089 MPESA_CALLBACK_URL=http://127.0.0.1:5000/mpesa/callback flask run
+"""
+import argparse
+import itertools
+import json
+import math
+import random
+import threading
+import time
+import urllib.request
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Daraja result codes used for simulated outcomes
+OUTCOMES = {
+    "success": (0, "The service request is processed successfully."),
+    "cancelled": (1032, "Request cancelled by user."),
+    "insufficient": (1, "The balance is insufficient for the transaction."),
+    "timeout": (1037, "DS timeout user cannot be reached."),
+}
+
+
+class Latency:
+    """Log-normal latency with a given median (ms) and shape sigma."""
+
+    def __init__(self, median_ms, sigma):
+        self.mu = math.log(max(median_ms, 0.001))
+        self.sigma = sigma
+
+    def sample(self, rng):
+        return rng.lognormvariate(self.mu, self.sigma) / 1000.0 if self.sigma else math.exp(self.mu) / 1000.0
+
+
+class Simulator:
+    def __init__(self, args):
+        self.args = args
+        self.oauth_latency = Latency(args.oauth_ms, args.sigma)
+        self.push_latency = Latency(args.push_ms, args.sigma)
+        self.query_latency = Latency(args.query_ms, args.sigma)
+        self.callback_delay = Latency(args.callback_ms, args.sigma)
+        self._counter = itertools.count(1)
+        self._transactions = {}  # CheckoutRequestID -> state
+        self._lock = threading.Lock()
+        self.stats = {"oauth": 0, "push": 0, "push_errors": 0, "query": 0,
+                      "callbacks_sent": 0, "callbacks_dropped": 0, "callbacks_failed": 0}
+
+    def rng(self, n, stream):
+        return random.Random(f"{self.args.seed}:{stream}:{n}")
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    # ─── Endpoints ───────────────────────────────────────────────────────────
+    def oauth(self):
+        n = next(self._counter)
+        self._count("oauth")
+        time.sleep(self.oauth_latency.sample(self.rng(n, "oauth")))
+        return 200, {"access_token": f"SIM{n:08d}", "expires_in": str(self.args.token_ttl)}
+
+    def stk_push(self, body):
+        n = next(self._counter)
+        rng = self.rng(n, "push")
+        self._count("push")
+        time.sleep(self.push_latency.sample(rng))
+
+        if rng.random() < self.args.push_error_rate:
+            self._count("push_errors")
+            return 500, {"requestId": f"{n}", "errorCode": "500.001.1001",
+                         "errorMessage": "Simulated gateway error"}
+
+        checkout_id = f"ws_CO_SIM_{self.args.seed}_{n:010d}"
+        merchant_id = f"SIM-{n:010d}"
+        outcome = self._pick_outcome(rng)
+        delay = self.callback_delay.sample(rng)
+        state = {
+            "merchant_id": merchant_id,
+            "outcome": outcome,
+            "ready_at": time.monotonic() + delay,
+            "amount": body.get("Amount"),
+            "phone": body.get("PhoneNumber"),
+            "receipt": f"SIM{rng.randrange(16 ** 8):08X}",
+        }
+        with self._lock:
+            self._transactions[checkout_id] = state
+
+        callback_url = body.get("CallBackURL")
+        if callback_url:
+            if rng.random() < self.args.callback_loss:
+                self._count("callbacks_dropped")
+            else:
+                timer = threading.Timer(delay, self._send_callback,
+                                        args=(callback_url, checkout_id, state))
+                timer.daemon = True
+                timer.start()
+
+        return 200, {
+            "MerchantRequestID": merchant_id,
+            "CheckoutRequestID": checkout_id,
+            "ResponseCode": "0",
+            "ResponseDescription": "Success. Request accepted for processing",
+            "CustomerMessage": "Success. Request accepted for processing",
+        }
+
+    def stk_query(self, body):
+        n = next(self._counter)
+        self._count("query")
+        time.sleep(self.query_latency.sample(self.rng(n, "query")))
+        checkout_id = body.get("CheckoutRequestID")
+        with self._lock:
+            state = self._transactions.get(checkout_id)
+        if state is None:
+            return 400, {"errorCode": "400.002.02", "errorMessage": "Bad Request - Invalid CheckoutRequestID"}
+        if time.monotonic() < state["ready_at"]:
+            return 500, {"errorCode": "500.001.1001", "errorMessage": "The transaction is being processed"}
+        code, desc = OUTCOMES[state["outcome"]]
+        return 200, {
+            "ResponseCode": "0",
+            "ResponseDescription": "The service request has been accepted successsfully",
+            "MerchantRequestID": state["merchant_id"],
+            "CheckoutRequestID": checkout_id,
+            "ResultCode": str(code),
+            "ResultDesc": desc,
+        }
+
+    # ─── Callbacks ───────────────────────────────────────────────────────────
+    def _pick_outcome(self, rng):
+        roll = rng.random()
+        if roll < self.args.success_rate:
+            return "success"
+        failures = ["cancelled", "insufficient", "timeout"]
+        return failures[rng.randrange(len(failures))]
+
+    def _send_callback(self, url, checkout_id, state):
+        code, desc = OUTCOMES[state["outcome"]]
+        callback = {
+            "MerchantRequestID": state["merchant_id"],
+            "CheckoutRequestID": checkout_id,
+            "ResultCode": code,
+            "ResultDesc": desc,
+        }
+        if code == 0:
+            callback["CallbackMetadata"] = {"Item": [
+                {"Name": "Amount", "Value": state["amount"]},
+                {"Name": "MpesaReceiptNumber", "Value": state["receipt"]},
+                {"Name": "TransactionDate", "Value": int(datetime.now().strftime("%Y%m%d%H%M%S"))},
+                {"Name": "PhoneNumber", "Value": state["phone"]},
+            ]}
+        data = json.dumps({"Body": {"stkCallback": callback}}).encode()
+        request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+        try:
+            urllib.request.urlopen(request, timeout=10).read()
+            self._count("callbacks_sent")
+        except Exception as e:
+            self._count("callbacks_failed")
+            print(f"[simulator] callback to {url} failed: {e}")
+
+
+def make_handler(sim):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real gateway
+
+        def _json_body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            if not length:
+                return {}
+            try:
+                return json.loads(self.rfile.read(length))
+            except ValueError:
+                return {}
+
+        def _reply(self, status, payload):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _authorized(self):
+            return self.headers.get("Authorization", "").startswith("Bearer ")
+
+        def do_GET(self):
+            if self.path.startswith("/oauth/v1/generate"):
+                return self._reply(*sim.oauth())
+            if self.path == "/stats":
+                return self._reply(200, sim.stats)
+            return self._reply(404, {"errorMessage": "Not found"})
+
+        def do_POST(self):
+            body = self._json_body()
+            if self.path.startswith("/mpesa/stkpush/v1/processrequest"):
+                if not self._authorized():
+                    return self._reply(401, {"errorCode": "404.001.03", "errorMessage": "Invalid Access Token"})
+                return self._reply(*sim.stk_push(body))
+            if self.path.startswith("/mpesa/stkpushquery/v1/query"):
+                if not self._authorized():
+                    return self._reply(401, {"errorCode": "404.001.03", "errorMessage": "Invalid Access Token"})
+                return self._reply(*sim.stk_query(body))
+            return self._reply(404, {"errorMessage": "Not found"})
+
+        def log_message(self, format, *args):
+            if sim.args.verbose:
+                super().log_message(format, *args)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--oauth-ms", type=float, default=150, help="median OAuth latency")
+    parser.add_argument("--push-ms", type=float, default=400, help="median STK push latency")
+    parser.add_argument("--query-ms", type=float, default=250, help="median STK query latency")
+    parser.add_argument("--callback-ms", type=float, default=5000, help="median delay before the callback")
+    parser.add_argument("--sigma", type=float, default=0.5, help="log-normal shape (0 = fixed latency)")
+    parser.add_argument("--success-rate", type=float, default=0.8)
+    parser.add_argument("--push-error-rate", type=float, default=0.02)
+    parser.add_argument("--callback-loss", type=float, default=0.05,
+                        help="fraction of pushes whose callback is never sent")
+    parser.add_argument("--token-ttl", type=int, default=3599)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    sim = Simulator(args)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(sim))
+    server.daemon_threads = True
+    print(f"M-PESA simulator on http://{args.host}:{args.port} (seed {args.seed})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(sim.stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
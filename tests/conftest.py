@@ -0,0 +1,73 @@
+import os
+from datetime import datetime
+import pytest
+
+# create_app() picks its config class from FLASK_ENV
+os.environ['FLASK_ENV'] = 'testing'
+
+from app import create_app  # noqa: E402
+from app.extensions import db as _db  # noqa: E402
+from app.models import (  # noqa: E402
+    Customer, Order, OrderItem, OrderStatus, Product, RoleEnum, User
+)
+
+
+@pytest.fixture
+def app():
+    app = create_app()
+    with app.app_context():
+        _db.create_all()
+        yield app
+        _db.session.remove()
+        _db.drop_all()
+
+
+@pytest.fixture
+def db(app):
+    return _db
+
+
+@pytest.fixture
+def customer(db):
+    user = User(username='jane', email='jane@example.com', role=RoleEnum.CUSTOMER)
+    customer = Customer(name='Jane Doe', email='jane@example.com', user=user)
+    db.session.add(customer)
+    db.session.commit()
+    return customer
+
+
+@pytest.fixture
+def make_product(db):
+    def make(name='Widget', stock=10, price=100.0):
+        product = Product(
+            name=name, slug=name.lower().replace(' ', '-'), price=price,
+            stock_quantity=stock
+        )
+        db.session.add(product)
+        db.session.commit()
+        return product
+    return make
+
+
+@pytest.fixture
+def make_order(db, customer):
+    def make(total=100.0, items=(), status=OrderStatus.PENDING, order_date=None):
+        order = Order(
+            customer_id=customer.id,
+            status=status,
+            order_date=order_date or datetime.utcnow(),
+            subtotal=total,
+            total_amount=total,
+        )
+        for product, quantity in items:
+            order.items.append(OrderItem(
+                product_id=product.id,
+                quantity=quantity,
+                unit_price=product.price,
+                discount=0.0,
+                total_price=product.price * quantity,
+            ))
+        db.session.add(order)
+        db.session.commit()
+        return order
+    return make
@@ -0,0 +1,103 @@
+import pytest
+from app.models import Order, Payment, PaymentStatus, Refund, RefundStatus
+
+
+@pytest.mark.parametrize('paid, refunded, current, expected', [
+    (0, 0, PaymentStatus.UNPAID, PaymentStatus.UNPAID),
+    (40, 0, PaymentStatus.UNPAID, PaymentStatus.PARTIALLY_PAID),
+    (100, 0, PaymentStatus.UNPAID, PaymentStatus.PAID),
+    (99.996, 0, PaymentStatus.UNPAID, PaymentStatus.PAID),
+    (100, 30, PaymentStatus.PAID, PaymentStatus.PARTIALLY_PAID),
+    (100, 100, PaymentStatus.PAID, PaymentStatus.REFUNDED),
+    (0, 0, PaymentStatus.PENDING, PaymentStatus.PENDING),
+    (0, 0, 'failed', PaymentStatus.FAILED),
+    (0, 0, PaymentStatus.PAID, PaymentStatus.UNPAID),
+])
+def test_derive_payment_status(paid, refunded, current, expected):
+    order = Order(
+        total_amount=100.0, amount_paid=paid, amount_refunded=refunded,
+        payment_status=current
+    )
+    assert order.derive_payment_status() == expected
+
+
+def _pay(db, order, amount, status=PaymentStatus.PAID, transaction_id=None):
+    payment = Payment(
+        order_id=order.id, customer_id=order.customer_id, amount=amount,
+        method='M-PESA', status=status, transaction_id=transaction_id
+    )
+    db.session.add(payment)
+    db.session.commit()
+    return payment
+
+
+def test_payments_update_order_balance(db, make_order):
+    order = make_order(total=100.0)
+
+    first = _pay(db, order, 60.0, transaction_id='R1')
+    assert order.amount_paid == 60.0
+    assert order.payment_status == PaymentStatus.PARTIALLY_PAID
+
+    _pay(db, order, 40.0, transaction_id='R2')
+    assert order.amount_paid == 100.0
+    assert order.payment_status == PaymentStatus.PAID
+
+    first.status = PaymentStatus.FAILED
+    db.session.commit()
+    assert order.amount_paid == 40.0
+    assert order.payment_status == PaymentStatus.PARTIALLY_PAID
+
+    first.status = PaymentStatus.PAID
+    first.amount = 50.0
+    db.session.commit()
+    assert order.amount_paid == 90.0
+
+    db.session.delete(first)
+    db.session.commit()
+    assert order.amount_paid == 40.0
+
+
+def test_processed_refunds_count(db, make_order):
+    order = make_order(total=100.0)
+    payment = _pay(db, order, 100.0)
+
+    refund = Refund(
+        order_id=order.id, payment_id=payment.id, amount=100.0,
+        status=RefundStatus.REQUESTED
+    )
+    db.session.add(refund)
+    db.session.commit()
+    assert order.amount_refunded == 0
+    assert order.payment_status == PaymentStatus.PAID
+
+    refund.status = RefundStatus.PROCESSED
+    db.session.commit()
+    assert order.amount_refunded == 100.0
+    assert order.payment_status == PaymentStatus.REFUNDED
+
+
+def test_total_change_rederives_status(db, make_order):
+    order = make_order(total=100.0)
+    _pay(db, order, 100.0)
+
+    order.total_amount = 150.0
+    db.session.commit()
+    assert order.payment_status == PaymentStatus.PARTIALLY_PAID
+
+
+def test_verify_balances_repairs_drift(db, make_order):
+    from app.orders.balances import verify_balances
+
+    order = make_order(total=100.0)
+    _pay(db, order, 100.0)
+    db.session.execute(
+        Order.__table__.update().where(Order.id == order.id).values(amount_paid=0)
+    )
+    db.session.commit()
+
+    checked, mismatched = verify_balances(fix=True)
+    assert checked == 1
+    assert mismatched == [order.id]
+    db.session.refresh(order)
+    assert order.amount_paid == 100.0
+    assert verify_balances()[1] == []
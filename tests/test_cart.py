@@ -0,0 +1,34 @@
+from app.cart.service import _insert_cart_rows, merge_guest_cart
+from app.models import CartItem
+
+
+def test_merge_adds_to_existing_lines(db, customer, make_product):
+    widget = make_product(name='Widget')
+    gadget = make_product(name='Gadget')
+    db.session.add(CartItem(user_id=customer.user_id, product_id=widget.id, quantity=1))
+    db.session.commit()
+
+    written = merge_guest_cart(customer.user_id, [
+        {'product_id': widget.id, 'quantity': 2},
+        {'product_id': gadget.id, 'quantity': 1},
+        {'product_id': 9999, 'quantity': 1},
+    ])
+    db.session.commit()
+
+    assert written == 2
+    rows = {c.product_id: (c.quantity, c.variant) for c in CartItem.query}
+    assert rows == {widget.id: (3, ''), gadget.id: (1, '')}
+
+
+def test_insert_increments_a_row_added_concurrently(db, customer, make_product):
+    widget = make_product()
+    # e.g. added from another tab after merge_guest_cart() read the cart
+    db.session.add(CartItem(user_id=customer.user_id, product_id=widget.id, quantity=2))
+    db.session.commit()
+
+    db.session.execute(_insert_cart_rows(), [{
+        'user_id': customer.user_id, 'product_id': widget.id, 'variant': '', 'quantity': 3,
+    }])
+    db.session.commit()
+
+    assert [c.quantity for c in CartItem.query] == [5]
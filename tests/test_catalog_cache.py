@@ -0,0 +1,18 @@
+from app.models import Product
+from app.products.cache import catalog_cache
+from app.products.inventory import allocate_stock
+
+
+def test_checkout_keeps_the_catalog_version(db, make_product):
+    widget_id = make_product(stock=2).id
+    version = catalog_cache.backend.version()
+    catalog_cache.product(widget_id)
+    catalog_cache.products('all', lambda: Product.query.all())
+
+    allocate_stock([(widget_id, 2)], reference_id=1)
+    db.session.commit()
+    db.session.expunge_all()
+
+    assert catalog_cache.backend.version() == version
+    assert catalog_cache.product(widget_id).stock_quantity == 0
+    assert catalog_cache.products('all', list)[0].stock_quantity == 0
@@ -0,0 +1,43 @@
+import pytest
+from app.models import InventoryLog
+from app.products.inventory import InsufficientStock, allocate_stock
+
+
+def test_allocate_deducts_and_logs(db, make_product):
+    widget = make_product(stock=5)
+
+    allocate_stock([(widget.id, 2), (widget.id, 1)], reference_id=42, user_id=None)
+    db.session.commit()
+
+    db.session.refresh(widget)
+    assert widget.stock_quantity == 2
+    log = InventoryLog.query.filter_by(product_id=widget.id).one()
+    assert (log.change, log.reference_id, log.reference_type) == (-3, 42, 'order')
+
+
+def test_allocate_never_oversells(db, make_product):
+    widget = make_product(name='Widget', stock=3)
+    gadget = make_product(name='Gadget', stock=10)
+
+    with pytest.raises(InsufficientStock) as excinfo:
+        allocate_stock([(gadget.id, 5), (widget.id, 4)], reference_id=1)
+    db.session.rollback()
+
+    assert excinfo.value.product_ids == [widget.id]
+    db.session.refresh(widget)
+    db.session.refresh(gadget)
+    assert (widget.stock_quantity, gadget.stock_quantity) == (3, 10)
+    assert InventoryLog.query.count() == 0
+
+
+def test_last_unit_goes_once(db, make_product):
+    widget = make_product(stock=1)
+
+    allocate_stock([(widget.id, 1)], reference_id=1)
+    db.session.commit()
+    with pytest.raises(InsufficientStock):
+        allocate_stock([(widget.id, 1)], reference_id=2)
+    db.session.rollback()
+
+    db.session.refresh(widget)
+    assert widget.stock_quantity == 0
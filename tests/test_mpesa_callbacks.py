@@ -0,0 +1,113 @@
+from app.models import MpesaCallback, MpesaTransaction, Payment, PaymentStatus
+from app.mpesa.callbacks import (
+    apply_results, parse_callback, process_pending_callbacks, store_callback
+)
+
+
+def _payload(checkout_id, result_code=0, receipt='QK12345', amount=100):
+    stk = {
+        'MerchantRequestID': 'm-1',
+        'CheckoutRequestID': checkout_id,
+        'ResultCode': result_code,
+        'ResultDesc': 'ok' if result_code == 0 else 'Request cancelled by user',
+    }
+    if result_code == 0:
+        stk['CallbackMetadata'] = {'Item': [
+            {'Name': 'Amount', 'Value': amount},
+            {'Name': 'MpesaReceiptNumber', 'Value': receipt},
+            {'Name': 'TransactionDate', 'Value': 20240315103000},
+        ]}
+    return {'Body': {'stkCallback': stk}}
+
+
+def _transaction(db, order, checkout_id='ws_CO_1'):
+    txn = MpesaTransaction(
+        order_id=order.id, phone_number='254700000000', amount=order.total_amount,
+        checkout_request_id=checkout_id, status='PENDING'
+    )
+    db.session.add(txn)
+    db.session.commit()
+    return txn
+
+
+def test_parse_callback():
+    result = parse_callback(_payload('ws_CO_1'))
+    assert result['checkout_request_id'] == 'ws_CO_1'
+    assert result['result_code'] == '0'
+    assert result['receipt'] == 'QK12345'
+    assert result['transaction_date'].year == 2024
+    assert parse_callback({'Body': {}}) is None
+
+
+def test_duplicate_callbacks_are_stored_and_applied_once(db, make_order):
+    order = make_order(total=100.0)
+    txn = _transaction(db, order)
+    result = parse_callback(_payload('ws_CO_1'))
+
+    assert store_callback(result) is not None
+    assert store_callback(result) is None  # gateway retry
+    assert process_pending_callbacks() == (1, 0)
+    assert process_pending_callbacks() == (0, 0)
+
+    assert MpesaCallback.query.count() == 1
+    assert txn.status == 'SUCCESSFUL'
+    assert Payment.query.filter_by(order_id=order.id).count() == 1
+    assert order.payment_status == PaymentStatus.PAID
+
+
+def test_callback_route_stores_before_acknowledging(app, db, make_order):
+    order = make_order(total=100.0)
+    txn = _transaction(db, order)
+    client = app.test_client()
+
+    for _ in range(2):
+        response = client.post('/mpesa/callback', json=_payload('ws_CO_1'))
+        assert response.get_json()['ResultCode'] == 0
+
+    assert MpesaCallback.query.count() == 1
+    assert MpesaCallback.query.one().processed_at is not None
+    assert txn.status == 'SUCCESSFUL'
+
+
+def test_unmatched_callback_stays_pending(db, make_order):
+    order = make_order(total=100.0)
+    store_callback(parse_callback(_payload('ws_CO_early')))
+
+    assert process_pending_callbacks() == (0, 1)
+    assert MpesaCallback.query.one().processed_at is None
+
+    _transaction(db, order, checkout_id='ws_CO_early')
+    assert process_pending_callbacks() == (1, 0)
+    assert Payment.query.filter_by(order_id=order.id).count() == 1
+
+
+def test_reconciled_payment_is_rekeyed_by_callback(db, make_order):
+    order = make_order(total=100.0)
+    txn = _transaction(db, order)
+
+    # STK Query answer: success, but no receipt
+    apply_results([{
+        'checkout_request_id': 'ws_CO_1', 'result_code': '0', 'result_desc': 'ok',
+        'receipt': None, 'transaction_date': None, 'payload': {},
+    }])
+    db.session.commit()
+    payment = Payment.query.filter_by(order_id=order.id).one()
+    assert payment.transaction_id == 'ws_CO_1'
+
+    apply_results([parse_callback(_payload('ws_CO_1'))])
+    db.session.commit()
+
+    payment = Payment.query.filter_by(order_id=order.id).one()
+    assert payment.transaction_id == 'QK12345'
+    assert txn.mpesa_receipt_number == 'QK12345'
+    assert order.amount_paid == 100.0
+
+
+def test_failed_callback_does_not_record_payment(db, make_order):
+    order = make_order(total=100.0)
+    txn = _transaction(db, order)
+    store_callback(parse_callback(_payload('ws_CO_1', result_code=1032)))
+
+    assert process_pending_callbacks() == (1, 0)
+    assert txn.status == 'UNSUCCESSFUL'
+    assert Payment.query.count() == 0
@@ -0,0 +1,30 @@
+from datetime import datetime
+import pytest
+from app.main.routes import _storefront_page
+from app.utils.pagination import decode_cursor, encode_cursor
+
+
+def test_storefront_pages_cover_every_product(db, make_product):
+    created = datetime(2024, 3, 15)
+    ids = []
+    for i in range(5):
+        product = make_product(name=f'Product {i}')
+        product.created_at = created  # ties are broken by id
+        ids.append(product.id)
+    db.session.commit()
+
+    seen, cursor = [], None
+    while True:
+        products, cursor = _storefront_page(cursor, per_page=2)
+        seen.extend(p.id for p in products)
+        if cursor is None:
+            break
+    assert seen == sorted(ids, reverse=True)
+
+
+def test_cursor_round_trip_and_null_sort_value():
+    created = datetime(2024, 3, 15, 10, 30)
+    assert decode_cursor(encode_cursor(created, 7)) == (created, 7)
+    assert decode_cursor('not-a-cursor') is None
+    with pytest.raises(ValueError):
+        encode_cursor(None, 7)
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+import pytest
+from app.models import StockReservation
+from app.products.inventory import InsufficientStock, allocate_stock
+from app.products.reservations import (
+    available_stock, expire_reservations, reserve_stock, transfer_reservations
+)
+
+
+def test_holds_reduce_availability_for_others(db, make_product):
+    widget = make_product(stock=5)
+    reserve_stock('guest:abc', widget.id, 3)
+    db.session.commit()
+
+    assert available_stock([widget]) == {widget.id: 2}
+    assert available_stock([widget], exclude_owner='guest:abc') == {widget.id: 5}
+    with pytest.raises(InsufficientStock):
+        reserve_stock('user:1', widget.id, 3)
+
+
+def test_other_carts_reservations_are_not_sold(db, make_product):
+    widget = make_product(stock=5)
+    reserve_stock('guest:abc', widget.id, 3)
+    db.session.commit()
+
+    with pytest.raises(InsufficientStock):
+        allocate_stock([(widget.id, 3)], reference_id=1, owner='user:1')
+    db.session.rollback()
+
+    allocate_stock([(widget.id, 2)], reference_id=1, owner='user:1')
+    db.session.commit()
+    db.session.refresh(widget)
+    assert widget.stock_quantity == 3
+
+
+def test_own_reservation_is_released_on_allocation(db, make_product):
+    widget = make_product(stock=5)
+    reserve_stock('user:1', widget.id, 5)
+    db.session.commit()
+
+    allocate_stock([(widget.id, 5)], reference_id=1, owner='user:1')
+    db.session.commit()
+
+    assert StockReservation.query.filter_by(owner='user:1').count() == 0
+    db.session.refresh(widget)
+    assert widget.stock_quantity == 0
+
+
+def test_transfer_adds_holds_capped_at_available(db, make_product):
+    widget = make_product(name='Widget', stock=10)
+    gadget = make_product(name='Gadget', stock=10)
+    reserve_stock('user:1', widget.id, 4)
+    reserve_stock('guest:abc', widget.id, 5)
+    reserve_stock('guest:abc', gadget.id, 2)
+    reserve_stock('guest:xyz', widget.id, 1)
+    widget.stock_quantity = 7  # e.g. units sold through another channel
+    db.session.commit()
+
+    transfer_reservations('guest:abc', 'user:1')
+    db.session.commit()
+
+    held = {
+        r.product_id: r.quantity
+        for r in StockReservation.query.filter_by(owner='user:1')
+    }
+    # 4 + 5 would oversell: capped at 7 minus guest:xyz's unit
+    assert held == {widget.id: 6, gadget.id: 2}
+    assert StockReservation.query.filter_by(owner='guest:abc').count() == 0
+
+
+def test_expired_holds_are_ignored_and_swept(db, make_product):
+    widget = make_product(stock=5)
+    reserve_stock('guest:abc', widget.id, 5)
+    db.session.commit()
+
+    later = datetime.utcnow() + timedelta(hours=1)
+    assert expire_reservations(now=later) == 1
+    assert available_stock([widget]) == {widget.id: 5}
@@ -0,0 +1,152 @@
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, select
+from app.models import DailySalesRollup, Order, OrderStatus, Payment, PaymentStatus
+from app.reports.rollup import backfill_rollup, remove_orders
+from app.reports.utils import sales_by_period
+
+DAY = datetime(2024, 3, 15, 10, 30)
+
+
+def _day_totals(db, day=DAY):
+    """{measure: total} over every rollup key for one day."""
+    row = db.session.execute(
+        select(
+            func.coalesce(func.sum(DailySalesRollup.order_count), 0),
+            func.coalesce(func.sum(DailySalesRollup.revenue), 0),
+            func.coalesce(func.sum(DailySalesRollup.item_count), 0),
+            func.coalesce(func.sum(DailySalesRollup.amount_paid), 0),
+        ).where(DailySalesRollup.date == day.date())
+    ).one()
+    return dict(zip(('orders', 'revenue', 'items', 'paid'), row))
+
+
+def _keys(db, day=DAY):
+    return {
+        (r.status, r.payment_status): r.order_count
+        for r in DailySalesRollup.query.filter_by(date=day.date())
+        if r.order_count
+    }
+
+
+def test_orders_upsert_into_one_row_per_key(db, make_order, make_product):
+    widget = make_product(stock=50)
+    make_order(total=100.0, items=[(widget, 2)], order_date=DAY)
+    make_order(total=50.0, items=[(widget, 1)], order_date=DAY + timedelta(hours=3))
+
+    assert _day_totals(db) == {'orders': 2, 'revenue': 150.0, 'items': 3, 'paid': 0}
+    assert _keys(db) == {(OrderStatus.PENDING, PaymentStatus.UNPAID): 2}
+
+
+def test_status_change_moves_order_between_keys(db, make_order, make_product):
+    order = make_order(total=100.0, items=[(make_product(), 4)], order_date=DAY)
+
+    order.status = OrderStatus.SHIPPED
+    db.session.commit()
+
+    assert _keys(db) == {(OrderStatus.SHIPPED, PaymentStatus.UNPAID): 1}
+    assert _day_totals(db) == {'orders': 1, 'revenue': 100.0, 'items': 4, 'paid': 0}
+
+
+def test_payment_and_date_change(db, make_order):
+    order = make_order(total=100.0, order_date=DAY)
+    db.session.add(Payment(
+        order_id=order.id, customer_id=order.customer_id, amount=100.0,
+        method='CASH', status=PaymentStatus.PAID
+    ))
+    db.session.commit()
+    assert _keys(db) == {(OrderStatus.PENDING, PaymentStatus.PAID): 1}
+    assert _day_totals(db)['paid'] == 100.0
+
+    order.order_date = DAY + timedelta(days=1)
+    db.session.commit()
+    assert _day_totals(db)['orders'] == 0
+    assert _day_totals(db, DAY + timedelta(days=1)) == {
+        'orders': 1, 'revenue': 100.0, 'items': 0, 'paid': 100.0
+    }
+
+
+def test_failed_payments_are_not_counted(db, make_order):
+    order = make_order(total=100.0, order_date=DAY)
+    payment = Payment(
+        order_id=order.id, customer_id=order.customer_id, amount=100.0,
+        method='M-PESA', status=PaymentStatus.FAILED
+    )
+    db.session.add(payment)
+    db.session.commit()
+    assert _day_totals(db)['paid'] == 0
+
+    payment.status = PaymentStatus.PAID
+    db.session.commit()
+    assert _day_totals(db)['paid'] == 100.0
+
+    payment.status = PaymentStatus.FAILED
+    db.session.commit()
+    assert _day_totals(db)['paid'] == 0
+
+    payment.status = PaymentStatus.PAID
+    db.session.commit()
+    backfill_rollup()
+    assert _day_totals(db)['paid'] == 100.0
+    db.session.add(Payment(
+        order_id=order.id, customer_id=order.customer_id, amount=50.0,
+        method='M-PESA', status=PaymentStatus.FAILED
+    ))
+    db.session.commit()
+    backfill_rollup()
+    assert _day_totals(db)['paid'] == 100.0
+
+
+def test_orm_delete_subtracts(db, make_order, make_product):
+    keep = make_order(total=30.0, items=[(make_product(), 1)], order_date=DAY)
+    gone = make_order(total=70.0, order_date=DAY)
+
+    db.session.delete(gone)
+    db.session.commit()
+
+    assert _day_totals(db) == {'orders': 1, 'revenue': 30.0, 'items': 1, 'paid': 0}
+    assert keep.id is not None
+
+
+def test_remove_orders_before_bulk_delete(db, make_order, make_product):
+    widget = make_product()
+    keep = make_order(total=30.0, items=[(widget, 1)], order_date=DAY)
+    gone = [make_order(total=70.0, items=[(widget, 2)], order_date=DAY) for _ in range(2)]
+    ids = [o.id for o in gone]
+
+    remove_orders(ids)
+    db.session.execute(delete(Order.__table__).where(Order.id.in_(ids)))
+    db.session.commit()
+
+    assert _day_totals(db) == {'orders': 1, 'revenue': 30.0, 'items': 1, 'paid': 0}
+    assert keep.id not in ids
+
+
+def test_backfill_matches_incremental(db, make_order, make_product):
+    widget = make_product()
+    make_order(total=100.0, items=[(widget, 2)], order_date=DAY)
+    make_order(total=40.0, status=OrderStatus.DELIVERED, order_date=DAY - timedelta(days=2))
+    before = {
+        (r.date, r.status, r.payment_status): (r.order_count, r.revenue, r.item_count)
+        for r in DailySalesRollup.query if r.order_count
+    }
+
+    assert backfill_rollup() == 3
+    after = {
+        (r.date, r.status, r.payment_status): (r.order_count, r.revenue, r.item_count)
+        for r in DailySalesRollup.query
+    }
+    assert after == before
+
+
+def test_reports_fall_back_to_orders_before_backfill(db, make_order):
+    make_order(total=100.0, order_date=DAY)
+    make_order(total=20.0, order_date=DAY)
+    db.session.execute(delete(DailySalesRollup.__table__))
+    db.session.commit()
+
+    periods, totals = sales_by_period(DAY.date(), DAY.date())
+
+    assert totals['orders'] == 2
+    assert totals['revenue'] == 120.0
+    assert periods[0]['period'] == DAY.date()
+    assert DailySalesRollup.query.count() == 0  # the web path never backfills
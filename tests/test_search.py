@@ -0,0 +1,40 @@
+import pytest
+from sqlalchemy import text
+from app.search.index import FTS_TABLE, rebuild_search_index, search_products
+
+
+@pytest.mark.parametrize('run', [1, 2])
+def test_index_follows_a_recreated_database(db, make_product, run):
+    # Each run gets a fresh in-memory database under the same URL
+    make_product(name='Blue Kettle')
+    make_product(name='Red Toaster')
+
+    products, total = search_products('kett')
+    assert total == 1
+    assert products[0].name == 'Blue Kettle'
+
+
+def test_existing_products_are_backfilled(db, make_product):
+    make_product(name='Blue Kettle')
+    db.session.execute(text(f"DROP TABLE {FTS_TABLE}"))
+    db.session.commit()
+
+    assert search_products('kettle')[1] == 1
+
+
+def test_renamed_and_deleted_products(db, make_product):
+    kettle = make_product(name='Blue Kettle')
+    kettle.name = 'Green Teapot'
+    db.session.commit()
+    assert search_products('kettle')[1] == 0
+    assert search_products('teapot')[1] == 1
+
+    db.session.delete(kettle)
+    db.session.commit()
+    assert search_products('teapot')[1] == 0
+
+
+def test_rebuild(db, make_product):
+    make_product(name='Blue Kettle')
+    make_product(name='Red Toaster')
+    assert rebuild_search_index() == 2